@@ -14,3 +14,29 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import importlib
+
+# Maps the public helper names onto the module that defines them, the module is only imported the first time the
+# helper is accessed as an attribute of this package.
+_lazy_helpers = {
+    "LoggingHelper": "argparseutils.helpers.pythonlogging",
+    "MailGunHelper": "argparseutils.helpers.mailgunhelper",
+    "ModbusSerialHelper": "argparseutils.helpers.modbushelper",
+    "MQTTClientHelper": "argparseutils.helpers.mqtt",
+    "SerialHelper": "argparseutils.helpers.serialport",
+    "SocketHelper": "argparseutils.helpers.sockethelper",
+}
+
+__all__ = list(_lazy_helpers.keys())
+
+
+def __getattr__(name):
+    if name in _lazy_helpers:
+        value = getattr(importlib.import_module(_lazy_helpers[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__)
@@ -18,11 +18,13 @@ import logging
 from argparse import ArgumentParser
 from typing import List
 
-import requests
-
 from argparseutils.helpers.util.email import EmailAddress, EmailClient, EmailStatus
+from argparseutils.helpers.util.lazy import lazy_import
+from argparseutils.helpers.util.profiling import profiled
 from argparseutils.helpers.utils import fix_formatter_class, add_option, get_args
 
+requests = lazy_import("requests", extra="mailgun")
+
 
 
 class MailgunClient(EmailClient):
@@ -49,6 +51,7 @@ class MailgunClient(EmailClient):
 
 class MailGunHelper:
     @classmethod
+    @profiled
     def add_parser_options(cls, parser: ArgumentParser, shard="", **user_defaults):
         fix_formatter_class(parser)
         add_option(parser, user_defaults, name="mailgun-api-key", shard=shard, required=True,
@@ -57,6 +60,7 @@ class MailGunHelper:
                    help="The Mailgun domain to use")
 
     @classmethod
+    @profiled
     def create_client(cls, args, shard=""):
         args = get_args(args, shard)
 
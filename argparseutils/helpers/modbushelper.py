@@ -16,32 +16,37 @@
 # limitations under the License.
 
 from argparse import ArgumentParser
+from contextlib import asynccontextmanager
 
-from pymodbus import FramerType
-from pymodbus.client import ModbusSerialClient
-from serial.serialutil import EIGHTBITS, FIVEBITS, SIXBITS, SEVENBITS, STOPBITS_ONE
-from serial.tools import list_ports
+from argparseutils.helpers.serialport import SerialHelper, default_port_option, EIGHTBITS, FIVEBITS, SIXBITS, SEVENBITS, \
+    STOPBITS_ONE
+from argparseutils.helpers.util.lazy import lazy_import
+from argparseutils.helpers.util.profiling import profiled
+from argparseutils.helpers.utils import add_option, fix_formatter_class, boolify, get_args, get_shard_registry
 
-from argparseutils.helpers.serialport import SerialHelper
-from argparseutils.helpers.utils import add_option, fix_formatter_class, boolify
+pymodbus = lazy_import("pymodbus", extra="modbus")
+pymodbus_client = lazy_import("pymodbus.client", extra="modbus")
+
+# The values of pymodbus.FramerType that apply to a serial line, RTU also runs over TCP.
+FRAMER_RTU = "rtu"
+FRAMER_ASCII = "ascii"
+# The pymodbus.FramerType of Modbus TCP.
+FRAMER_SOCKET = "socket"
 
 
 class ModbusSerialHelper:
 
     @classmethod
+    @profiled
     def add_parser_options(cls, parser, shard="", **kwargs):
         fix_formatter_class(parser)
+        get_shard_registry(parser).register_shard(cls, shard)
 
-        default_port = None
-        known_ports = list_ports.comports()
-        if len(known_ports) > 0:
-            default_port = known_ports[0].device
-
-        add_option(parser, kwargs, name='modbus-port', author_default=default_port, shard=shard,
-                   required=default_port is None, help="The Serial port to connect to")
+        add_option(parser, kwargs, name='modbus-port', lazy_default=default_port_option(), shard=shard,
+                   help="The Serial port to connect to")
 
-        add_option(parser, kwargs, name="modbus-framer", author_default=FramerType.RTU.value,
-                   choices=[FramerType.RTU.value, FramerType.ASCII.value], help="The modbus framer to use")
+        add_option(parser, kwargs, name="modbus-framer", author_default=FRAMER_RTU, shard=shard,
+                   choices=[FRAMER_RTU, FRAMER_ASCII], help="The modbus framer to use")
 
         add_option(parser, kwargs, name="modbus-baudrate", author_default=9600, shard=shard, type=int,
                    help="The Serial port baudrate to use")
@@ -52,7 +57,7 @@ class ModbusSerialHelper:
         add_option(parser, kwargs, name="modbus-parity", author_default="None", shard=shard,
                    choices=SerialHelper.parity_map.keys(), help="The parity algorithm to use")
 
-        add_option(parser, kwargs, name="modbus-stopbits", author_default=str(STOPBITS_ONE), shard=shard, type=int,
+        add_option(parser, kwargs, name="modbus-stopbits", author_default=str(STOPBITS_ONE), shard=shard,
                    choices=SerialHelper.stopbit_map.keys(), help="The number of stop bits to use")
 
         add_option(parser, kwargs, name="modbus-timeout", author_default=10, shard=shard, type=int,
@@ -70,35 +75,177 @@ class ModbusSerialHelper:
         add_option(parser, kwargs, name="modbus-max-reconnect-delay", author_default=300, shard=shard, type=float,
                    help="Maximum delay in seconds.milliseconds before reconnection")
 
-        add_option(parser, kwargs, name="modbus-retries", author_default=3, shard=shard, type=float,
-                   help="Maximum delay in seconds.milliseconds before reconnection")
+        add_option(parser, kwargs, name="modbus-retries", author_default=3, shard=shard, type=int,
+                   help="The number of times a request is retried")
+
+        add_option(parser, kwargs, name="modbus-cache-ttl", author_default=0.0, shard=shard, type=float,
+                   help="How long create_cached_modbus_serial reuses a read response (seconds), 0 only merges "
+                        "identical reads in flight")
+
+        add_option(parser, kwargs, name="modbus-cache-size", author_default=1024, shard=shard, type=int,
+                   help="The most read responses create_cached_modbus_serial keeps")
 
     @classmethod
-    def validate_args(cls, args):
+    @profiled
+    def validate_args(cls, args, shard=""):
         return True
 
     @classmethod
-    def create_modbus_serial(cls, args):
-        args.modbus_parity = SerialHelper.parity_map[args.modbus_parity]
-        kwargs = dict(
-            port=args.modbus_port,
-            framer=FramerType(args.modbus_framer),
+    def create_modbus_serial_kwargs(cls, args, shard=""):
+        from argparseutils.helpers.util.portselect import resolve_port
+
+        get_shard_registry(args=args).validate_shard(cls, shard)
+
+        args = get_args(args, shard)
+        return dict(
+            port=resolve_port(args.modbus_port),
+            framer=pymodbus.FramerType(args.modbus_framer),
             baudrate=args.modbus_baudrate,
             bytesize=args.modbus_bytesize,
-            parity=args.modbus_parity,
-            stopbits=args.modbus_stopbits,
+            parity=SerialHelper.parity_map.get(args.modbus_parity, args.modbus_parity),
+            stopbits=SerialHelper.stopbit_map.get(str(args.modbus_stopbits), args.modbus_stopbits),
             timeout=args.modbus_timeout,
             handle_local_echo=args.modbus_handle_local_echo,
             reconnect_delay=args.modbus_reconnect_delay,
             reconnect_delay_max=args.modbus_max_reconnect_delay,
-            retries=args.modbus_retries,
-
+            retries=int(args.modbus_retries),
         )
 
-        port = ModbusSerialClient(**kwargs)
+    @classmethod
+    @profiled
+    def create_modbus_serial(cls, args, shard=""):
+        port = pymodbus_client.ModbusSerialClient(**cls.create_modbus_serial_kwargs(args, shard))
         port.args = args
         return port
 
+    @classmethod
+    @profiled
+    def create_cached_modbus_serial(cls, args, shard=""):
+        """
+        Creates a ModbusSerialClient behind a ModbusReadCache configured by modbus-cache-ttl and modbus-cache-size.
+        Share the returned client between the threads reading the bus so their reads are cached and merged.
+        """
+        from argparseutils.helpers.util.modbuscache import ModbusReadCache
+
+        shard_args = get_args(args, shard)
+        return ModbusReadCache(cls.create_modbus_serial(args, shard), ttl=shard_args.modbus_cache_ttl,
+                               max_size=shard_args.modbus_cache_size)
+
+    @classmethod
+    @profiled
+    def create_async_modbus_serial(cls, args, shard=""):
+        """
+        Creates a pymodbus AsyncModbusSerialClient from the same options as create_modbus_serial. pymodbus binds the
+        client to the running event loop, so it must be created in a coroutine and connected with
+        `await client.connect()`, or use open_async_modbus_serial.
+        """
+        port = pymodbus_client.AsyncModbusSerialClient(**cls.create_modbus_serial_kwargs(args, shard))
+        port.args = args
+        return port
+
+    @classmethod
+    @asynccontextmanager
+    async def open_async_modbus_serial(cls, args, shard=""):
+        """
+        Connects an AsyncModbusSerialClient for the duration of an `async with` block and closes it afterwards.
+        """
+        client = cls.create_async_modbus_serial(args, shard)
+        try:
+            if not await client.connect():
+                port = get_args(args, shard).modbus_port
+                raise ConnectionError(f"Could not connect to the modbus serial port {port}")
+            yield client
+        finally:
+            client.close()
+
+
+class ModbusTcpHelper:
+    """
+    Configures pymodbus TCP clients, typically for gateways to serial buses. The options are named modbus-tcp-* so a
+    gateway can share a shard with a ModbusSerialHelper.
+    """
+
+    @classmethod
+    @profiled
+    def add_parser_options(cls, parser, shard="", **kwargs):
+        fix_formatter_class(parser)
+        get_shard_registry(parser).register_shard(cls, shard)
+
+        add_option(parser, kwargs, name="modbus-tcp-host", author_default="localhost", shard=shard,
+                   help="The host name or IP address of the Modbus TCP server or gateway")
+
+        add_option(parser, kwargs, name="modbus-tcp-port", author_default=502, shard=shard, type=int,
+                   help="The TCP port of the Modbus TCP server or gateway")
+
+        add_option(parser, kwargs, name="modbus-tcp-framer", author_default=FRAMER_SOCKET, shard=shard,
+                   choices=[FRAMER_SOCKET, FRAMER_RTU], help="The modbus framer to use, rtu for RTU over TCP gateways")
+
+        add_option(parser, kwargs, name="modbus-tcp-timeout", author_default=3, shard=shard, type=float,
+                   help="The read timeout to use (seconds)")
+
+        add_option(parser, kwargs, name="modbus-tcp-retries", author_default=3, shard=shard, type=int,
+                   help="The number of times a request is retried")
+
+        add_option(parser, kwargs, name="modbus-tcp-reconnect-delay", author_default=0.1, shard=shard, type=float,
+                   help="Minimum delay in seconds.milliseconds before reconnection")
+
+        add_option(parser, kwargs, name="modbus-tcp-max-reconnect-delay", author_default=300, shard=shard, type=float,
+                   help="Maximum delay in seconds.milliseconds before reconnection")
+
+        add_option(parser, kwargs, name="modbus-tcp-max-connections", author_default=1, shard=shard, type=int,
+                   help="The most connections a ModbusTcpPool opens to the gateway")
+
+        add_option(parser, kwargs, name="modbus-tcp-unit-lock", author_default=True, shard=shard, type=boolify,
+                   choices=[True, False], help="Send one request at a time to each unit behind the gateway")
+
+    @classmethod
+    @profiled
+    def validate_args(cls, args, shard=""):
+        return True
+
+    @classmethod
+    def create_modbus_tcp_kwargs(cls, args, shard=""):
+        get_shard_registry(args=args).validate_shard(cls, shard)
+
+        args = get_args(args, shard)
+        return dict(
+            host=args.modbus_tcp_host,
+            port=args.modbus_tcp_port,
+            framer=pymodbus.FramerType(args.modbus_tcp_framer),
+            timeout=args.modbus_tcp_timeout,
+            retries=args.modbus_tcp_retries,
+            reconnect_delay=args.modbus_tcp_reconnect_delay,
+            reconnect_delay_max=args.modbus_tcp_max_reconnect_delay,
+        )
+
+    @classmethod
+    @profiled
+    def create_modbus_tcp(cls, args, shard=""):
+        client = pymodbus_client.ModbusTcpClient(**cls.create_modbus_tcp_kwargs(args, shard))
+        client.args = args
+        return client
+
+    @classmethod
+    @profiled
+    def create_async_modbus_tcp(cls, args, shard=""):
+        """
+        Creates a pymodbus AsyncModbusTcpClient from the same options as create_modbus_tcp, in a coroutine.
+        """
+        client = pymodbus_client.AsyncModbusTcpClient(**cls.create_modbus_tcp_kwargs(args, shard))
+        client.args = args
+        return client
+
+    @classmethod
+    @profiled
+    def create_modbus_tcp_pool(cls, args, shards=None, parser: ArgumentParser = None):
+        """
+        Creates a ModbusTcpPool over the gateways of several shards, defaults to every shard registered for this
+        helper.
+        """
+        from argparseutils.helpers.util.modbuspool import ModbusTcpPool
+
+        return ModbusTcpPool(args, shards, parser=parser, helper_class=cls)
+
 
 if __name__ == '__main__':
     parser = ArgumentParser("ModbusSerialHelper_Example")
@@ -17,20 +17,23 @@
 
 import ssl
 
-import paho.mqtt.client as mqtt_client
-from paho.mqtt.enums import CallbackAPIVersion
-
+from argparseutils.helpers.util.lazy import lazy_import
+from argparseutils.helpers.util.profiling import profiled
 from argparseutils.helpers.utils import add_option, boolify, fix_formatter_class, get_args, \
     get_shard_registry
 
+mqtt_client = lazy_import("paho.mqtt.client", extra="mqtt")
+mqtt_enums = lazy_import("paho.mqtt.enums", extra="mqtt")
+
 
 class MQTTClientHelper:
 
     @classmethod
+    @profiled
     def add_parser_options(cls, parser, mqtt_client_id, shard="", **kwargs):
 
         fix_formatter_class(parser)
-        get_shard_registry().register_shard(cls, shard)
+        get_shard_registry(parser).register_shard(cls, shard)
 
         add_option(parser, kwargs, name="mqtt-host", author_default="localhost", shard=shard,
                    help="The MQTT server hostname to connect to")
@@ -65,10 +68,12 @@ class MQTTClientHelper:
                    help="The MQTT Websocket path")
 
     @classmethod
+    @profiled
     def validate_args(cls, args, shard=""):
         return True
 
     @classmethod
+    @profiled
     def create_client(cls, args, shard=""):
         args = get_args(args, shard)
 
@@ -76,7 +81,7 @@ class MQTTClientHelper:
             client_id=args.mqtt_client_id,
             clean_session=args.mqtt_clean_session,
             transport=args.mqtt_transport,
-            callback_api_version=CallbackAPIVersion.VERSION2
+            callback_api_version=mqtt_enums.CallbackAPIVersion.VERSION2
         )
         client.args = args
         client.ws_set_options(path=args.mqtt_ws_path)
@@ -95,6 +100,7 @@ class MQTTClientHelper:
         return client
 
     @classmethod
+    @profiled
     def connect(cls, client):
         args = client.args
         client.connect(args.mqtt_host, port=args.mqtt_port, keepalive=args.mqtt_keepalive)
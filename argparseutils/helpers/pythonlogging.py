@@ -22,6 +22,7 @@ from copy import deepcopy
 from dataclasses import dataclass, field
 from typing import Optional, List
 
+from argparseutils.helpers.util.profiling import profiled
 from argparseutils.helpers.utils import add_option, fix_formatter_class
 
 class LoggingHelper:
@@ -29,6 +30,7 @@ class LoggingHelper:
     debug_def_fmt = "%(asctime)-15s %(process)-8d %(levelname)-7s %(name)s File \"%(pathname)s\", line %(lineno)d, in %(funcName)s - %(message)s"
 
     @classmethod
+    @profiled
     def add_parser_options(cls, parser: ArgumentParser, **kwargs):
         fix_formatter_class(parser)
 
@@ -40,7 +42,9 @@ class LoggingHelper:
                    help="The log level to use.")
 
     @classmethod
+    @profiled
     def init_logging(cls, args: Namespace, format=def_fmt, filename=None):
+        _add_log_level("TRACE", 5)
         kwargs = dict(format=format, level=logging._nameToLevel[args.log_level], )
         if filename is not None:
             kwargs["filename"] = filename
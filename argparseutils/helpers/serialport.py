@@ -15,20 +15,78 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
 import os
 from argparse import ArgumentParser, Namespace
+from functools import lru_cache
+from time import perf_counter
 
+from argparseutils.helpers.util import profiling
+from argparseutils.helpers.util.lazy import lazy_import
+from argparseutils.helpers.util.profiling import profiled
+from argparseutils.helpers.utils import fix_formatter_class, get_args, \
+    get_shard_registry, boolify, add_option, LazyDefault, get_shard_values, byte_int
 
-from serial import Serial
-from serial.tools import list_ports
-from serial.serialutil import FIVEBITS, SIXBITS, SEVENBITS, EIGHTBITS, PARITY_NONE, PARITY_EVEN, PARITY_ODD, \
-    PARITY_MARK, PARITY_SPACE, STOPBITS_ONE, STOPBITS_ONE_POINT_FIVE, STOPBITS_TWO
+# pyserial is only imported when a port is enumerated or opened, building the parser does not need it.
+serial = lazy_import("serial", extra="serial")
+list_ports = lazy_import("serial.tools.list_ports", extra="serial")
 
-from argparseutils.helpers.utils import fix_formatter_class, get_args, \
-    get_shard_registry, boolify, add_option
+# The values of pyserial's serial.serialutil constants, duplicated so that the parser options can be built
+# without importing pyserial.
+FIVEBITS, SIXBITS, SEVENBITS, EIGHTBITS = 5, 6, 7, 8
+PARITY_NONE, PARITY_EVEN, PARITY_ODD, PARITY_MARK, PARITY_SPACE = 'N', 'E', 'O', 'M', 'S'
+STOPBITS_ONE, STOPBITS_ONE_POINT_FIVE, STOPBITS_TWO = 1, 1.5, 2
+
+
+@lru_cache
+def get_known_ports():
+    """
+    Enumerates the serial ports once per process, the result is shared by every helper and shard.
+    """
+    profiler = profiling.profiler
+    if profiler is None:
+        return list_ports.comports()
+    with profiler.time("serialport", "enumerate_ports"):
+        return list_ports.comports()
+
+
+def get_default_port():
+    known_ports = get_known_ports()
+    if len(known_ports) > 0:
+        return known_ports[0].device
+    return None
+
+
+def default_port_option(unless: str = None):
+    """
+    The lazy default of a port option, the first port found. If no port is found it is a parse error, unless the
+    option named `unless` was given.
+    """
+    return LazyDefault(get_default_port, "first available port", "no serial port was found, one must be specified",
+                       unless)
+
+
+class SerialPorts(dict):
+    """
+    The ports opened by SerialHelper.create_all_serials, a dict of shard to serial.Serial.
+
+    :ivar errors: A dict of shard to the exception raised opening that shard's port
+    :ivar open_times: A dict of shard to the time, in seconds, taken to open (or fail to open) that shard's port
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.errors = {}
+        self.open_times = {}
+
+    def close(self):
+        for port in self.values():
+            port.close()
 
 
 class SerialHelper:
+    logger = logging.getLogger("SerialHelper")
+
     parity_map = {
         "None": PARITY_NONE,
         "Even": PARITY_EVEN,
@@ -44,20 +102,19 @@ class SerialHelper:
     }
 
     @classmethod
+    @profiled
     def add_parser_options(cls, parser: ArgumentParser, shard:str="", **kwargs):
 
         fix_formatter_class(parser)
-        get_shard_registry().register_shard(cls, shard)
+        get_shard_registry(parser).register_shard(cls, shard)
 
-        default_port = None
-        known_ports = list_ports.comports()
-        if len(known_ports) > 0:
-            default_port = known_ports[0].device
+        # A replay does not need a port.
+        add_option(parser, kwargs, name='port', lazy_default=default_port_option(unless="replay_file"),
+                   shard=shard,
+                   help="The Serial port to connect to, or a selector such as usb:vid=0403,pid=6001,serial=A1B2, "
+                        "by-id:<name> or location:1-1.2")
 
-        add_option(parser, kwargs, name='port', author_default=default_port, shard=shard, required=default_port is None,
-                             help="The Serial port to connect to")
-
-        add_option(parser, kwargs, name="baudrate", author_default=9600, shard=shard,
+        add_option(parser, kwargs, name="baudrate", author_default=9600, shard=shard, type=int,
                    help="The Serial port baudrate to use")
 
         add_option(parser, kwargs, name="bytesize", author_default=EIGHTBITS, shard=shard,
@@ -69,7 +126,7 @@ class SerialHelper:
         add_option(parser, kwargs, name="stopbits", author_default=str(STOPBITS_ONE), shard=shard, choices=cls.stopbit_map.keys(),
                    help="The number of stop bits to use")
 
-        add_option(parser, kwargs, name="timeout", author_default=None, shard=shard, type=int,
+        add_option(parser, kwargs, name="timeout", author_default=None, shard=shard, type=float,
                    help="The read timeout to use (seconds)")
 
         add_option(parser, kwargs, name="xonxoff", author_default=False, shard=shard, type=boolify,
@@ -81,27 +138,63 @@ class SerialHelper:
         add_option(parser, kwargs, name="dsrdtr", author_default=False, shard=shard, type=boolify,
                    choices=[True, False], help="Use DSR/DTR hardware flow control")
 
-        add_option(parser, kwargs, name="write-timeout", author_default=None, shard=shard,
+        add_option(parser, kwargs, name="write-timeout", author_default=None, shard=shard, type=float,
                    help="The write timeout to use (seconds)")
 
-        add_option(parser, kwargs, name="inter-byte-timeout", author_default=None, shard=shard,
+        add_option(parser, kwargs, name="inter-byte-timeout", author_default=None, shard=shard, type=float,
                    help="The inter byte timeout to use. Disabled by default")
 
         if os.name == 'posix':
             add_option(parser, kwargs, name="exclusive", author_default=None, shard=shard, type=boolify,
                        choices=[True, False], help="Open the serial port in exclusive mode")
 
+            add_option(parser, kwargs, name="low-latency", author_default=None, shard=shard, type=boolify,
+                       choices=[True, False], help="Set the kernel's ASYNC_LOW_LATENCY flag on the port")
+
+            add_option(parser, kwargs, name="latency-timer", author_default=None, shard=shard, type=int,
+                       help="The USB serial adapter's latency timer (milliseconds), set through sysfs when writable")
+
+            add_option(parser, kwargs, name="vmin", author_default=None, shard=shard, type=byte_int,
+                       help="The termios VMIN (0-255), the number of bytes received before the port is readable")
+
+            add_option(parser, kwargs, name="vtime", author_default=None, shard=shard, type=byte_int,
+                       help="The termios VTIME (0-255 tenths of a second)")
+
+        add_option(parser, kwargs, name="rx-buffer-size", author_default=None, shard=shard, type=int,
+                   help="The driver receive buffer size, where the platform supports it")
+
+        add_option(parser, kwargs, name="tx-buffer-size", author_default=None, shard=shard, type=int,
+                   help="The driver transmit buffer size, where the platform supports it")
+
+        add_option(parser, kwargs, name="capture-file", author_default=None, shard=shard,
+                   help="Append everything read from and written to the port, with timestamps, to this file")
+
+        if os.name == 'posix':
+            add_option(parser, kwargs, name="replay-file", author_default=None, shard=shard,
+                       help="Serve this capture file through a pty and open that instead of the port")
+
+            add_option(parser, kwargs, name="replay-speed", author_default=1.0, shard=shard, type=float,
+                       help="The replay speed relative to the capture, 0 replays as fast as possible")
+
     @classmethod
+    @profiled
     def validate_args(cls, args: Namespace, shard=""):
         return True
 
     @classmethod
     def create_serial_kwargs(cls, args: Namespace, shard: str=""):
-        get_shard_registry().validate_shard(cls, shard)
+        from argparseutils.helpers.util.portselect import resolve_port
+
+        get_shard_registry(args=args).validate_shard(cls, shard)
 
         args = get_args(args, shard)
+        replay_file = getattr(args, 'replay_file', None)
+        if args.port is None and replay_file is None:
+            cli_shard, _ = get_shard_values(shard)
+            raise ValueError(f"No serial port was found, one must be specified with --{cli_shard}port")
         kwargs = dict(
-            port=args.port,
+            # A replay opens its own pty, the port is not resolved.
+            port=resolve_port(args.port) if replay_file is None else None,
             baudrate=args.baudrate,
             bytesize=args.bytesize,
             parity=cls.parity_map[args.parity],
@@ -128,11 +221,121 @@ class SerialHelper:
 
 
     @classmethod
+    @profiled
     def create_serial(cls, args, shard=""):
-        port = Serial(**cls.create_serial_kwargs(args, shard))
-        port.args = args
+        kwargs = cls.create_serial_kwargs(args, shard)
+        shard_args = get_args(args, shard)
+        replay_file = getattr(shard_args, 'replay_file', None)
+        if shard_args.capture_file is None and replay_file is None:
+            port = serial.Serial(**kwargs)
+        else:
+            from argparseutils.helpers.util.capture import CaptureReplay, CaptureWriter, get_capture_serial_class
+
+            replay = capture = None
+            try:
+                if replay_file is not None:
+                    replay = CaptureReplay(replay_file, speed=shard_args.replay_speed).open()
+                    kwargs['port'] = replay.port_name
+                if shard_args.capture_file is not None:
+                    capture = CaptureWriter(shard_args.capture_file)
+                port = get_capture_serial_class()(capture=capture, replay=replay, **kwargs)
+            except BaseException:
+                if capture is not None:
+                    capture.close()
+                if replay is not None:
+                    replay.stop()
+                raise
+            if replay is not None:
+                replay.start()
+        try:
+            port.args = args
+            port.latency_settings = cls.apply_latency_settings(port, shard_args)
+        except BaseException:
+            port.close()
+            raise
         return port
 
+    @classmethod
+    def apply_latency_settings(cls, port, shard_args) -> dict:
+        """
+        Applies the low latency options to the open port, returning a dict of each setting given to "applied" or the
+        reason it was not.
+        """
+        settings = {name: getattr(shard_args, name, None) for name in
+                    ("low_latency", "latency_timer", "vmin", "vtime", "rx_buffer_size", "tx_buffer_size")}
+        settings = {name: value for name, value in settings.items() if value is not None}
+        if len(settings) == 0:
+            return {}
+
+        from argparseutils.helpers.util.lowlatency import apply_latency_settings
+
+        results = apply_latency_settings(port, **settings)
+        for name, result in results.items():
+            cls.logger.info(f"{port.port} {name}={settings[name]}: {result}")
+        return results
+
+    @classmethod
+    def create_all_serials(cls, args, shards=None, max_workers: int = None, parser: ArgumentParser = None):
+        """
+        Opens the ports of several shards in parallel on a thread pool, opening a USB adapter can block for 100ms or
+        more. A shard that fails to open is recorded in the result's `errors` and does not stop the others.
+
+        :param args: The parsed arguments
+        :param shards: The shards to open, defaults to every shard registered for this helper
+        :param max_workers: The number of ports to open at once, defaults to one per shard, at most 32
+        :param parser: The parser the shards were registered on, defaults to the ShardRegistry recorded on the args
+        :return: SerialPorts, a dict of shard to the open serial.Serial
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if shards is None:
+            shards = get_shard_registry(parser, args).registered_shards(cls)
+        shards = list(shards)
+        for shard in shards:
+            get_shard_registry(parser, args).validate_shard(cls, shard)
+
+        def open_port(shard):
+            start = perf_counter()
+            try:
+                return shard, cls.create_serial(args, shard), None, perf_counter() - start
+            except Exception as e:
+                return shard, None, e, perf_counter() - start
+
+        ports = SerialPorts()
+        if len(shards) == 0:
+            return ports
+        if max_workers is None:
+            max_workers = min(32, len(shards))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="SerialHelper") as executor:
+            futures = [executor.submit(open_port, shard) for shard in shards]
+            for future in futures:
+                shard, port, error, open_time = future.result()
+                ports.open_times[shard] = open_time
+                if error is None:
+                    ports[shard] = port
+                else:
+                    ports.errors[shard] = error
+        return ports
+
+    @classmethod
+    async def create_async_serial(cls, args, shard="", limit: int = 2 ** 16):
+        """
+        Opens the port with create_serial, including its capture, replay and low latency settings, and returns an
+        asyncio (StreamReader, StreamWriter) pair driven by the running event loop, so one thread can serve every
+        sharded port. Only available on posix.
+
+        Opening a port can block, it is opened on the loop's default executor so the other ports keep being served.
+        """
+        import asyncio
+        import contextvars
+        from argparseutils.helpers.util.asyncserial import open_serial_connection
+
+        loop = asyncio.get_running_loop()
+        # The context is copied so that an active RegistryContext is seen by create_serial, as asyncio.to_thread does.
+        context = contextvars.copy_context()
+        port = await loop.run_in_executor(None, context.run, cls.create_serial, args, shard)
+        return await open_serial_connection(port, limit=limit)
+
 
 if __name__ == "__main__":
 
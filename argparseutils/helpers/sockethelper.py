@@ -18,6 +18,7 @@
 from argparse import ArgumentParser
 from dataclasses import dataclass
 
+from argparseutils.helpers.util.profiling import profiled
 from argparseutils.helpers.utils import fix_formatter_class, get_args, \
     get_shard_registry, add_option
 
@@ -31,16 +32,18 @@ class SocketConfig:
 class SocketHelper:
 
     @classmethod
+    @profiled
     def add_parser_options(cls, parser: ArgumentParser, shard:str="http", **kwargs):
 
         fix_formatter_class(parser)
-        get_shard_registry().register_shard(cls, shard)
+        get_shard_registry(parser).register_shard(cls, shard)
         add_option(parser, kwargs, name="address", author_default="0.0.0.0", shard=shard,
                    help="The IP address to bind to")
         add_option(parser, kwargs, name="port", author_default=8080, type=int, shard=shard,
                    help="The port address to bind to")
 
     @classmethod
+    @profiled
     def get_socket_config(cls, args, shard="http"):
         shard_args = get_args(args, shard)
         return SocketConfig(address=shard_args.address, port=shard_args.port)
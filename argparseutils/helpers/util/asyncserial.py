@@ -0,0 +1,211 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import os
+import select
+
+from argparseutils.helpers.util.capture import READ, WRITE
+
+
+def is_hung_up(fd) -> bool:
+    """
+    A tty with VMIN 0 can be readable and return no data, only a hangup or error on the descriptor ends the port.
+    """
+    poller = select.poll()
+    poller.register(fd, select.POLLIN)
+    return any(events & (select.POLLHUP | select.POLLERR | select.POLLNVAL) for _, events in poller.poll(0))
+
+
+class SerialTransport(asyncio.Transport):
+    """
+    An asyncio transport for an open serial port, driven by loop.add_reader and loop.add_writer on the port's file
+    descriptor so that a single event loop can serve any number of ports. pyserial opens posix ports with O_NONBLOCK,
+    reads and writes go straight to the file descriptor.
+
+    :param loop: The running event loop
+    :param protocol: The asyncio.Protocol that receives the data read from the port
+    :param port: An open serial.Serial
+    """
+    max_read_size = 4096
+
+    def __init__(self, loop, protocol, port):
+        super().__init__(extra=dict(serial=port))
+        self._loop = loop
+        self._protocol = protocol
+        self._port = port
+        self._fd = port.fileno()
+        # Reading and writing the descriptor bypasses the port's read and write, so a captured port is recorded here.
+        self._capture = getattr(port, 'capture', None)
+        self._write_buffer = bytearray()
+        self._high_water = 64 * 1024
+        self._low_water = 16 * 1024
+        self._protocol_paused = False
+        self._reading = True
+        self._closing = False
+        self._closed = False
+        self._loop.call_soon(self._protocol.connection_made, self)
+        self._loop.call_soon(self._loop.add_reader, self._fd, self._read_ready)
+
+    def _read_ready(self):
+        try:
+            data = os.read(self._fd, self.max_read_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._fatal_error(e)
+            return
+        if data:
+            if self._capture is not None:
+                self._capture.record(READ, data)
+            self._protocol.data_received(data)
+        elif is_hung_up(self._fd):
+            self._fatal_error(None)
+
+    def write(self, data):
+        if self._closing:
+            raise RuntimeError("Cannot write to a closing serial transport")
+        if not data:
+            return
+        if not self._write_buffer:
+            try:
+                written = os.write(self._fd, data)
+            except (BlockingIOError, InterruptedError):
+                written = 0
+            except OSError as e:
+                self._fatal_error(e)
+                return
+            if self._capture is not None and written:
+                self._capture.record(WRITE, memoryview(data)[:written])
+            if written == len(data):
+                return
+            data = memoryview(data)[written:]
+            self._loop.add_writer(self._fd, self._write_ready)
+        self._write_buffer.extend(data)
+        self._maybe_pause_protocol()
+
+    def _write_ready(self):
+        try:
+            written = os.write(self._fd, self._write_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._fatal_error(e)
+            return
+        if self._capture is not None and written:
+            self._capture.record(WRITE, self._write_buffer[:written])
+        del self._write_buffer[:written]
+        self._maybe_resume_protocol()
+        if not self._write_buffer:
+            self._loop.remove_writer(self._fd)
+            if self._closing:
+                self._call_connection_lost(None)
+
+    def _maybe_pause_protocol(self):
+        if not self._protocol_paused and len(self._write_buffer) > self._high_water:
+            self._protocol_paused = True
+            self._protocol.pause_writing()
+
+    def _maybe_resume_protocol(self):
+        if self._protocol_paused and len(self._write_buffer) <= self._low_water:
+            self._protocol_paused = False
+            self._protocol.resume_writing()
+
+    def get_write_buffer_size(self):
+        return len(self._write_buffer)
+
+    def get_write_buffer_limits(self):
+        return self._low_water, self._high_water
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        if high is None:
+            high = 64 * 1024 if low is None else 4 * low
+        if low is None:
+            low = high // 4
+        if not high >= low >= 0:
+            raise ValueError(f"high ({high}) must be >= low ({low}) must be >= 0")
+        self._high_water, self._low_water = high, low
+        self._maybe_pause_protocol()
+
+    def can_write_eof(self):
+        return False
+
+    def is_reading(self):
+        return self._reading and not self._closing
+
+    def pause_reading(self):
+        if self.is_reading():
+            self._reading = False
+            self._loop.remove_reader(self._fd)
+
+    def resume_reading(self):
+        if not self._reading and not self._closing:
+            self._reading = True
+            self._loop.add_reader(self._fd, self._read_ready)
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        if not self._write_buffer:
+            self._loop.call_soon(self._call_connection_lost, None)
+
+    def abort(self):
+        self._closing = True
+        self._write_buffer.clear()
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        self._loop.call_soon(self._call_connection_lost, None)
+
+    def _fatal_error(self, exc):
+        self._closing = True
+        self._write_buffer.clear()
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        self._loop.call_soon(self._call_connection_lost, exc)
+
+    def _call_connection_lost(self, exc):
+        if self._closed:
+            return
+        self._closed = True
+        self._loop.remove_writer(self._fd)
+        try:
+            self._protocol.connection_lost(exc)
+        finally:
+            self._port.close()
+
+
+async def open_serial_connection(port, limit: int = 2 ** 16):
+    """
+    Wraps an open serial.Serial in a SerialTransport and returns a (StreamReader, StreamWriter) pair, the same as
+    asyncio.open_connection does for a socket.
+
+    :param port: An open serial.Serial
+    :param limit: The buffer limit of the StreamReader
+    """
+    if os.name != 'posix':
+        port.close()
+        raise NotImplementedError("Async serial ports need loop.add_reader, which is only available on posix")
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit, loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport = SerialTransport(loop, protocol, port)
+    await asyncio.sleep(0)
+    return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
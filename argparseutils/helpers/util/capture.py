@@ -0,0 +1,330 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Capture files record the bytes read from and written to a serial port. A capture file is the magic header followed by
+records of a little endian (uint64 nanoseconds since the epoch, uint8 direction, uint32 length) header and the data.
+Records are only ever appended, a record cut short by a crash ends the capture.
+"""
+import logging
+import mmap
+import os
+import select
+import struct
+import threading
+import time
+from argparse import ArgumentParser
+from functools import lru_cache
+
+from argparseutils.helpers.util.lazy import lazy_import
+
+serial = lazy_import("serial", extra="serial")
+
+CAPTURE_MAGIC = b"APUCAP1\n"
+RECORD_HEADER = struct.Struct("<QBI")
+READ, WRITE = 0, 1
+
+
+class CaptureWriter:
+    """
+    Appends records to a capture file, creating it if it does not exist. Data in the same direction within
+    `coalesce_ns` of the start of a record is added to that record, so reading a byte at a time, as readline does,
+    does not write a record per byte. Records are buffered until `flush` or `close`.
+
+    :param path: The capture file
+    :param coalesce_ns: The longest time, in nanoseconds, covered by one record
+    """
+
+    def __init__(self, path: str, coalesce_ns: int = 1000000):
+        self.path = path
+        self.coalesce_ns = coalesce_ns
+        self.lock = threading.Lock()
+        self.pending = bytearray()
+        self.pending_direction = None
+        self.pending_timestamp = 0
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(CAPTURE_MAGIC)
+
+    def record(self, direction: int, data):
+        if len(data) == 0:
+            return
+        timestamp = time.time_ns()
+        with self.lock:
+            if direction != self.pending_direction or timestamp - self.pending_timestamp > self.coalesce_ns:
+                self._write_pending()
+                self.pending_direction = direction
+                self.pending_timestamp = timestamp
+            self.pending += data
+
+    def _write_pending(self):
+        if len(self.pending) > 0:
+            self.file.write(RECORD_HEADER.pack(self.pending_timestamp, self.pending_direction, len(self.pending)))
+            self.file.write(self.pending)
+            self.pending.clear()
+        self.pending_direction = None
+
+    def flush(self):
+        with self.lock:
+            self._write_pending()
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self._write_pending()
+            self.file.close()
+
+
+@lru_cache
+def get_capture_serial_class():
+    """
+    Returns a subclass of serial.Serial that records everything read and written to a CaptureWriter and stops a
+    CaptureReplay when it is closed, created on first use so pyserial is only imported when it is needed. Readers that
+    bypass read and write, such as FrameReader, SerialPool and the async transport, record to the port's `capture`
+    themselves.
+    """
+
+    class CaptureSerial(serial.Serial):
+
+        def __init__(self, *args, capture: CaptureWriter = None, replay=None, **kwargs):
+            self.capture = capture
+            self.replay = replay
+            super().__init__(*args, **kwargs)
+
+        def read(self, size=1):
+            if self.replay is not None:
+                self.replay.check()
+            try:
+                data = super().read(size)
+            except serial.SerialException:
+                # A failed replay hangs up the pty, report why rather than the hang up.
+                if self.replay is not None:
+                    self.replay.check()
+                raise
+            if self.capture is not None:
+                self.capture.record(READ, data)
+            return data
+
+        def write(self, data):
+            written = super().write(data)
+            if self.capture is not None and written:
+                self.capture.record(WRITE, memoryview(data)[:written])
+            return written
+
+        def close(self):
+            super().close()
+            if self.capture is not None:
+                self.capture.close()
+                self.capture = None
+            if self.replay is not None:
+                self.replay.stop()
+                self.replay = None
+
+    return CaptureSerial
+
+
+def iter_records(buffer, offset: int = len(CAPTURE_MAGIC)):
+    """
+    Yields (timestamp_ns, direction, data) for every complete record in `buffer`, data is a memoryview of buffer.
+    """
+    view = memoryview(buffer)
+    try:
+        if bytes(view[:len(CAPTURE_MAGIC)]) != CAPTURE_MAGIC:
+            raise ValueError("Not a capture file")
+        end = len(view)
+        while offset + RECORD_HEADER.size <= end:
+            timestamp, direction, length = RECORD_HEADER.unpack_from(buffer, offset)
+            offset += RECORD_HEADER.size
+            if offset + length > end:
+                return
+            yield timestamp, direction, view[offset:offset + length]
+            offset += length
+    finally:
+        view.release()
+
+
+class CaptureReplay:
+    """
+    Serves the data read in a capture file through a pty, so a consumer opening `port_name` with
+    SerialHelper.create_serial sees the device it was captured from. The file is mapped with mmap and streamed, it is
+    never loaded into memory. Data the consumer writes is read and discarded.
+
+    :param path: The capture file
+    :param speed: The replay speed relative to the capture, 0 or None replays as fast as the consumer reads
+    :param direction: The direction of the records to replay, READ replays what the device sent
+    :ivar error: The exception that stopped the replay, if it failed. The pty is then hung up, so a consumer blocked
+                 reading it wakes, and a port from SerialHelper.create_serial raises it from `read`.
+    """
+    logger = logging.getLogger("CaptureReplay")
+
+    def __init__(self, path: str, speed: float = 1.0, direction: int = READ):
+        self.path = path
+        self.speed = speed
+        self.direction = direction
+        self.master = None
+        self.slave = None
+        self.port_name = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.replayed = 0
+        self.error = None
+
+    def open(self):
+        """
+        Creates the pty, its name is `port_name`. pyserial discards pending input when it opens a port, so the
+        consumer should open the port before the replay is started.
+        """
+        # tty is posix only, capturing works everywhere.
+        import tty
+
+        if self.master is not None:
+            return self
+        self.master, self.slave = os.openpty()
+        # Raw mode before the consumer opens the slave, so replayed data is neither echoed nor line edited.
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port_name = os.ttyname(self.slave)
+        return self
+
+    def start(self):
+        if self.thread is not None:
+            return self
+        self.open()
+        self.thread = threading.Thread(target=self._run, name=f"CaptureReplay {self.path}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        with self.lock:
+            for fd in (self.master, self.slave):
+                if fd is not None:
+                    os.close(fd)
+            self.master = self.slave = None
+
+    def check(self):
+        """
+        Raises a SerialException from the error that stopped the replay, if it failed.
+        """
+        if self.error is not None:
+            raise serial.SerialException(f"The replay of {self.path} failed: {self.error}") from self.error
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Waits for every record to be written to the pty, returns False on timeout.
+        """
+        return self.finished.wait(timeout)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _drain(self):
+        try:
+            while os.read(self.master, 65536):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _wait_until(self, deadline):
+        while not self.stopping.is_set():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self.master], [], [], min(remaining, 0.1))
+            if readable:
+                self._drain()
+
+    def _write(self, data):
+        while len(data) > 0 and not self.stopping.is_set():
+            readable, writable, _ = select.select([self.master], [self.master], [], 0.1)
+            if readable:
+                self._drain()
+            if writable:
+                try:
+                    written = os.write(self.master, data)
+                except BlockingIOError:
+                    continue
+                data = data[written:]
+                self.replayed += written
+
+    def _run(self):
+        try:
+            self._replay()
+        except Exception as e:
+            self.logger.error(f"The replay of {self.path} failed: {e}")
+            self.error = e
+            # Hang up the pty, so a consumer blocked reading it wakes up.
+            with self.lock:
+                if self.master is not None:
+                    os.close(self.master)
+                    self.master = None
+        finally:
+            self.finished.set()
+
+    def _replay(self):
+        with open(self.path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                first = None
+                start = time.perf_counter()
+                records = iter_records(buffer)
+                try:
+                    for timestamp, direction, data in records:
+                        # The views of the mapping must be released before it is closed.
+                        with data:
+                            if self.stopping.is_set():
+                                break
+                            if direction != self.direction:
+                                continue
+                            if first is None:
+                                first = timestamp
+                            if self.speed:
+                                self._wait_until(start + (timestamp - first) / 1e9 / self.speed)
+                            self._write(data)
+                finally:
+                    records.close()
+
+
+def main():
+    parser = ArgumentParser("CaptureReplay", description="Serves a serial capture file through a pty.")
+    parser.add_argument("capture_file", help="The capture file to replay")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="The replay speed relative to the capture, 0 replays as fast as possible. (default: 1.0)")
+    args = parser.parse_args()
+
+    with CaptureReplay(args.capture_file, speed=args.speed) as replay:
+        print(replay.port_name, flush=True)
+        try:
+            input("Open the port, then press enter to start the replay")
+            replay.start()
+            replay.wait()
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
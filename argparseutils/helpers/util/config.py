@@ -0,0 +1,227 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import json
+import logging
+import os
+import stat as stat_module
+import tempfile
+from argparse import ArgumentParser
+from functools import lru_cache
+
+from argparseutils.helpers.util.speccache import get_cache_dir
+from argparseutils.helpers.utils import EnvResolver, get_env_name
+
+
+def parse_env_file(text: str) -> dict:
+    """
+    Parses a systemd EnvironmentFile style file of `NAME=value` lines, the names are used as is.
+    """
+    config = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) == 0 or line.startswith("#") or "=" not in line:
+            continue
+        if line.startswith("export "):
+            line = line[len("export "):]
+        name, value = line.split("=", 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        config[name.strip()] = value
+    return config
+
+
+def parse_toml_file(text: str) -> dict:
+    try:
+        import tomllib
+    except ImportError:
+        import tomli as tomllib
+    return tomllib.loads(text)
+
+
+def flatten_config(config: dict) -> dict:
+    """
+    Flattens a JSON or TOML config into environment variable names. Top level keys are options, either the cli name
+    or the python name, and tables are the options of the shard named by the table:
+
+        {"log-level": "DEBUG", "input": {"port": "/dev/ttyUSB0", "baudrate": 115200}}
+
+    is flattened to `LOG_LEVEL`, `INPUT_PORT` and `INPUT_BAUDRATE`.
+    """
+    flat = {}
+    for key, value in config.items():
+        if isinstance(value, dict):
+            prefix = f"{key.upper()}_"
+            for name, shard_value in value.items():
+                if shard_value is not None:
+                    flat[prefix + get_env_name(name)] = shard_value
+        elif value is not None:
+            flat[get_env_name(key)] = value
+    return flat
+
+
+config_parsers = {
+    ".env": lambda text: parse_env_file(text),
+    ".json": lambda text: flatten_config(json.loads(text)),
+    ".toml": lambda text: flatten_config(parse_toml_file(text)),
+}
+
+
+def get_config_format(path: str) -> str:
+    name = os.path.basename(path)
+    extension = os.path.splitext(name)[1].lower()
+    if extension in config_parsers:
+        return extension
+    if name.startswith(".env") or name.endswith(".env"):
+        return ".env"
+    raise ValueError(f"Unknown config file format: {path}, expected one of {' '.join(config_parsers.keys())}")
+
+
+class ConfigFileCache:
+    """
+    ConfigFileCache keeps parsed config files in memory and in `cache_dir`, one file for each config file, keyed by
+    the config file's size and modification time. A later process loading the unchanged file reads the parsed values
+    back as JSON rather than parsing it again. Values JSON can not hold, such as TOML dates, are only kept in memory,
+    and when the cache directory can not be read or written the files are parsed as if there were no cache.
+
+    Config files often hold secrets, so only files that only their owner can read are cached on disk, in a directory
+    and files only the owner can read. Other files, and every file where there are no posix permissions, are only
+    cached in memory.
+
+    :param cache_dir: The directory holding the parsed files, defaults to `$XDG_CACHE_HOME/argparseutils/config`
+    """
+    logger = logging.getLogger("ConfigFileCache")
+    cache_version = 1
+
+    def __init__(self, cache_dir: str = None):
+        if cache_dir is None:
+            cache_dir = os.path.join(get_cache_dir(), "config")
+        self.cache_dir = cache_dir
+        self.memory = {}
+
+    def get_path(self, path: str) -> str:
+        name = hashlib.sha256(path.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def is_disk_cached(self, stat: os.stat_result) -> bool:
+        return os.name == 'posix' and stat_module.S_IMODE(stat.st_mode) & 0o077 == 0
+
+    def get_key(self, path: str, stat: os.stat_result) -> list:
+        return [self.cache_version, path, stat.st_size, stat.st_mtime_ns]
+
+    def get(self, path: str, stat: os.stat_result):
+        """
+        Returns the parsed config of `path` if it was cached with the same size and modification time, otherwise None.
+        """
+        key = self.get_key(path, stat)
+        cached = self.memory.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        cache_path = self.get_path(path)
+        if not self.is_disk_cached(stat) or not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, "r", encoding="utf-8") as cache_file:
+                cached = json.load(cache_file)
+            if cached.get('key') != key:
+                return None
+            config = cached['config']
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            self.logger.warning(f"Ignoring invalid config file cache {cache_path}: {e}")
+            return None
+        self.memory[path] = (key, config)
+        return config
+
+    def put(self, path: str, stat: os.stat_result, config: dict):
+        key = self.get_key(path, stat)
+        self.memory[path] = (key, config)
+        if not self.is_disk_cached(stat):
+            return
+        try:
+            data = json.dumps(dict(key=key, config=config), separators=(',', ':'))
+        except (TypeError, ValueError):
+            return
+        cache_path = self.get_path(path)
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            if stat_module.S_IMODE(os.stat(self.cache_dir).st_mode) != 0o700:
+                os.chmod(self.cache_dir, 0o700)
+            # mkstemp creates the file exclusively, readable and writable by the owner only.
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+                cache_file.write(data)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            self.logger.warning(f"Config file cache can not be saved to {cache_path}: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self):
+        self.memory.clear()
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+@lru_cache
+def get_config_file_cache() -> ConfigFileCache:
+    return ConfigFileCache()
+
+
+def load_config_file(path: str) -> dict:
+    """
+    Loads the config file at `path` as a dict of environment variable names to values. Parsed files are cached by
+    path, size and modification time, in memory and on disk, see ConfigFileCache, so loading an unchanged file again,
+    in this process or a later one, does not parse it.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cache = get_config_file_cache()
+    config = cache.get(path, stat)
+    if config is not None:
+        return config
+
+    with open(path, "r", encoding="utf-8") as config_file:
+        config = config_parsers[get_config_format(path)](config_file.read())
+    cache.put(path, stat, config)
+    return config
+
+
+def add_config_files(parser: ArgumentParser, *paths: str, missing_ok: bool = False):
+    """
+    Adds config files as a source of defaults for the options the helpers add to `parser`. It must be called before
+    the helpers are added. A value in a config file takes precedence over the script author's default but not over the
+    environment or the command line. Later files take precedence over earlier ones.
+
+    :param parser: The parser to add the config files to
+    :param paths: The `.env`, `.json` or `.toml` files to load
+    :param missing_ok: Skip files that do not exist instead of raising FileNotFoundError
+    """
+    config_resolver = getattr(parser, 'config_resolver', None)
+    if config_resolver is None:
+        config_resolver = EnvResolver(environ={})
+        setattr(parser, 'config_resolver', config_resolver)
+    config = dict(config_resolver.environ)
+    for path in paths:
+        if missing_ok and not os.path.exists(path):
+            continue
+        config.update(load_config_file(path))
+    config_resolver.reset(config)
@@ -0,0 +1,187 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import select
+import struct
+
+from argparseutils.helpers.util.capture import READ
+
+
+class DelimiterSplitter:
+    """
+    Splits frames that end with `delimiter`.
+
+    :param delimiter: The bytes that end each frame
+    :param include_delimiter: Whether the delimiter is part of the frame returned
+    """
+
+    def __init__(self, delimiter: bytes = b"\n", include_delimiter: bool = False):
+        self.delimiter = bytes(delimiter)
+        self.include_delimiter = include_delimiter
+
+    def split(self, buffer: bytearray, start: int, end: int):
+        index = buffer.find(self.delimiter, start, end)
+        if index < 0:
+            return None
+        next_start = index + len(self.delimiter)
+        return start, next_start if self.include_delimiter else index, next_start
+
+
+class FixedLengthSplitter:
+    """
+    Splits frames of `length` bytes.
+    """
+
+    def __init__(self, length: int):
+        if length <= 0:
+            raise ValueError("length must be greater than 0")
+        self.length = length
+
+    def split(self, buffer: bytearray, start: int, end: int):
+        next_start = start + self.length
+        if next_start > end:
+            return None
+        return start, next_start, next_start
+
+
+class LengthPrefixSplitter:
+    """
+    Splits frames that start with an unsigned integer header holding the length of the rest of the frame.
+
+    :param size: The size of the header, 1, 2, 4 or 8 bytes
+    :param byteorder: The byte order of the header, big or little
+    :param include_header: Whether the header is part of the frame returned
+    :param adjust: Added to the header value to get the number of bytes that follow the header
+    """
+    formats = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+    def __init__(self, size: int = 2, byteorder: str = "big", include_header: bool = False, adjust: int = 0):
+        if size not in self.formats:
+            raise ValueError(f"size must be one of {list(self.formats)}")
+        if byteorder not in ("big", "little"):
+            raise ValueError("byteorder must be big or little")
+        self.header = struct.Struct((">" if byteorder == "big" else "<") + self.formats[size])
+        self.include_header = include_header
+        self.adjust = adjust
+
+    def split(self, buffer: bytearray, start: int, end: int):
+        body_start = start + self.header.size
+        if body_start > end:
+            return None
+        next_start = body_start + self.header.unpack_from(buffer, start)[0] + self.adjust
+        if next_start < body_start:
+            raise ValueError(f"Invalid frame length at offset {start}")
+        if next_start > end:
+            return None
+        return start if self.include_header else body_start, next_start, next_start
+
+
+class FrameReader:
+    """
+    FrameReader reads a port into a preallocated buffer and yields the frames found by `splitter` as memoryviews of
+    that buffer, so reading and splitting does not allocate a bytes object per read or per frame. It is a compacting
+    buffer rather than a ring: unread data is copied back to the start of the buffer when the free space at the end
+    runs low, so every frame stays contiguous.
+
+    A frame is only valid until the next read, copy it with bytes(frame) to keep it.
+
+    On posix the port's file descriptor is read directly with os.readv, honouring the port's timeout, otherwise the
+    port's readinto is used.
+
+    :param port: A serial.Serial from SerialHelper.create_serial, or any object with readinto
+    :param splitter: A DelimiterSplitter, FixedLengthSplitter, LengthPrefixSplitter or any object with the same split
+    :param buffer_size: The size of the buffer, which must be larger than the largest frame
+    :param read_size: The maximum number of bytes to read at a time, defaults to a quarter of the buffer
+    """
+
+    def __init__(self, port, splitter, buffer_size: int = 64 * 1024, read_size: int = None):
+        self.port = port
+        self.splitter = splitter
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.read_size = buffer_size // 4 if read_size is None else min(read_size, buffer_size)
+        self.start = 0
+        self.end = 0
+        self.fd = None
+        self.capture = None
+        if os.name == 'posix' and hasattr(port, 'fileno') and hasattr(port, 'timeout'):
+            self.fd = port.fileno()
+            # Reading the descriptor bypasses the port's read, so a captured port is recorded here.
+            self.capture = getattr(port, 'capture', None)
+
+    def _readinto(self, view) -> int:
+        if self.fd is None:
+            return self.port.readinto(view) or 0
+        # A tty with no data can return 0 instead of raising BlockingIOError, only a read after select is EOF.
+        try:
+            count = os.readv(self.fd, [view])
+            if count > 0:
+                return count
+        except BlockingIOError:
+            pass
+        readable, _, _ = select.select([self.fd], [], [], self.port.timeout)
+        if not readable:
+            return 0
+        try:
+            return os.readv(self.fd, [view])
+        except BlockingIOError:
+            return 0
+
+    def fill(self) -> int:
+        """
+        Reads once from the port into the buffer, returning the number of bytes read, 0 on timeout or end of file.
+        """
+        if len(self.buffer) - self.end < self.read_size:
+            pending = self.end - self.start
+            if pending >= len(self.buffer):
+                raise BufferError(f"No frame was found in {len(self.buffer)} bytes, the buffer is too small")
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+        count = self._readinto(self.view[self.end:min(self.end + self.read_size, len(self.buffer))])
+        if self.capture is not None and count > 0:
+            self.capture.record(READ, self.view[self.end:self.end + count])
+        self.end += count
+        return count
+
+    def frames(self):
+        """
+        Yields the complete frames already in the buffer.
+        """
+        split = self.splitter.split
+        buffer = self.buffer
+        view = self.view
+        while True:
+            frame = split(buffer, self.start, self.end)
+            if frame is None:
+                return
+            frame_start, frame_end, self.start = frame
+            yield view[frame_start:frame_end]
+
+    def __iter__(self):
+        """
+        Yields frames until a read returns no data, at end of file or when the port's read timeout expires.
+        """
+        while True:
+            yield from self.frames()
+            if self.fill() == 0:
+                return
+
+    def pending(self) -> memoryview:
+        """
+        Returns the bytes read that are not yet part of a complete frame.
+        """
+        return self.view[self.start:self.end]
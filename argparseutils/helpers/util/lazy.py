@@ -0,0 +1,79 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib
+from time import perf_counter
+from types import ModuleType
+from typing import Any
+
+from argparseutils.helpers.util import profiling
+
+
+class LazyModule:
+    """
+    LazyModule defers importing the module `name` until one of its attributes is first accessed. Only dunder
+    attributes live on the proxy itself so it never shadows an attribute of the wrapped module.
+
+    :param name: The fully qualified module name to import
+    :param extra: The setup.py extra that provides the module, used in the error message if it is missing
+    """
+
+    def __init__(self, name: str, extra: str = None):
+        object.__setattr__(self, '__lazy_name__', name)
+        object.__setattr__(self, '__lazy_extra__', extra)
+        object.__setattr__(self, '__lazy_module__', None)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(load_module(self), name)
+
+    def __repr__(self):
+        return f"<LazyModule {object.__getattribute__(self, '__lazy_name__')}>"
+
+
+def lazy_import(name: str, extra: str = None) -> LazyModule:
+    return LazyModule(name, extra)
+
+
+def is_loaded(lazy_module: LazyModule) -> bool:
+    return object.__getattribute__(lazy_module, '__lazy_module__') is not None
+
+
+def load_module(lazy_module: LazyModule) -> ModuleType:
+    module = object.__getattribute__(lazy_module, '__lazy_module__')
+    if module is None:
+        name = object.__getattribute__(lazy_module, '__lazy_name__')
+        extra = object.__getattribute__(lazy_module, '__lazy_extra__')
+        profiler = profiling.profiler
+        start = perf_counter()
+        try:
+            module = importlib.import_module(name)
+        except ImportError as e:
+            if extra is None:
+                raise
+            raise ImportError(f"{name} is required for this helper, install it with: "
+                              f"pip install ArgumentParserUtils[{extra}]") from e
+        if profiler is not None:
+            profiler.record_current(f"import {name}", "", perf_counter() - start)
+        object.__setattr__(lazy_module, '__lazy_module__', module)
+    return module
+
+
+def set_module(lazy_module: LazyModule, module):
+    """
+    Replaces the module behind `lazy_module`, without importing it. Used to stub out a backend in tests and
+    benchmarks, passing None restores the lazy import.
+    """
+    object.__setattr__(lazy_module, '__lazy_module__', module)
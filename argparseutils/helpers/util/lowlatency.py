@@ -0,0 +1,140 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Tunes the kernel side of an open serial port for request/response latency. Each setting is applied independently and
+reported as "applied" or the reason it was not, as most only apply to some drivers or platforms.
+"""
+import os
+
+APPLIED = "applied"
+
+
+def get_latency_timer_path(device: str) -> str:
+    """
+    Returns the sysfs latency_timer of a USB serial adapter, such as the FTDI ftdi_sio driver exposes.
+    """
+    name = os.path.basename(os.path.realpath(device))
+    return os.path.join("/sys/class/tty", name, "device", "latency_timer")
+
+
+def set_low_latency(port, low_latency: bool) -> str:
+    if not hasattr(port, 'set_low_latency_mode'):
+        return "not supported on this platform"
+    try:
+        port.set_low_latency_mode(low_latency)
+    except ValueError as e:
+        return str(e)
+    return APPLIED
+
+
+def set_latency_timer(port, latency_timer: int) -> str:
+    path = get_latency_timer_path(port.port)
+    if not os.path.exists(path):
+        return f"{path} does not exist, the driver has no latency timer"
+    try:
+        with open(path, "w") as timer_file:
+            timer_file.write(f"{latency_timer}\n")
+    except OSError as e:
+        return f"{path} is not writable: {e}"
+    return APPLIED
+
+
+def set_vmin_vtime(port, vmin: int = None, vtime: int = None) -> str:
+    try:
+        import termios
+    except ImportError:
+        return "not supported on this platform"
+    try:
+        write_vmin_vtime(port, vmin, vtime)
+    except termios.error as e:
+        return str(e)
+    keep_vmin_vtime(port, vmin, vtime)
+    return APPLIED
+
+
+def write_vmin_vtime(port, vmin: int = None, vtime: int = None):
+    import termios
+
+    attributes = termios.tcgetattr(port.fileno())
+    if vmin is not None:
+        attributes[6][termios.VMIN] = vmin
+    if vtime is not None:
+        attributes[6][termios.VTIME] = vtime
+    termios.tcsetattr(port.fileno(), termios.TCSANOW, attributes)
+
+
+def keep_vmin_vtime(port, vmin: int = None, vtime: int = None):
+    """
+    pyserial's _reconfigure_port rewrites VMIN and VTIME from its own timeouts whenever a setting such as the baudrate
+    or timeout is changed on the open port, so `vmin` and `vtime` are written again after each reconfigure.
+    """
+    reconfigure = getattr(port, '_reconfigure_port', None)
+    if reconfigure is None:
+        return
+    reconfigure = getattr(reconfigure, '__wrapped__', reconfigure)
+
+    def reconfigure_port(*args, **kwargs):
+        reconfigure(*args, **kwargs)
+        write_vmin_vtime(port, vmin, vtime)
+
+    reconfigure_port.__wrapped__ = reconfigure
+    port._reconfigure_port = reconfigure_port
+
+
+def set_buffer_size(port, rx_size: int = None, tx_size: int = None) -> str:
+    if not hasattr(port, 'set_buffer_size'):
+        return "not supported on this platform, the kernel tty buffers are fixed"
+    kwargs = {}
+    if rx_size is not None:
+        kwargs['rx_size'] = rx_size
+    if tx_size is not None:
+        kwargs['tx_size'] = tx_size
+    port.set_buffer_size(**kwargs)
+    return APPLIED
+
+
+def apply_latency_settings(port, low_latency: bool = None, latency_timer: int = None, vmin: int = None,
+                           vtime: int = None, rx_buffer_size: int = None, tx_buffer_size: int = None) -> dict:
+    """
+    Applies the settings that are not None to the open `port`.
+
+    :param low_latency: Sets or clears ASYNC_LOW_LATENCY with TIOCSSERIAL
+    :param latency_timer: The USB serial adapter latency timer, in milliseconds, set through sysfs
+    :param vmin: The termios VMIN, the number of bytes that makes the port readable
+    :param vtime: The termios VTIME, in tenths of a second
+    :param rx_buffer_size: The driver receive buffer size
+    :param tx_buffer_size: The driver transmit buffer size
+    :return: A dict of each setting applied to "applied" or the reason it was not
+    """
+    results = {}
+    if low_latency is not None:
+        results['low_latency'] = set_low_latency(port, low_latency)
+    if latency_timer is not None:
+        results['latency_timer'] = set_latency_timer(port, latency_timer)
+    if vmin is not None or vtime is not None:
+        result = set_vmin_vtime(port, vmin, vtime)
+        if vmin is not None:
+            results['vmin'] = result
+        if vtime is not None:
+            results['vtime'] = result
+    if rx_buffer_size is not None or tx_buffer_size is not None:
+        result = set_buffer_size(port, rx_buffer_size, tx_buffer_size)
+        if rx_buffer_size is not None:
+            results['rx_buffer_size'] = result
+        if tx_buffer_size is not None:
+            results['tx_buffer_size'] = result
+    return results
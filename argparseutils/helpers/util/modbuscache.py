@@ -0,0 +1,209 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+A read cache in front of a synchronous pymodbus client, for a process where several components read the same
+registers over one slow bus.
+"""
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from argparseutils.helpers.util.modbusplan import COIL, DISCRETE, HOLDING, INPUT, read_functions
+
+# The client methods that change a unit's data, their responses are never cached and they drop the unit's entries.
+write_functions = ("write_coil", "write_coils", "write_register", "write_registers", "mask_write_register",
+                   "readwrite_registers")
+
+# The names of the unit argument, device_id since pymodbus 3.10 and slave before.
+unit_arguments = ("device_id", "slave")
+
+
+def get_write_unit(function, args, kwargs):
+    """
+    Returns the unit a call of the client's write `function` with `args` and `kwargs` writes to, or None if it can
+    not be told, in which case every unit's entries should be dropped.
+    """
+    try:
+        signature = inspect.signature(function)
+        bound = signature.bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        return None
+    for name in unit_arguments:
+        if name in bound.arguments:
+            return bound.arguments[name]
+        parameter = signature.parameters.get(name)
+        if parameter is not None and parameter.default is not inspect.Parameter.empty:
+            return parameter.default
+    return None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    expired: int = 0
+    evictions: int = 0
+
+    @property
+    def requests(self) -> int:
+        return self.hits + self.misses + self.coalesced
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of the reads answered without a bus request of their own, from the cache or an identical read
+        already in flight.
+        """
+        return (self.hits + self.coalesced) / self.requests if self.requests > 0 else 0.0
+
+
+class InFlight:
+    __slots__ = ("done", "response", "error", "generation")
+
+    def __init__(self, generation):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+        self.generation = generation
+
+
+class ModbusReadCache:
+    """
+    Wraps a pymodbus client, such as the one from ModbusSerialHelper.create_modbus_serial, caching the responses of
+    read_holding_registers, read_input_registers, read_coils and read_discrete_inputs per (unit, function, address,
+    count) for `ttl` seconds, evicting the least recently used beyond `max_size` entries. A read identical to one in
+    flight on another thread waits for its response rather than sending its own request. Error responses are not
+    cached, a write drops the entries of its unit, and every other attribute is the client's. Each unit has a
+    generation that a write moves on, a response read before the write finished is returned but not cached, and later
+    reads do not wait for it.
+
+    The cached responses are shared between callers and must not be modified. The bus requests are serialised, so
+    threads can share the cache.
+
+    :param client: The synchronous pymodbus client
+    :param ttl: How long a response is reused (seconds), 0 only coalesces the reads in flight
+    :param max_size: The most responses kept
+    :param clock: The monotonic clock the entries expire by
+    """
+
+    def __init__(self, client, ttl: float = 1.0, max_size: int = 1024, clock=time.monotonic):
+        self.client = client
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.generation = 0
+        self.unit_generations = {}
+        self.lock = threading.Lock()
+        self.client_lock = threading.RLock()
+        self.stats = CacheStats()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if name in write_functions:
+            def write(*args, **kwargs):
+                with self.client_lock:
+                    try:
+                        return attribute(*args, **kwargs)
+                    finally:
+                        self.invalidate(get_write_unit(attribute, args, kwargs))
+            return write
+        return attribute
+
+    def get_generation(self, device_id: int):
+        return self.generation, self.unit_generations.get(device_id, 0)
+
+    def read(self, function: str, address: int, count: int = 1, device_id: int = 1):
+        key = (device_id, function, address, count)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, response = entry
+                if self.clock() < expires:
+                    self.entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return response
+                del self.entries[key]
+                self.stats.expired += 1
+            flight = self.in_flight.get(key)
+            owner = flight is None
+            if owner:
+                flight = self.in_flight[key] = InFlight(self.get_generation(device_id))
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            with self.client_lock:
+                flight.response = getattr(self.client, function)(address, count=count, device_id=device_id)
+            return flight.response
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.in_flight.get(key) is flight:
+                    del self.in_flight[key]
+                if flight.error is None and self.ttl > 0 and not flight.response.isError() and \
+                        flight.generation == self.get_generation(device_id):
+                    self.entries[key] = (self.clock() + self.ttl, flight.response)
+                    while len(self.entries) > self.max_size:
+                        self.entries.popitem(last=False)
+                        self.stats.evictions += 1
+            flight.done.set()
+
+    def read_holding_registers(self, address: int, *, count: int = 1, device_id: int = 1):
+        return self.read(read_functions[HOLDING], address, count, device_id)
+
+    def read_input_registers(self, address: int, *, count: int = 1, device_id: int = 1):
+        return self.read(read_functions[INPUT], address, count, device_id)
+
+    def read_coils(self, address: int, *, count: int = 1, device_id: int = 1):
+        return self.read(read_functions[COIL], address, count, device_id)
+
+    def read_discrete_inputs(self, address: int, *, count: int = 1, device_id: int = 1):
+        return self.read(read_functions[DISCRETE], address, count, device_id)
+
+    def invalidate(self, device_id: int = None):
+        """
+        Drops the entries of a unit, or every entry when device_id is None, and moves the unit's generation on so the
+        reads in flight are not cached.
+        """
+        with self.lock:
+            if device_id is None:
+                self.generation += 1
+                self.entries.clear()
+                self.in_flight.clear()
+            else:
+                self.unit_generations[device_id] = self.unit_generations.get(device_id, 0) + 1
+                for key in [key for key in self.entries if key[0] == device_id]:
+                    del self.entries[key]
+                for key in [key for key in self.in_flight if key[0] == device_id]:
+                    del self.in_flight[key]
+
+    def __len__(self):
+        return len(self.entries)
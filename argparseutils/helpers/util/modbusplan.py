@@ -0,0 +1,203 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Plans the reads of a Modbus register map as the fewest contiguous requests. At low baudrates the request overhead, the
+frame headers, CRC, turnaround and inter-frame gaps, costs more than reading a few registers nobody asked for.
+"""
+from dataclasses import dataclass, field
+from itertools import groupby
+from typing import List, Optional
+
+from argparseutils.helpers.util.lazy import lazy_import
+
+pymodbus_exceptions = lazy_import("pymodbus.exceptions", extra="modbus")
+
+HOLDING, INPUT, COIL, DISCRETE = "holding", "input", "coil", "discrete"
+
+# The Modbus limits on the number of registers or bits in one read.
+MAX_REGISTERS = 125
+MAX_BITS = 2000
+
+read_functions = {
+    HOLDING: "read_holding_registers",
+    INPUT: "read_input_registers",
+    COIL: "read_coils",
+    DISCRETE: "read_discrete_inputs",
+}
+
+datatype_sizes = dict(int16=1, uint16=1, int32=2, uint32=2, float32=2, int64=4, uint64=4, float64=4)
+
+
+@dataclass
+class ModbusPoint:
+    """
+    A point of a register map.
+
+    :param name: The key of the point's value in the results
+    :param address: The address of the first register or bit
+    :param type: One of holding, input, coil or discrete
+    :param count: The number of registers or bits, defaults to the size of `datatype` or 1
+    :param unit: The device id of the unit
+    :param datatype: A pymodbus DATATYPE name, such as int16, uint32 or float32, the registers are decoded with
+                     convert_from_registers, otherwise the value is the list of registers or bits, or the single
+                     register or bit when count is 1
+    :param word_order: The word order of multi register datatypes, big or little
+    """
+    name: str
+    address: int
+    type: str = HOLDING
+    count: Optional[int] = None
+    unit: int = 1
+    datatype: Optional[str] = None
+    word_order: str = "big"
+
+    def __post_init__(self):
+        if self.type not in read_functions:
+            raise ValueError(f"Point {self.name} has type {self.type}, expected one of {list(read_functions)}")
+        if self.count is None:
+            self.count = datatype_sizes.get(self.datatype, 1) if self.datatype is not None else 1
+        if self.count < 1:
+            raise ValueError(f"Point {self.name} has count {self.count}, expected at least 1")
+
+
+@dataclass
+class ReadRequest:
+    unit: int
+    type: str
+    address: int
+    count: int
+    points: List[ModbusPoint] = field(default_factory=list)
+
+    @property
+    def end(self) -> int:
+        return self.address + self.count
+
+
+def plan_reads(points, max_gap: int = 0, max_registers: int = MAX_REGISTERS, max_bits: int = MAX_BITS) -> list:
+    """
+    Merges the points into the fewest contiguous ReadRequests. Points of the same unit and type are merged when the
+    gap between them is at most `max_gap` registers or bits and the request stays within the limit for its type.
+
+    :param points: The ModbusPoints to read
+    :param max_gap: The most unrequested registers or bits read to join two points into one request
+    :param max_registers: The most registers in one request, 125 in the Modbus specification
+    :param max_bits: The most coils or discrete inputs in one request, 2000 in the Modbus specification
+    :return: A list of ReadRequests, ordered by unit, type and address
+    """
+    requests = []
+    ordered = sorted(points, key=lambda point: (point.unit, point.type, point.address, point.count))
+    for (unit, point_type), group in groupby(ordered, key=lambda point: (point.unit, point.type)):
+        is_bits = point_type in (COIL, DISCRETE)
+        limit = max_bits if is_bits else max_registers
+        request = None
+        for point in group:
+            if point.count > limit:
+                raise ValueError(f"Point {point.name} reads {point.count} {'bits' if is_bits else 'registers'}, "
+                                 f"more than the limit of {limit}")
+            end = max(request.end, point.address + point.count) if request is not None else 0
+            if request is not None and point.address - request.end <= max_gap and end - request.address <= limit:
+                request.count = end - request.address
+                request.points.append(point)
+            else:
+                request = ReadRequest(unit, point_type, point.address, point.count, [point])
+                requests.append(request)
+    return requests
+
+
+class ModbusReadPlanner:
+    """
+    Reads a register map through a pymodbus client, such as the one from ModbusSerialHelper.create_modbus_serial, with
+    the requests from plan_reads and decodes the responses back into a value per point.
+
+    :param points: The ModbusPoints to read
+    :param max_gap: The most unrequested registers or bits read to join two points into one request
+    """
+
+    def __init__(self, points, max_gap: int = 0, max_registers: int = MAX_REGISTERS, max_bits: int = MAX_BITS):
+        self.points = list(points)
+        names = [point.name for point in self.points]
+        if len(set(names)) != len(names):
+            raise ValueError("Point names must be unique")
+        self.requests = plan_reads(self.points, max_gap=max_gap, max_registers=max_registers, max_bits=max_bits)
+        self.errors = {}
+
+    def decode(self, client, request: ReadRequest, response, values: dict):
+        data = response.bits if request.type in (COIL, DISCRETE) else response.registers
+        for point in request.points:
+            offset = point.address - request.address
+            value = data[offset:offset + point.count]
+            if point.datatype is not None:
+                value = client.convert_from_registers(value, client.DATATYPE[point.datatype.upper()],
+                                                      word_order=point.word_order)
+            elif point.count == 1:
+                value = value[0]
+            values[point.name] = value
+
+    def handle_error(self, request: ReadRequest, error):
+        for point in request.points:
+            self.errors[point.name] = error
+
+    def handle_response(self, client, request: ReadRequest, response, values: dict):
+        if response.isError():
+            self.handle_error(request, response)
+        else:
+            for point in request.points:
+                self.errors.pop(point.name, None)
+            self.decode(client, request, response, values)
+
+    def read_request(self, client, request: ReadRequest, values: dict):
+        """
+        Reads one request into `values`. A unit that does not answer makes pymodbus raise rather than return an error
+        response, the exception is kept in `errors` like an error response so the other requests still run.
+        """
+        try:
+            response = getattr(client, read_functions[request.type])(request.address, count=request.count,
+                                                                     device_id=request.unit)
+        except pymodbus_exceptions.ModbusException as e:
+            self.handle_error(request, e)
+        else:
+            self.handle_response(client, request, response, values)
+
+    async def read_request_async(self, client, request: ReadRequest, values: dict):
+        try:
+            response = await getattr(client, read_functions[request.type])(request.address, count=request.count,
+                                                                           device_id=request.unit)
+        except pymodbus_exceptions.ModbusException as e:
+            self.handle_error(request, e)
+        else:
+            self.handle_response(client, request, response, values)
+
+    def read(self, client) -> dict:
+        """
+        Reads every point with a synchronous client, returning a dict of point name to value. Points whose request
+        failed are left out and their error responses, or the pymodbus exceptions raised, are in `errors`.
+        """
+        values = {}
+        self.errors = {}
+        for request in self.requests:
+            self.read_request(client, request, values)
+        return values
+
+    async def read_async(self, client) -> dict:
+        """
+        Reads every point with an async client, such as the one from ModbusSerialHelper.create_async_modbus_serial.
+        """
+        values = {}
+        self.errors = {}
+        for request in self.requests:
+            await self.read_request_async(client, request, values)
+        return values
@@ -0,0 +1,185 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Polls several Modbus serial buses at once, one worker per ModbusSerialHelper shard. Each worker owns its bus's client
+and reads its register map with a ModbusReadPlanner, the results of every bus are merged into one stream.
+"""
+import logging
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Optional
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.util.modbusplan import ModbusReadPlanner
+from argparseutils.helpers.utils import RegistryContext, get_registry_context, get_shard_registry
+
+
+@dataclass
+class PollResult:
+    """
+    One poll of a bus. `errors` is a dict of point name, or "bus" when the whole poll failed, to the error's text.
+    """
+    shard: str
+    values: dict
+    errors: dict
+    latency: float
+    timestamp: float
+
+
+@dataclass
+class BusStats:
+    polls: int = 0
+    errors: int = 0
+    total_latency: float = 0.0
+    min_latency: Optional[float] = None
+    max_latency: float = 0.0
+    last_error: Optional[str] = None
+
+    @property
+    def mean_latency(self) -> Optional[float]:
+        return self.total_latency / self.polls if self.polls else None
+
+    def add(self, result: PollResult):
+        self.polls += 1
+        self.total_latency += result.latency
+        self.max_latency = max(self.max_latency, result.latency)
+        self.min_latency = result.latency if self.min_latency is None else min(self.min_latency, result.latency)
+        if result.errors:
+            self.errors += 1
+            self.last_error = next(iter(result.errors.values()))
+
+
+def poll_bus(args, shard: str, points, interval: float, max_gap: int, results, stopping, cycles: int = None,
+             registry_context: RegistryContext = None):
+    """
+    The worker of one bus, run in a thread or a process. Puts a PollResult on `results` for every poll and None when
+    it stops. Args sent to a process do not carry their RegistryContext, it is passed as `registry_context`.
+    """
+    try:
+        planner = ModbusReadPlanner(points, max_gap=max_gap)
+        with registry_context if registry_context is not None else nullcontext():
+            client = ModbusSerialHelper.create_modbus_serial(args, shard)
+        try:
+            client.connect()
+            polls = 0
+            next_poll = time.monotonic()
+            while not stopping.is_set() and (cycles is None or polls < cycles):
+                start = time.perf_counter()
+                try:
+                    values = planner.read(client)
+                    errors = {name: str(error) for name, error in planner.errors.items()}
+                except Exception as e:
+                    values, errors = {}, {"bus": f"{type(e).__name__}: {e}"}
+                results.put(PollResult(shard, values, errors, time.perf_counter() - start, time.time()))
+                polls += 1
+                next_poll += interval
+                wait = next_poll - time.monotonic()
+                if wait > 0:
+                    stopping.wait(wait)
+                else:
+                    next_poll = time.monotonic()
+        finally:
+            client.close()
+    except Exception as e:
+        results.put(PollResult(shard, {}, {"bus": f"{type(e).__name__}: {e}"}, 0.0, time.time()))
+    finally:
+        results.put(None)
+
+
+class ModbusMultiBusPoller:
+    """
+    Polls the register map of every bus concurrently, one worker per ModbusSerialHelper shard, and merges the results
+    into one stream of PollResults with per bus latency and error counters in `stats`.
+
+    :param args: The parsed arguments
+    :param points: A dict of shard to the ModbusPoints read on that bus
+    :param interval: The time between the start of two polls of a bus, 0 polls continuously
+    :param max_gap: The gap tolerance used to plan the reads of each bus
+    :param use_processes: Run each worker in its own process rather than a thread, the args and points must pickle
+    :param cycles: Stop each worker after this many polls, polls until `stop` when None
+    """
+    logger = logging.getLogger("ModbusMultiBusPoller")
+
+    def __init__(self, args, points: dict, interval: float = 1.0, max_gap: int = 0, use_processes: bool = False,
+                 cycles: int = None):
+        self.args = args
+        self.points = points
+        self.interval = interval
+        self.max_gap = max_gap
+        self.use_processes = use_processes
+        self.cycles = cycles
+        self.stats = {shard: BusStats() for shard in points}
+        self.workers = []
+        self.running = 0
+        if use_processes:
+            import multiprocessing
+            self.results = multiprocessing.Queue()
+            self.stopping = multiprocessing.Event()
+        else:
+            self.results = queue.Queue()
+            self.stopping = threading.Event()
+
+    def start(self):
+        if self.workers:
+            return self
+        if self.use_processes:
+            import multiprocessing
+            worker_class = multiprocessing.Process
+        else:
+            worker_class = threading.Thread
+        for shard, points in self.points.items():
+            get_shard_registry(args=self.args).validate_shard(ModbusSerialHelper, shard)
+            worker = worker_class(target=poll_bus, name=f"ModbusMultiBusPoller {shard}", daemon=True, args=(
+                self.args, shard, list(points), self.interval, self.max_gap, self.results, self.stopping,
+                self.cycles, get_registry_context(args=self.args)))
+            worker.start()
+            self.workers.append(worker)
+        self.running = len(self.workers)
+        return self
+
+    def stop(self):
+        self.stopping.set()
+
+    def join(self):
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        # Drain the queue so that process workers blocked putting their last results can exit.
+        for _ in self:
+            pass
+        self.join()
+
+    def __iter__(self):
+        """
+        Yields the PollResults of every bus as they arrive, until every worker has stopped.
+        """
+        self.start()
+        while self.running > 0:
+            result = self.results.get()
+            if result is None:
+                self.running -= 1
+                continue
+            self.stats[result.shard].add(result)
+            yield result
@@ -0,0 +1,221 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+A pool of Modbus TCP connections to gateways. A gateway to a serial bus answers one request per unit at a time, a
+connection carries one request at a time, and separate gateways are independent, so requests are queued per gateway
+and run as connections and units become free while every gateway works in parallel.
+"""
+import threading
+from argparse import ArgumentParser, Namespace
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+
+from argparseutils.helpers.modbushelper import ModbusTcpHelper
+from argparseutils.helpers.utils import get_args, get_shard_registry
+
+
+@dataclass
+class GatewayStats:
+    requests: int = 0
+    waits: int = 0
+    connects: int = 0
+    in_use: int = 0
+    max_in_use: int = 0
+
+
+class GatewayPool:
+    """
+    Reuses at most `len(clients)` connections to one gateway. A caller waits for a free connection, and with
+    `unit_lock` for any other request to the same unit to finish first.
+
+    :param name: The gateway, host:port
+    :param clients: The unconnected pymodbus clients, connected when first used
+    :param unit_lock: Allow one request at a time per unit
+    """
+
+    def __init__(self, name: str, clients: list, unit_lock: bool = True):
+        self.name = name
+        self.clients = list(clients)
+        self.idle = list(self.clients)
+        self.unit_lock = unit_lock
+        self.unit_locks = {}
+        self.unit_queues = {}
+        self.condition = threading.Condition()
+        self.stats = GatewayStats()
+        self.executor = None
+
+    def get_unit_lock(self, unit):
+        if not self.unit_lock or unit is None:
+            return nullcontext()
+        with self.condition:
+            return self.unit_locks.setdefault(unit, threading.Lock())
+
+    @contextmanager
+    def connection(self, unit: int = None):
+        """
+        Borrows a connected client for requests to `unit`.
+        """
+        with self.get_unit_lock(unit):
+            with self.condition:
+                if len(self.idle) == 0:
+                    self.stats.waits += 1
+                    self.condition.wait_for(lambda: len(self.idle) > 0)
+                client = self.idle.pop()
+                self.stats.requests += 1
+                self.stats.in_use += 1
+                self.stats.max_in_use = max(self.stats.max_in_use, self.stats.in_use)
+            try:
+                if not client.connected:
+                    self.stats.connects += 1
+                    if not client.connect():
+                        raise ConnectionError(f"Could not connect to the modbus gateway {self.name}")
+                yield client
+            finally:
+                with self.condition:
+                    self.idle.append(client)
+                    self.stats.in_use -= 1
+                    self.condition.notify()
+
+    def call(self, unit, function, *args):
+        with self.connection(unit) as client:
+            return function(client, *args)
+
+    def submit(self, unit, function, *args):
+        """
+        Queues `function(client, *args)` on the gateway's own workers, one per connection, returning a Future.
+
+        With `unit_lock` the requests to a unit are queued per unit and run one after another by a single worker, so
+        the other workers are never held waiting for a busy unit while requests to other units are queued.
+        """
+        with self.condition:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=len(self.clients), thread_name_prefix=self.name)
+            if not self.unit_lock or unit is None:
+                return self.executor.submit(self.call, unit, function, *args)
+            future = Future()
+            queue = self.unit_queues.get(unit)
+            if queue is not None:
+                queue.append((future, function, args))
+                return future
+            self.unit_queues[unit] = deque([(future, function, args)])
+            self.executor.submit(self.run_unit, unit)
+        return future
+
+    def run_unit(self, unit):
+        """
+        Runs the queued requests to `unit` until its queue is empty.
+        """
+        while True:
+            with self.condition:
+                queue = self.unit_queues[unit]
+                if len(queue) == 0:
+                    del self.unit_queues[unit]
+                    return
+                future, function, args = queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self.call(unit, function, *args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        with self.condition:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
+        for client in self.clients:
+            client.close()
+
+
+class ModbusTcpPool:
+    """
+    Connection pools for the gateways of the ModbusTcpHelper shards. Shards with the same host and port share one
+    GatewayPool, the connection options, modbus-tcp-max-connections and modbus-tcp-unit-lock are taken from the
+    first of them.
+
+    :param args: The parsed arguments
+    :param shards: The shards of the gateways, defaults to every shard registered for the helper
+    :param parser: The parser the shards were registered on, used to find its ShardRegistry
+    :param helper_class: The helper used to create the clients
+    """
+
+    def __init__(self, args: Namespace, shards: list = None, parser: ArgumentParser = None,
+                 helper_class=ModbusTcpHelper):
+        if shards is None:
+            shards = get_shard_registry(parser, args).registered_shards(helper_class)
+        self.gateways = {}
+        self.shards = {}
+        for shard in shards:
+            get_shard_registry(parser, args).validate_shard(helper_class, shard)
+            shard_args = get_args(args, shard)
+            name = f"{shard_args.modbus_tcp_host}:{shard_args.modbus_tcp_port}"
+            if name not in self.gateways:
+                max_connections = shard_args.modbus_tcp_max_connections
+                if max_connections < 1:
+                    raise ValueError(f"Shard {shard} has modbus-tcp-max-connections {max_connections}, "
+                                     f"expected at least 1")
+                clients = [helper_class.create_modbus_tcp(args, shard) for _ in range(max_connections)]
+                self.gateways[name] = GatewayPool(name, clients, shard_args.modbus_tcp_unit_lock)
+            self.shards[shard] = self.gateways[name]
+
+    def connection(self, shard: str = "", unit: int = None):
+        """
+        Borrows a client of the shard's gateway for requests to `unit`, in a with statement.
+        """
+        return self.shards[shard].connection(unit)
+
+    def submit(self, shard: str, unit: int, function, *args):
+        """
+        Runs `function(client, *args)` with a client of the shard's gateway, returning a Future.
+        """
+        return self.shards[shard].submit(unit, function, *args)
+
+    def read(self, planners: dict) -> dict:
+        """
+        Reads the points of a ModbusReadPlanner per shard, every request in flight at once within the limits of its
+        gateway.
+
+        :param planners: A dict of shard to ModbusReadPlanner
+        :return: A dict of shard to the values read, the errors are in each planner's `errors`
+        """
+        values = {shard: {} for shard in planners}
+        futures = []
+        for shard, planner in planners.items():
+            planner.errors = {}
+            futures.extend(self.submit(shard, request.unit, planner.read_request, request, values[shard])
+                           for request in planner.requests)
+        for future in futures:
+            future.result()
+        return values
+
+    def get_stats(self) -> dict:
+        return {name: gateway.stats for name, gateway in self.gateways.items()}
+
+    def close(self):
+        for gateway in self.gateways.values():
+            gateway.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,248 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Schedules the polling of a shared Modbus RTU bus. The time each read holds the bus is computed from the line settings
+of ModbusSerialHelper, and the reads are run earliest deadline first, so fast points are not starved by slow ones and
+the bus is kept busy without sending frames closer together than the 3.5 character inter-frame gap.
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.modbusplan import ModbusReadPlanner, ReadRequest, COIL, DISCRETE
+from argparseutils.helpers.utils import get_args
+
+# Above 19200 baud the Modbus specification fixes the inter-frame gap at 1.75ms.
+FIXED_GAP_BAUDRATE = 19200
+FIXED_FRAME_GAP = 0.00175
+
+# An RTU read request is the unit, function, address, count and CRC. The response is the unit, function, byte count,
+# data and CRC.
+REQUEST_BYTES = 8
+RESPONSE_OVERHEAD_BYTES = 5
+
+
+@dataclass
+class BusTiming:
+    """
+    The timing of an RTU bus.
+
+    :param char_time: The time to send one character, in seconds
+    :param frame_gap: The silent interval that ends a frame, 3.5 characters
+    :param turnaround: The time a unit takes to start answering a request
+    """
+    char_time: float
+    frame_gap: float
+    turnaround: float = 0.005
+
+    @classmethod
+    def from_line(cls, baudrate: int, bytesize: int = 8, parity: str = "N", stopbits: float = 1,
+                  turnaround: float = 0.005) -> 'BusTiming':
+        parity = SerialHelper.parity_map.get(parity, parity)
+        bits = 1 + bytesize + (0 if parity == "N" else 1) + float(stopbits)
+        char_time = bits / baudrate
+        frame_gap = FIXED_FRAME_GAP if baudrate > FIXED_GAP_BAUDRATE else 3.5 * char_time
+        return cls(char_time, frame_gap, turnaround)
+
+    @classmethod
+    def from_args(cls, args, shard: str = "", turnaround: float = 0.005) -> 'BusTiming':
+        """
+        Returns the timing of the bus configured by the ModbusSerialHelper options of `shard` in `args`.
+        """
+        args = get_args(args, shard)
+        return cls.from_line(int(args.modbus_baudrate), int(args.modbus_bytesize), args.modbus_parity,
+                             args.modbus_stopbits, turnaround)
+
+    def get_response_bytes(self, request: ReadRequest) -> int:
+        if request.type in (COIL, DISCRETE):
+            return RESPONSE_OVERHEAD_BYTES + math.ceil(request.count / 8)
+        return RESPONSE_OVERHEAD_BYTES + 2 * request.count
+
+    def get_transaction_time(self, request: ReadRequest) -> float:
+        """
+        Returns the time `request` holds the bus: the request frame, the turnaround, the response frame and the gap
+        after each frame.
+        """
+        characters = REQUEST_BYTES + self.get_response_bytes(request)
+        return characters * self.char_time + 2 * self.frame_gap + self.turnaround
+
+
+class ScheduledRead:
+    def __init__(self, planner: ModbusReadPlanner, request: ReadRequest, interval: float, cost: float):
+        self.planner = planner
+        self.request = request
+        self.interval = interval
+        self.cost = cost
+        self.release = 0.0
+        self.deadline = 0.0
+        self.reads = 0
+        self.missed = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+
+class ModbusBusScheduler:
+    """
+    Polls groups of points at their own intervals over one RTU bus, earliest deadline first. A read is released every
+    `interval` seconds and must complete before the next release, otherwise it counts as a missed deadline. Releases
+    that pass entirely while a read is overdue are skipped, and counted, rather than queued up. A read that fails, for
+    example because its unit does not answer, counts as an error and a missed deadline, and the other reads carry on.
+
+    :param client: A connected client from ModbusSerialHelper.create_modbus_serial
+    :param timing: The BusTiming, see BusTiming.from_args
+    :param callback: Called with (values, errors) after every read, dicts of point name to value and to the error
+                     response or exception
+    :param max_gap: The gap tolerance used to plan the reads of each group
+    """
+    logger = logging.getLogger("ModbusBusScheduler")
+
+    def __init__(self, client, timing: BusTiming, callback=None, max_gap: int = 0, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.client = client
+        self.timing = timing
+        self.callback = callback
+        self.max_gap = max_gap
+        self.clock = clock
+        self.sleep = sleep
+        self.reads = []
+        self.values = {}
+        self.stopping = threading.Event()
+        self.busy_time = 0.0
+        self.elapsed = 0.0
+        self.max_lateness = 0.0
+
+    def add(self, points, interval: float):
+        """
+        Polls `points` every `interval` seconds. Call once per poll rate, for example once per unit.
+        """
+        planner = ModbusReadPlanner(points, max_gap=self.max_gap)
+        for request in planner.requests:
+            self.reads.append(ScheduledRead(planner, request, interval, self.timing.get_transaction_time(request)))
+
+    def get_demand(self) -> float:
+        """
+        Returns the fraction of the bus time the scheduled reads need. Earliest deadline first meets every deadline
+        while this is at most 1.
+        """
+        return sum(read.cost / read.interval for read in self.reads)
+
+    def get_stats(self) -> dict:
+        reads = sum(read.reads for read in self.reads)
+        missed = sum(read.missed for read in self.reads)
+        return dict(
+            reads=reads,
+            errors=sum(read.errors for read in self.reads),
+            missed_deadlines=missed,
+            skipped_releases=sum(read.skipped for read in self.reads),
+            missed_ratio=missed / reads if reads else 0.0,
+            max_lateness=self.max_lateness,
+            demand=self.get_demand(),
+            utilisation=self.busy_time / self.elapsed if self.elapsed else 0.0,
+            busy_time=self.busy_time,
+            elapsed=self.elapsed,
+        )
+
+    def stop(self):
+        self.stopping.set()
+
+    def execute(self, read: ScheduledRead) -> dict:
+        values = {}
+        try:
+            read.planner.read_request(self.client, read.request, values)
+        except Exception as e:
+            # The planner keeps Modbus errors, anything else the client raises must not stop the other reads either.
+            self.logger.warning(f"Reading {read.request.count} from {read.request.address} of unit "
+                                f"{read.request.unit} failed: {e}")
+            read.planner.handle_error(read.request, e)
+        return values
+
+    def run(self, duration: float = None):
+        """
+        Polls until `stop` is called, or for `duration` seconds.
+        """
+        demand = self.get_demand()
+        if demand > 1:
+            self.logger.warning(f"The scheduled reads need {demand:.0%} of the bus, deadlines will be missed")
+
+        start = self.clock()
+        end = None if duration is None else start + duration
+        waiting = []
+        for read in self.reads:
+            read.release = start
+            read.deadline = start + read.interval
+            heapq.heappush(waiting, (read.release, id(read), read))
+        ready = []
+        bus_free = start
+
+        try:
+            while not self.stopping.is_set():
+                now = self.clock()
+                if end is not None and now >= end:
+                    break
+                while waiting and waiting[0][0] <= now:
+                    _, _, read = heapq.heappop(waiting)
+                    heapq.heappush(ready, read)
+                if not ready:
+                    wake = waiting[0][0] if waiting else end
+                    if wake is None:
+                        # There is nothing to read, wait for stop.
+                        self.stopping.wait()
+                        continue
+                    if end is not None:
+                        wake = min(wake, end)
+                    self.sleep(max(0.0, wake - now))
+                    continue
+
+                read = heapq.heappop(ready)
+                if now < bus_free:
+                    self.sleep(bus_free - now)
+                begin = self.clock()
+                values = self.execute(read)
+                finished = self.clock()
+                self.busy_time += finished - begin
+                bus_free = finished + self.timing.frame_gap
+                read.reads += 1
+                lateness = finished - read.deadline
+                if lateness > 0:
+                    self.max_lateness = max(self.max_lateness, lateness)
+                errors = {point.name: read.planner.errors[point.name] for point in read.request.points
+                          if point.name in read.planner.errors}
+                if len(errors) > 0:
+                    read.errors += 1
+                if lateness > 0 or len(errors) > 0:
+                    read.missed += 1
+                self.values.update(values)
+                if self.callback is not None:
+                    self.callback(values, errors)
+
+                read.release += read.interval
+                if read.release + read.interval < finished:
+                    # Skip the releases that were missed entirely.
+                    skipped = int((finished - read.release) // read.interval)
+                    read.skipped += skipped
+                    read.release += skipped * read.interval
+                read.deadline = read.release + read.interval
+                heapq.heappush(waiting, (read.release, id(read), read))
+        finally:
+            self.elapsed += self.clock() - start
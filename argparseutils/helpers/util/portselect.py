@@ -0,0 +1,240 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Port selectors pick a serial port by what it is rather than the name the kernel gave it:
+
+    usb:vid=0403,pid=6001,serial=A1B2   Matches the USB vendor and product ids, serial number, manufacturer, product,
+                                        interface and location, the ids are hexadecimal
+    by-id:usb-FTDI_FT232R_*             Matches the names of the /dev/serial/by-id links to the port
+    location:1-1.2                      Matches the USB location of the port
+
+Values may contain the * and ? wildcards. Anything else is used as the port name unchanged.
+"""
+import fnmatch
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from functools import lru_cache
+
+from argparseutils.helpers.util.speccache import get_cache_dir
+
+selector_kinds = ("usb", "by-id", "location")
+usb_keys = dict(vid="vid", pid="pid", serial="serial_number", manufacturer="manufacturer", product="product",
+                interface="interface", location="location")
+by_id_dir = "/dev/serial/by-id"
+
+
+def is_port_selector(value) -> bool:
+    return isinstance(value, str) and value.partition(":")[0] in selector_kinds
+
+
+def get_by_id_links() -> dict:
+    """
+    Returns a dict of device to the names of its /dev/serial/by-id links.
+    """
+    links = {}
+    if os.path.isdir(by_id_dir):
+        for name in sorted(os.listdir(by_id_dir)):
+            links.setdefault(os.path.realpath(os.path.join(by_id_dir, name)), []).append(name)
+    return links
+
+
+def get_port_entry(port, links: dict) -> dict:
+    entry = {key: getattr(port, key, None) for key in
+             ("device", "description", "hwid", "vid", "pid", "serial_number", "location", "manufacturer", "product",
+              "interface")}
+    for key in ("vid", "pid"):
+        if entry[key] is not None:
+            entry[key] = f"{entry[key]:04x}"
+    entry['by_id'] = links.get(os.path.realpath(port.device), [])
+    return entry
+
+
+def match_value(pattern: str, value) -> bool:
+    return value is not None and fnmatch.fnmatchcase(str(value).lower(), pattern.lower())
+
+
+def match_entry(selector: str, entry: dict) -> bool:
+    kind, _, value = selector.partition(":")
+    if kind == "by-id":
+        return any(match_value(value, name) for name in entry['by_id'])
+    if kind == "location":
+        return match_value(value, entry['location'])
+    for term in value.split(","):
+        key, _, pattern = term.partition("=")
+        key = key.strip()
+        if key not in usb_keys:
+            raise ValueError(f"Unknown key {key} in port selector {selector}, expected one of {list(usb_keys)}")
+        pattern = pattern.strip()
+        if key in ("vid", "pid"):
+            pattern = pattern.lower().removeprefix("0x")
+            if not any(wildcard in pattern for wildcard in "*?["):
+                pattern = pattern.zfill(4)
+        if not match_value(pattern, entry[usb_keys[key]]):
+            return False
+    return True
+
+
+class PortIndex:
+    """
+    PortIndex enumerates the serial ports once per process and caches the result on disk for `ttl` seconds, so that
+    resolving the selectors of many shards, or of many processes started together, costs a single enumeration.
+
+    :param cache_path: The file holding the cached index, defaults to `$XDG_CACHE_HOME/argparseutils/serial-ports.json`
+    :param ttl: The number of seconds the cached index is used for
+    """
+    logger = logging.getLogger("PortIndex")
+
+    def __init__(self, cache_path: str = None, ttl: float = 5.0):
+        if cache_path is None:
+            cache_path = os.path.join(get_cache_dir(), "serial-ports.json")
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.entries = None
+        self.enumerated = False
+        self.lock = threading.RLock()
+
+    def load(self):
+        try:
+            if time.time() - os.stat(self.cache_path).st_mtime > self.ttl:
+                return None
+            with open(self.cache_path, "r") as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring invalid serial port index {self.cache_path}: {e}")
+            return None
+
+    def save(self, entries: list):
+        tmp_path = None
+        try:
+            cache_dir = os.path.dirname(self.cache_path)
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+            with os.fdopen(fd, "w") as index_file:
+                json.dump(entries, index_file, separators=(',', ':'))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.logger.warning(f"Serial port index can not be cached: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def enumerate(self) -> list:
+        from argparseutils.helpers.serialport import get_known_ports
+
+        get_known_ports.cache_clear()
+        links = get_by_id_links()
+        entries = [get_port_entry(port, links) for port in get_known_ports()]
+        self.save(entries)
+        self.enumerated = True
+        return entries
+
+    def get_entries(self) -> list:
+        entries = self.entries
+        if entries is None:
+            # Shards opened from several threads wait for the first to load or enumerate, rather than each
+            # enumerating the ports and racing to save the index.
+            with self.lock:
+                if self.entries is None:
+                    entries = self.load()
+                    if entries is None:
+                        entries = self.enumerate()
+                    self.entries = entries
+                entries = self.entries
+        return entries
+
+    def invalidate(self):
+        """
+        Discards the index in memory and on disk, the next lookup enumerates the ports again.
+        """
+        with self.lock:
+            self.entries = None
+            self.enumerated = False
+            try:
+                os.remove(self.cache_path)
+            except FileNotFoundError:
+                pass
+
+    def select(self, selector: str) -> list:
+        return [entry for entry in self.get_entries() if match_entry(selector, entry)]
+
+    def resolve(self, selector: str) -> str:
+        """
+        Returns the device of the one port matching `selector`. If no port matches an index read from the disk
+        cache, the ports are enumerated again in case the device was plugged in since.
+        """
+        matches = self.select(selector)
+        if len(matches) == 0:
+            with self.lock:
+                if not self.enumerated:
+                    self.invalidate()
+                matches = self.select(selector)
+        if len(matches) == 0:
+            raise ValueError(f"No serial port matches {selector}")
+        if len(matches) > 1:
+            raise ValueError(f"{len(matches)} serial ports match {selector}: "
+                             f"{', '.join(entry['device'] for entry in matches)}")
+        return matches[0]['device']
+
+
+@lru_cache
+def get_port_index() -> PortIndex:
+    return PortIndex()
+
+
+def resolve_port(port: str) -> str:
+    """
+    Returns the device matching `port` if it is a port selector, else `port` unchanged.
+    """
+    if is_port_selector(port):
+        return get_port_index().resolve(port)
+    return port
+
+
+def invalidate_port_index():
+    get_port_index().invalidate()
+
+
+def main():
+    parser = ArgumentParser("PortIndex", description="Lists the serial ports and the selectors that match them.")
+    parser.add_argument("--refresh", action="store_true", help="Enumerate the ports, ignoring the cached index")
+    args = parser.parse_args()
+
+    index = get_port_index()
+    if args.refresh:
+        index.invalidate()
+    for entry in index.get_entries():
+        print(entry['device'], entry['description'], file=sys.stdout)
+        if entry['vid'] is not None:
+            selector = f"usb:vid={entry['vid']},pid={entry['pid']}"
+            if entry['serial_number']:
+                selector += f",serial={entry['serial_number']}"
+            print(f"\t{selector}")
+        if entry['location']:
+            print(f"\tlocation:{entry['location']}")
+        for name in entry['by_id']:
+            print(f"\tby-id:{name}")
+
+
+if __name__ == '__main__':
+    main()
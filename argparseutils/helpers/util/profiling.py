@@ -0,0 +1,192 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser, SUPPRESS
+from contextlib import contextmanager
+
+PROFILE_ENV = "APU_PROFILE"
+PROFILE_FLAG = "--apu-profile"
+
+
+class Profiler:
+    """
+    Profiler accumulates the time spent in each phase of each helper, per shard. Phases are the helpers instrumented
+    methods, `environment` for resolving option defaults and `import` for loading a lazily imported backend.
+
+    :param output: The file to write the report to as JSON, if None the report is printed to stderr
+    """
+
+    def __init__(self, output: str = None):
+        self.output = output
+        self.timings = {}
+        self.helpers = []
+
+    def record(self, helper: str, phase: str, shard: str, duration: float):
+        key = (helper, phase, shard)
+        timing = self.timings.get(key)
+        if timing is None:
+            self.timings[key] = [1, duration]
+        else:
+            timing[0] += 1
+            timing[1] += duration
+
+    def record_current(self, phase: str, shard: str, duration: float):
+        """
+        Records a phase against the helper method that is currently running.
+        """
+        helper = self.helpers[-1] if len(self.helpers) > 0 else "-"
+        self.record(helper, phase, shard, duration)
+
+    @contextmanager
+    def time(self, helper: str, phase: str, shard: str = ""):
+        self.helpers.append(helper)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(helper, phase, shard, time.perf_counter() - start)
+            self.helpers.pop()
+
+    def get_report(self):
+        report = [dict(helper=helper, phase=phase, shard=shard, calls=calls, total_ms=round(total * 1000, 3))
+                  for (helper, phase, shard), (calls, total) in self.timings.items()]
+        report.sort(key=lambda x: (-x['total_ms'], x['helper'], x['phase'], x['shard']))
+        return report
+
+    def write_report(self, stream=sys.stderr):
+        print("ArgumentParserUtils profile:", file=stream)
+        print(f"\t{'total ms':>10} {'calls':>6}  {'helper':<24} {'phase':<28} shard", file=stream)
+        for row in self.get_report():
+            print(f"\t{row['total_ms']:>10.3f} {row['calls']:>6}  {row['helper']:<24} {row['phase']:<28} "
+                  f"{row['shard']}", file=stream)
+
+    def write_json(self, path: str):
+        with open(path, "w") as output_file:
+            json.dump(dict(timings=self.get_report()), output_file, indent=2)
+
+    def finish(self):
+        if self.output is None:
+            self.write_report()
+        else:
+            self.write_json(self.output)
+
+
+profiler = None
+
+
+def get_profiler():
+    return profiler
+
+
+def enable_profiling(output: str = None) -> Profiler:
+    """
+    Enables profiling, the report is written when the process exits.
+
+    :param output: The file to write the report to as JSON, if None the report is printed to stderr
+    """
+    global profiler
+    if profiler is None:
+        profiler = Profiler(output)
+        atexit.register(profiler.finish)
+    return profiler
+
+
+def get_profile_output(argv=None, environ=None):
+    """
+    Checks the command line for `--apu-profile`, `--apu-profile file.json` or `--apu-profile=file.json` and the
+    environment for `APU_PROFILE=1|file.json`. As with the option's nargs="?", an argument following `--apu-profile`
+    that is not an option is its file.
+
+    :return: A tuple of whether profiling is enabled and the file to write the JSON report to
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    environ = os.environ if environ is None else environ
+    for index, arg in enumerate(argv):
+        if arg == "--":
+            break
+        if arg == PROFILE_FLAG:
+            value = argv[index + 1] if index + 1 < len(argv) else None
+            if value is None or (value.startswith("-") and value != "-"):
+                return True, None
+            return True, value
+        if arg.startswith(f"{PROFILE_FLAG}="):
+            return True, arg.split("=", 1)[1] or None
+    value = environ.get(PROFILE_ENV, "").strip()
+    if value.lower() in ("", "0", "false"):
+        return False, None
+    if value.lower() in ("1", "true"):
+        return True, None
+    return True, value
+
+
+def add_profile_option(parser: ArgumentParser):
+    """
+    Adds the hidden `--apu-profile` option to the parser while profiling is enabled, so the parser accepts it.
+    """
+    if profiler is not None and not getattr(parser, 'apu_profile_option', False):
+        parser.add_argument(PROFILE_FLAG, nargs="?", const="", default=None, help=SUPPRESS)
+        setattr(parser, 'apu_profile_option', True)
+
+
+def get_call_shard(signature, args, kwargs) -> str:
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        return ""
+    if 'shard' in bound.arguments:
+        return bound.arguments['shard']
+    if 'shard' in signature.parameters:
+        default = signature.parameters['shard'].default
+        return default if default is not inspect.Parameter.empty else ""
+    # Clients created by a helper keep their, possibly sharded, args.
+    client_args = getattr(bound.arguments.get('client'), 'args', None)
+    try:
+        return object.__getattribute__(client_args, 'shard')
+    except AttributeError:
+        return ""
+
+
+def profiled(function):
+    """
+    Times each call of a helper method while profiling is enabled, attributed to the helper, the method and the
+    shard it was called for. When profiling is disabled the only overhead is a check of a module global.
+    """
+    helper, phase = function.__qualname__.split(".")[0], function.__name__
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if profiler is None:
+            return function(*args, **kwargs)
+        with profiler.time(helper, phase, get_call_shard(signature, args, kwargs)):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def init_profiling():
+    enabled, output = get_profile_output()
+    if enabled:
+        enable_profiling(output)
+
+
+init_profiling()
@@ -0,0 +1,247 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+apu-serial-bench measures the throughput, round trip latency and CPU use of a serial port in loopback across sweeps of
+the read timeout, inter byte timeout, read size and write chunk size, and writes the results as JSON. The port is set
+up with the SerialHelper options. With the default --port pty a pty pair echoing everything back stands in for the
+device, a real port needs a loopback plug.
+"""
+import json
+import os
+import platform
+import select
+import sys
+import threading
+import time
+import tty
+from argparse import ArgumentParser, Namespace
+from itertools import product
+
+from argparseutils.helpers.serialport import SerialHelper, serial
+from argparseutils.helpers.utils import get_registry_context, record_args_registry_context
+
+
+class PtyLoopback:
+    """
+    A pty pair that echoes everything written to the slave back to it, standing in for a port with a loopback plug.
+    """
+
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="PtyLoopback", daemon=True)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            readable, _, _ = select.select([self.master], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.master, 65536)
+            except OSError:
+                return
+            view = memoryview(data)
+            while len(view) > 0:
+                view = view[os.write(self.master, view):]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stopping.set()
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def percentile(values: list, fraction: float) -> float:
+    if len(values) == 0:
+        return None
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def bound_timeouts(port, deadline: float):
+    """
+    Gives a port opened with no read or write timeout the time left until `deadline`, so that a port that stops
+    answering can not block a measurement past the deadline by more than that.
+    """
+    remaining = max(0.0, deadline - time.perf_counter())
+    if port.timeout is None:
+        port.timeout = remaining
+    if port.write_timeout is None:
+        port.write_timeout = remaining
+
+
+def measure_throughput(port, size: int, read_size: int, write_chunk: int, deadline: float):
+    payload = bytes(range(256)) * (write_chunk // 256 + 1)
+    received = 0
+    bound_timeouts(port, deadline)
+
+    def write():
+        remaining = size
+        try:
+            while remaining > 0 and time.perf_counter() < deadline:
+                chunk = min(write_chunk, remaining)
+                port.write(payload[:chunk])
+                remaining -= chunk
+        except serial.SerialTimeoutException:
+            pass
+
+    writer = threading.Thread(target=write, name="SerialBenchWriter", daemon=True)
+    start = time.perf_counter()
+    writer.start()
+    while received < size and time.perf_counter() < deadline:
+        received += len(port.read(min(read_size, size - received)))
+    elapsed = time.perf_counter() - start
+    writer.join(max(0.0, deadline - time.perf_counter()) + port.write_timeout)
+    return received, elapsed
+
+
+def measure_latency(port, round_trips: int, message_size: int, deadline: float) -> list:
+    message = (bytes(range(256)) * (message_size // 256 + 1))[:message_size]
+    latencies = []
+    bound_timeouts(port, deadline)
+    for _ in range(round_trips):
+        if time.perf_counter() > deadline:
+            break
+        start = time.perf_counter()
+        try:
+            port.write(message)
+        except serial.SerialTimeoutException:
+            break
+        received = 0
+        while received < message_size and time.perf_counter() < deadline:
+            received += len(port.read(message_size - received))
+        if received < message_size:
+            break
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def run_case(args: Namespace, timeout, inter_byte_timeout, read_size: int, write_chunk: int) -> dict:
+    case_args = Namespace(**vars(args))
+    record_args_registry_context(case_args, get_registry_context(args=args))
+    case_args.timeout = timeout
+    case_args.inter_byte_timeout = inter_byte_timeout
+    port = SerialHelper.create_serial(case_args)
+    try:
+        port.reset_input_buffer()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        received, elapsed = measure_throughput(port, args.size, read_size, write_chunk,
+                                               wall_start + args.case_timeout)
+        latencies = measure_latency(port, args.round_trips, args.message_size,
+                                    time.perf_counter() + args.case_timeout)
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+    finally:
+        port.close()
+    return dict(
+        timeout=timeout,
+        inter_byte_timeout=inter_byte_timeout,
+        read_size=read_size,
+        write_chunk=write_chunk,
+        bytes=received,
+        complete=received == args.size and len(latencies) == args.round_trips,
+        throughput_bytes_per_s=received / elapsed if elapsed > 0 else None,
+        round_trips=len(latencies),
+        latency_us={name: None if value is None else round(value * 1e6, 1) for name, value in (
+            ("min", latencies[0] if latencies else None),
+            ("p50", percentile(latencies, 0.5)),
+            ("p90", percentile(latencies, 0.9)),
+            ("p99", percentile(latencies, 0.99)),
+            ("max", latencies[-1] if latencies else None),
+        )},
+        cpu_percent=round(cpu / wall * 100, 1) if wall > 0 else None,
+    )
+
+
+def optional_float(value: str):
+    if value.lower() == "none":
+        return None
+    return float(value)
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser("apu-serial-bench", description=__doc__.strip())
+    SerialHelper.add_parser_options(parser, port="pty")
+    parser.add_argument("--timeouts", type=optional_float, nargs="+", default=[None, 0.1],
+                        help="The read timeouts to sweep, None blocks until the case timeout. (default: None 0.1)")
+    parser.add_argument("--inter-byte-timeouts", type=optional_float, nargs="+", default=[None],
+                        help="The inter byte timeouts to sweep, None disables it. (default: None)")
+    parser.add_argument("--read-sizes", type=int, nargs="+", default=[1, 64, 4096],
+                        help="The read sizes to sweep. (default: 1 64 4096)")
+    parser.add_argument("--write-chunks", type=int, nargs="+", default=[64, 4096],
+                        help="The write chunk sizes to sweep. (default: 64 4096)")
+    parser.add_argument("--size", type=int, default=256 * 1024,
+                        help="The number of bytes sent through the loopback for the throughput. (default: 262144)")
+    parser.add_argument("--round-trips", type=int, default=200,
+                        help="The number of messages timed for the latency. (default: 200)")
+    parser.add_argument("--message-size", type=int, default=16,
+                        help="The size of the messages timed for the latency. (default: 16)")
+    parser.add_argument("--case-timeout", type=float, default=30,
+                        help="The longest each measurement of a case may take, in seconds, also the read and write timeout "
+                             "of ports with none. (default: 30)")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+
+    cases = list(product(args.timeouts, args.inter_byte_timeouts, args.read_sizes, args.write_chunks))
+    results = []
+    loopback = PtyLoopback() if args.port == "pty" else None
+    if loopback is not None:
+        args.port = loopback.port_name
+        loopback.__enter__()
+    try:
+        for index, case in enumerate(cases):
+            print(f"[{index + 1}/{len(cases)}] timeout={case[0]} inter_byte_timeout={case[1]} read_size={case[2]} "
+                  f"write_chunk={case[3]}", file=sys.stderr)
+            results.append(run_case(args, *case))
+    finally:
+        if loopback is not None:
+            loopback.__exit__(None, None, None)
+
+    report = dict(
+        meta=dict(
+            port="pty" if loopback is not None else args.port,
+            baudrate=args.baudrate,
+            python=platform.python_version(),
+            system=platform.system(),
+            kernel=platform.release(),
+            machine=platform.machine(),
+            size=args.size,
+            round_trips=args.round_trips,
+            message_size=args.message_size,
+        ),
+        results=results,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+            output_file.write("\n")
+
+
+if __name__ == '__main__':
+    main()
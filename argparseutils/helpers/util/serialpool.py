@@ -0,0 +1,139 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import selectors
+from argparse import ArgumentParser, Namespace
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.capture import READ
+from argparseutils.helpers.utils import get_shard_registry
+
+
+class SerialPool:
+    """
+    SerialPool opens a port for every shard of a SerialHelper and waits on all of their file descriptors with one
+    selector (epoll on linux), returning the data read tagged with the shard it came from. A single thread can then
+    read any number of ports without a polling read(timeout) loop per port.
+
+    The ports are opened in parallel with SerialHelper.create_all_serials. A port that fails to open, reaches end of
+    file or fails is closed and removed from the pool, the error is kept in `errors`.
+
+    :param args: The parsed arguments
+    :param shards: The shards to open, defaults to every shard registered for the helper
+    :param read_size: The maximum number of bytes to read from a port at a time
+    :param read_sizes: Overrides read_size for individual shards, a dict of shard to size
+    :param parser: The parser the shards were registered on, used to find its ShardRegistry
+    :param helper_class: The helper used to open the ports
+    """
+
+    def __init__(self, args: Namespace, shards: list = None, read_size: int = 4096, read_sizes: dict = None,
+                 parser: ArgumentParser = None, helper_class=SerialHelper):
+        if shards is None:
+            shards = get_shard_registry(parser, args).registered_shards(helper_class)
+        self.args = args
+        self.shards = list(shards)
+        self.read_size = read_size
+        self.read_sizes = {} if read_sizes is None else read_sizes
+        self.helper_class = helper_class
+        self.parser = parser
+        self.ports = {}
+        self.errors = {}
+        self.selector = None
+
+    def open(self):
+        if self.selector is not None:
+            return self
+        self.selector = selectors.DefaultSelector()
+        ports = self.helper_class.create_all_serials(self.args, self.shards, parser=self.parser)
+        self.ports.update(ports)
+        self.errors.update(ports.errors)
+        try:
+            for shard, port in self.ports.items():
+                # Reading the descriptor bypasses the port's read, so a captured port is recorded here.
+                read_size = self.read_sizes.get(shard, self.read_size)
+                self.selector.register(port.fileno(), selectors.EVENT_READ,
+                                       (shard, read_size, getattr(port, 'capture', None)))
+        except BaseException:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        for port in self.ports.values():
+            port.close()
+        self.ports.clear()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.ports)
+
+    def _remove(self, fd, shard, error):
+        self.selector.unregister(fd)
+        self.ports.pop(shard).close()
+        self.errors[shard] = error
+
+    def poll(self, timeout: float = None) -> list:
+        """
+        Waits up to `timeout` seconds, forever if None, for any port to become readable and returns a list of
+        (shard, bytes) for every port that had data.
+        """
+        chunks = []
+        for key, _ in self.selector.select(timeout):
+            shard, read_size, capture = key.data
+            try:
+                data = os.read(key.fd, read_size)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError as e:
+                self._remove(key.fd, shard, e)
+                continue
+            if data:
+                if capture is not None:
+                    capture.record(READ, data)
+                chunks.append((shard, data))
+            else:
+                self._remove(key.fd, shard, EOFError(f"{shard} reached end of file"))
+        return chunks
+
+    def __iter__(self):
+        """
+        Yields (shard, bytes) as data arrives until every port has been closed.
+        """
+        self.open()
+        while self.ports:
+            yield from self.poll()
+
+    def run(self, callback, timeout: float = None):
+        """
+        Calls `callback(shard, data)` for every chunk read until every port has been closed, or until no data
+        arrives within `timeout` seconds.
+        """
+        self.open()
+        while self.ports:
+            chunks = self.poll(timeout)
+            if not chunks and timeout is not None:
+                return
+            for shard, data in chunks:
+                callback(shard, data)
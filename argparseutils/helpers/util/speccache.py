@@ -0,0 +1,216 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import importlib
+import json
+import logging
+import os
+import sys
+from argparse import ArgumentParser
+
+from argparseutils.helpers.utils import LazyDefault, apply_option_spec, fix_formatter_class, \
+    get_environment_registry, get_shard_registry, record_option_spec
+
+
+def get_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "argparseutils")
+
+
+def get_callable_path(value) -> str:
+    qualname = getattr(value, '__qualname__', None)
+    if qualname is None or '<' in qualname:
+        raise ValueError(f"{value!r} can not be referenced by name")
+    return f"{value.__module__}:{qualname}"
+
+
+def load_callable(path: str):
+    module_name, qualname = path.split(":", 1)
+    value = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        value = getattr(value, attr)
+    return value
+
+
+def encode_spec(spec: dict) -> dict:
+    encoded = dict(spec)
+    kwargs = dict(spec['kwargs'])
+    if 'type' in kwargs:
+        kwargs['type'] = get_callable_path(kwargs['type'])
+    if 'choices' in kwargs:
+        kwargs['choices'] = list(kwargs['choices'])
+    encoded['kwargs'] = kwargs
+    if 'lazy_default' in spec:
+        lazy_default = spec['lazy_default']
+        encoded['lazy_default'] = [get_callable_path(lazy_default.resolver), str(lazy_default), lazy_default.error,
+                                  lazy_default.unless]
+    return encoded
+
+
+def decode_spec(encoded: dict) -> dict:
+    spec = dict(encoded)
+    kwargs = dict(encoded['kwargs'])
+    if 'type' in kwargs:
+        kwargs['type'] = load_callable(kwargs['type'])
+    spec['kwargs'] = kwargs
+    if 'lazy_default' in encoded:
+        resolver, description, error, unless = encoded['lazy_default']
+        spec['lazy_default'] = LazyDefault(load_callable(resolver), description, error, unless)
+    return spec
+
+
+class ParserSpecCache:
+    """
+    ParserSpecCache records the options that a builder function adds to a parser with `add_option` and the shards it
+    registers, and saves them to a file in `cache_dir`, one file for each builder and kwargs. Later builds with the
+    same builder, kwargs and helper versions rebuild the parser from that file without running the builder, a build
+    after the versions change replaces the file. Only the environment is resolved on every build. When the cache can
+    not be read or written the parser is built without it.
+
+    The builder should only call the helpers `add_parser_options` methods, options added to the parser directly are
+    not recorded and should be added after the cached build.
+
+    :param cache_dir: The directory holding the cached specs, defaults to `$XDG_CACHE_HOME/argparseutils`
+    """
+    logger = logging.getLogger("ParserSpecCache")
+    spec_version = 3
+
+    def __init__(self, cache_dir: str = None):
+        if cache_dir is None:
+            cache_dir = get_cache_dir()
+        self.cache_dir = cache_dir
+
+    def get_versions(self, builder):
+        """
+        Returns the stat of the builder's module and the helper modules, so editing or upgrading either invalidates
+        the cached spec.
+        """
+        import argparseutils.helpers
+        paths = [getattr(sys.modules.get(builder.__module__), '__file__', None)]
+        for package in [os.path.dirname(argparseutils.helpers.__file__)]:
+            for root, dirs, files in os.walk(package):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".py"))
+        versions = []
+        for path in paths:
+            if path is not None and os.path.exists(path):
+                stat = os.stat(path)
+                versions.append([path, stat.st_mtime_ns, stat.st_size])
+        return versions
+
+    def get_key(self, builder, kwargs: dict) -> str:
+        key = dict(
+            spec_version=self.spec_version,
+            python=sys.version,
+            builder=get_callable_path(builder),
+            versions=self.get_versions(builder),
+            kwargs=kwargs,
+        )
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+
+    def get_path(self, builder, kwargs: dict) -> str:
+        name = dict(builder=get_callable_path(builder), kwargs=kwargs)
+        name = hashlib.sha256(json.dumps(name, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def build(self, parser: ArgumentParser, builder, **kwargs) -> bool:
+        """
+        Adds the options of `builder(parser, **kwargs)` to `parser`, from the cached spec if there is one.
+
+        :return: True if the parser was built from the cached spec
+        """
+        fix_formatter_class(parser)
+        path = self.get_path(builder, kwargs)
+        key = self.get_key(builder, kwargs)
+        cached = self.load(path, key)
+        if cached is not None:
+            self.replay(parser, cached)
+            return True
+
+        options, shards = self.record(parser, builder, **kwargs)
+        self.save(path, key, options, shards)
+        return False
+
+    def record(self, parser: ArgumentParser, builder, **kwargs):
+        shard_registry = get_shard_registry(parser)
+        # A build inside another build records into its own lists, which are then added to the outer build's.
+        parser_spec_recorder = getattr(parser, 'spec_recorder', None)
+        registry_shard_recorder = shard_registry.shard_recorder
+        spec_recorder = parser.spec_recorder = []
+        shard_recorder = shard_registry.shard_recorder = []
+        try:
+            builder(parser, **kwargs)
+            return spec_recorder, shard_recorder
+        finally:
+            if parser_spec_recorder is None:
+                del parser.spec_recorder
+            else:
+                parser_spec_recorder.extend(spec_recorder)
+                parser.spec_recorder = parser_spec_recorder
+            if registry_shard_recorder is not None:
+                registry_shard_recorder.extend(shard_recorder)
+            shard_registry.shard_recorder = registry_shard_recorder
+
+    def replay(self, parser: ArgumentParser, cached: dict):
+        shard_registry = get_shard_registry(parser)
+        for helper_name, shard in cached['shards']:
+            shard_registry.register_shard_name(helper_name, shard)
+
+        action_class = parser._registry_get('action', None, None)
+        with get_environment_registry(parser).batch():
+            for spec in cached['options']:
+                action = apply_option_spec(parser, spec, action_class=action_class)
+                record_option_spec(parser, spec, action)
+
+    def load(self, path: str, key: str):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as spec_file:
+                cached = json.load(spec_file)
+            if cached.get('key') != key:
+                return None
+            cached['options'] = [decode_spec(x) for x in cached['options']]
+            return cached
+        except (OSError, ValueError, KeyError, ImportError, AttributeError) as e:
+            self.logger.warning(f"Ignoring invalid parser spec cache {path}: {e}")
+            return None
+
+    def save(self, path: str, key: str, options, shards):
+        try:
+            data = json.dumps(dict(key=key, options=[encode_spec(x) for x in options], shards=shards),
+                              separators=(',', ':'))
+        except (TypeError, ValueError) as e:
+            self.logger.warning(f"Parser spec can not be cached: {e}")
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w") as spec_file:
+                spec_file.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Parser spec can not be saved to {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -17,14 +17,22 @@
 import logging
 import os
 import sys
-from collections import defaultdict
+import weakref
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import copy
 from functools import lru_cache
 from io import StringIO
+from time import perf_counter
 from typing import Any
-from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter, ArgumentTypeError, SUPPRESS
 
+from argparseutils.helpers.util import profiling
 
-def __get_env__(var_name: str, default: object = None, type: type = str, shard: str = "") -> object:
+
+def __get_env__(var_name: str, default: object = None, type: type = str, shard: str = "",
+                resolver: 'EnvResolver' = None, env_registry: 'EnvRegistry' = None) -> object:
     """
     __get_env__ Looks up the value of the field `var_name` firstly in `env` secondly in the environmental
     variables then if`var_name` it is still not found returns the `default` value
@@ -32,22 +40,113 @@ def __get_env__(var_name: str, default: object = None, type: type = str, shard:
     :param var_name: The variable to lookup in `env` and the in the environmental variables
     :param default: If the `var_name` variable is not found, return this value
     :param type: The type to convert the found value to
+    :param resolver: If set, the environment is looked up in the resolver's snapshot instead of `os.environ`
+    :param env_registry: The registry to register `var_name` with, defaults to the active registry
     :return: The found value or `default`
     """
 
-    if len(shard.strip()) > 0:
-        var_name = "%s_%s" % (shard.upper(), var_name.upper())
-    
-    get_environment_registry().register_env(var_name)
-    
-    if var_name in os.environ:
-        return True, type(os.environ[var_name])
+    if resolver is not None:
+        var_name, found, value = resolver.lookup(var_name, shard)
+    else:
+        if len(shard.strip()) > 0:
+            var_name = "%s_%s" % (shard.upper(), var_name.upper())
+        found = var_name in os.environ
+        value = os.environ.get(var_name)
+
+    if env_registry is None:
+        env_registry = get_environment_registry()
+    env_registry.register_env(var_name)
+
+    if found:
+        return True, type(value)
     elif default is not None:
         return True, type(default)
 
     return False, None
 
 
+class EnvResolver:
+    """
+    EnvResolver answers the environment lookups of `add_option` from a single snapshot of the environment, so building
+    a parser with many shards does not repeatedly search `os.environ`. The prefix of each shard is computed once, and
+    the snapshot is indexed by shard prefix in a single pass, so the lookups of a shard only search its own variables.
+
+    :param environ: The environment to resolve from, defaults to a snapshot of `os.environ` taken on the first lookup.
+                    Passing a dict allows the parser to be built without modifying the process environment.
+    """
+
+    def __init__(self, environ: dict = None):
+        self.environ = environ
+        self.snapshot = None
+        self.index = None
+        self.prefixes = {}
+        self.scans = 0
+
+    def get_snapshot(self) -> dict:
+        if self.snapshot is None:
+            self.snapshot = dict(os.environ if self.environ is None else self.environ)
+        return self.snapshot
+
+    def get_index(self) -> dict:
+        """
+        :return: A dict of every prefix ending in _ found in the snapshot, to the variables under that prefix
+                 without the prefix
+        """
+        if self.index is None:
+            index = defaultdict(dict)
+            self.scans += 1
+            for name, value in self.get_snapshot().items():
+                end = name.find("_")
+                while end != -1:
+                    index[name[:end + 1]][name[end + 1:]] = value
+                    end = name.find("_", end + 1)
+            self.index = dict(index)
+        return self.index
+
+    def get_prefix(self, shard: str) -> str:
+        prefix = self.prefixes.get(shard)
+        if prefix is None:
+            prefix = f"{shard.upper()}_" if len(shard.strip()) > 0 else ""
+            self.prefixes[shard] = prefix
+        return prefix
+
+    def lookup(self, var_name: str, shard: str = ""):
+        """
+        :return: A tuple of the full environment variable name, whether it was found and its value
+        """
+        prefix = self.get_prefix(shard)
+        if len(prefix) == 0:
+            snapshot = self.get_snapshot()
+            return var_name, var_name in snapshot, snapshot.get(var_name)
+        var_name = var_name.upper()
+        values = self.get_index().get(prefix, {})
+        return prefix + var_name, var_name in values, values.get(var_name)
+
+    def reset(self, environ: dict = None):
+        """
+        Discards the snapshot, the next lookup takes a new snapshot of `environ` or `os.environ`.
+        """
+        self.environ = environ
+        self.snapshot = None
+        self.index = None
+
+
+def get_env_resolver(parser: ArgumentParser) -> EnvResolver:
+    """
+    Returns the EnvResolver used to resolve the defaults of the parser's options, one snapshot of the environment is
+    taken for each parser.
+    """
+    resolver = getattr(parser, 'env_resolver', None)
+    if resolver is None:
+        resolver = EnvResolver()
+        setattr(parser, 'env_resolver', resolver)
+    return resolver
+
+
+def set_env_resolver(parser: ArgumentParser, resolver: EnvResolver):
+    setattr(parser, 'env_resolver', resolver)
+
+
 class CliShardWrapper:
     def __init__(self, args, shard):
         object.__setattr__(self, 'args', args)
@@ -66,6 +165,100 @@ class CliShardWrapper:
         args.__setattr__(_name_, value)
 
 
+class ShardView:
+    """
+    ShardView is a compiled alternative to CliShardWrapper. The attributes of the shard are copied out of the parsed
+    args once, into the slots of a class generated for the shard's options, so reading them is a plain attribute
+    access. Setting an attribute on the view also sets it on the underlying args. The view is a snapshot, values set
+    directly on the underlying args after the view was compiled are not seen by the view.
+    """
+    __slots__ = ('__args__', '__dests__')
+
+    def __init__(self, args, dests: dict):
+        object.__setattr__(self, '__args__', args)
+        object.__setattr__(self, '__dests__', dests)
+        for name, dest in dests.items():
+            object.__setattr__(self, name, getattr(args, dest))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        object.__setattr__(self, name, value)
+        setattr(self.__args__, self.__dests__[name], value)
+
+    def __repr__(self):
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__dests__)
+        return f"ShardView({values})"
+
+
+@lru_cache
+def get_shard_view_class(names: tuple):
+    return type("ShardView", (ShardView,), {'__slots__': names})
+
+
+def register_shard_option(parser: ArgumentParser, shard: str, name: str, dest: str):
+    shard_options = getattr(parser, 'shard_options', None)
+    if shard_options is None:
+        shard_options = defaultdict(dict)
+        setattr(parser, 'shard_options', shard_options)
+    shard_options[shard][name] = dest
+
+
+def get_shard_view(parser: ArgumentParser, args, shard: str = "") -> ShardView:
+    """
+    Compiles a ShardView of `args` holding the options that were added to `parser` with `add_option` for `shard`.
+    """
+    dests = dict(getattr(parser, 'shard_options', {}).get(shard, {}))
+    return get_shard_view_class(tuple(dests.keys()))(args, dests)
+
+
+class LazyDefault(str):
+    """
+    LazyDefault is a placeholder default for an option whose real default is expensive to compute. The `resolver` is
+    only called at parse time, when neither the command line, the environment nor the script author supplied a value.
+    The placeholder's string value is the `description` shown in the help output.
+
+    :param resolver: Called with no arguments to compute the default, returns None if there is no default
+    :param description: The description of the default shown in the help output
+    :param error: The parse error reported when `resolver` returns None, if None the option's value is None instead
+    :param unless: The name of another option of the same shard that makes this one unnecessary, when it has a value
+                   a missing default is None rather than the parse error
+    """
+
+    def __new__(cls, resolver, description: str, error: str, unless: str = None):
+        lazy_default = super().__new__(cls, description)
+        lazy_default.resolver = resolver
+        lazy_default.error = error
+        lazy_default.unless = unless
+        return lazy_default
+
+
+def lazy_default_type(lazy_default: LazyDefault, type=str):
+    def convert(value):
+        if value is lazy_default:
+            value = lazy_default.resolver()
+            if value is None:
+                # An error that another option can waive is reported by check_lazy_defaults once every option is parsed.
+                if lazy_default.error is None or lazy_default.unless is not None:
+                    return None
+                raise ArgumentTypeError(lazy_default.error)
+        return type(value)
+    convert.__name__ = getattr(type, '__name__', repr(type))
+    return convert
+
+
+def check_lazy_defaults(parser: ArgumentParser, namespace):
+    """
+    Reports the parse error of the lazy defaults that resolved to None when the option named by their `unless` has no
+    value either.
+    """
+    for action, shard in getattr(parser, 'waivable_lazy_defaults', ()):
+        lazy_default = action.default
+        if getattr(namespace, action.dest, None) is not None:
+            continue
+        unless_dest = getattr(parser, 'shard_options', {}).get(shard, {}).get(lazy_default.unless)
+        if unless_dest is None or getattr(namespace, unless_dest, None) is None:
+            parser.error(f"argument {'/'.join(action.option_strings)}: {lazy_default.error}")
+
+
 def get_shard_values(shard_name):
     cli_shard = ""
     help_shard = ""
@@ -76,19 +269,157 @@ def get_shard_values(shard_name):
 
 
 class APUHelpFormatter(ArgumentDefaultsHelpFormatter):
+    """
+    APUHelpFormatter adds the known environment variables to the help output. When it is bound to a parser by
+    `fix_formatter_class` the rendered help and usage are cached on the parser until its options, their defaults or
+    the known environment variables change, and the parser can be switched to a compact help output with
+    `set_compact_help`.
+    """
+    parser = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The calls made by ArgumentParser to build the help are deferred until format_help, so they can be skipped
+        # if the help is already cached.
+        self._deferred = []
+        self.compact = getattr(self.parser, 'compact_help', False)
+
+    def add_usage(self, usage, actions, groups, prefix=None):
+        self._deferred.append(('add_usage', (usage, actions, groups, prefix)))
+
+    def add_text(self, text):
+        self._deferred.append(('add_text', (text,)))
+
+    def start_section(self, heading):
+        self._deferred.append(('start_section', (heading,)))
+
+    def end_section(self):
+        self._deferred.append(('end_section', ()))
+
+    def add_arguments(self, actions):
+        self._deferred.append(('add_arguments', (actions,)))
 
     def display_env_args(self, *args):
-        return get_environment_registry().get_help()
+        if self.compact and self.parser is not None:
+            return get_environment_registry(self.parser).get_compact_help(get_shard_templates(self.parser))
+        return get_environment_registry(self.parser).get_help()
+
+    def get_cache_key(self, usage_only):
+        parser = self.parser
+        return (usage_only, self.compact, self._width, self._prog, len(parser._actions),
+                [action.default for action in parser._actions], get_environment_registry(parser).version)
+
+    def get_compact_deferred(self, usage_only):
+        """
+        Replaces the options of sharded helpers with one section for each helper template, listing the template's
+        options once for all of the shards that share it.
+        """
+        templates = get_shard_templates(self.parser)
+        sharded = set()
+        template_sections = []
+        actions = {action.dest: action for action in self.parser._actions}
+        for names, shards in templates.items():
+            shard = shards[0]
+            cli_shard, help_shard = get_shard_values(shard)
+            template_actions = []
+            for name in names:
+                dest = self.parser.shard_options[shard][name]
+                action = copy(actions[dest])
+                action.option_strings = [x.replace(f"--{cli_shard}", "--<shard>-", 1) for x in action.option_strings]
+                if action.choices is None and action.metavar is None:
+                    action.metavar = get_env_name(name)
+                if action.help is not None:
+                    action.help = action.help.replace(help_shard.strip(), "").rstrip()
+                # The default is only shown if it is the same for every shard.
+                for other_shard in shards:
+                    if actions[self.parser.shard_options[other_shard][name]].default != action.default:
+                        action.default = SUPPRESS
+                        break
+                template_actions.append(action)
+            for other_shard in shards:
+                sharded.update(self.parser.shard_options[other_shard].values())
+            template_sections.extend([
+                ('start_section', (f"options of shards {', '.join(shards)}",)),
+                ('add_arguments', (template_actions,)),
+                ('end_section', ()),
+            ])
+
+        deferred = []
+        for method, args in self._deferred:
+            if method in ('add_usage', 'add_arguments'):
+                args = list(args)
+                index = 1 if method == 'add_usage' else 0
+                args[index] = [x for x in args[index] if x.dest not in sharded]
+            deferred.append((method, args))
+
+        if usage_only:
+            return deferred
+        section_end = max([i + 1 for i, (method, args) in enumerate(deferred) if method == 'end_section'], default=0)
+        return deferred[:section_end] + template_sections + deferred[section_end:]
 
     def format_help(self):
-        self._root_section.items.append((lambda *args: self.display_env_args(*args), []))
+        usage_only = all(method == 'add_usage' for method, args in self._deferred)
+        help_cache = None
+        key = None
+        if self.parser is not None:
+            help_cache = get_help_cache(self.parser)
+            key = self.get_cache_key(usage_only)
+            cached_key, cached_help = help_cache.get(usage_only, (None, None))
+            if cached_key == key:
+                return cached_help
+
+        deferred = self._deferred
+        if self.compact and self.parser is not None:
+            deferred = self.get_compact_deferred(usage_only)
+        for method, args in deferred:
+            getattr(super(), method)(*args)
+
+        if not usage_only:
+            self._root_section.items.append((lambda *args: self.display_env_args(*args), []))
         help = super().format_help()
+
+        if help_cache is not None:
+            help_cache[usage_only] = (key, help)
         return help
 
 
+def get_help_cache(parser: ArgumentParser) -> dict:
+    help_cache = getattr(parser, 'help_cache', None)
+    if help_cache is None:
+        help_cache = {}
+        setattr(parser, 'help_cache', help_cache)
+    return help_cache
+
+
+def get_shard_templates(parser: ArgumentParser) -> dict:
+    """
+    Groups the shards of the parser by the names of their options, each group is the options of one helper template.
+
+    :return: A dict of the option names of a template to the shards that use it
+    """
+    templates = defaultdict(list)
+    for shard, options in getattr(parser, 'shard_options', {}).items():
+        if len(shard) > 0:
+            templates[tuple(options.keys())].append(shard)
+    return dict(templates)
+
+
+def set_compact_help(parser: ArgumentParser, compact: bool = True):
+    """
+    Collapses the options and environment variables of sharded helpers in the help output, so parsers with a large
+    number of shards render a bounded amount of help.
+    """
+    fix_formatter_class(parser)
+    setattr(parser, 'compact_help', compact)
+
+
 def fix_formatter_class(parser, formatter=APUHelpFormatter):
-    if not isinstance(parser.formatter_class, APUHelpFormatter):
-        parser.formatter_class = APUHelpFormatter
+    # Each parser gets its own subclass of the formatter, bound to the parser so the help can be cached on it.
+    if getattr(parser.formatter_class, 'parser', None) is not parser:
+        parser.formatter_class = type(formatter.__name__, (formatter,), dict(parser=parser))
+    if getattr(parser, 'registry_context', None) is None:
+        get_registry_context().bind(parser)
+    profiling.add_profile_option(parser)
     add_helper_logger(parser)
 
 
@@ -100,42 +431,82 @@ def get_args(args, shard):
 
 class ShardRegistry:
     def __init__(self):
-        self.shards = defaultdict(list)
-        self.invalid_shard_handler = lambda helper_class, shard: self.__default_invalid_shard_handler(helper_class,
-                                                                                                      shard)
+        # The shards of each helper are held as the keys of a dict, an insertion ordered set.
+        self.shards = defaultdict(dict)
+        self.shard_recorder = None
+        self.invalid_shard_handler = None
 
     def __default_invalid_shard_handler(self, helper_class, shard):
         print(f"Shard {shard} has not been registered for helper {helper_class.__name__}", file=sys.stderr)
         sys.exit(5)
 
     def register_shard(self, helper_class, shard):
-        helper_shards = self.shards[helper_class.__name__]
-        if shard not in helper_shards:
-            helper_shards.append(shard)
+        self.register_shard_name(helper_class.__name__, shard)
+
+    def register_shard_name(self, helper_name, shard):
+        if self.shard_recorder is not None:
+            self.shard_recorder.append([helper_name, shard])
+        self.shards[helper_name][shard] = True
+
+    def register_shard_names(self, helper_name, shards):
+        if self.shard_recorder is not None:
+            self.shard_recorder.extend([helper_name, shard] for shard in shards)
+        self.shards[helper_name].update(dict.fromkeys(shards, True))
 
     def registered_shards(self, helper_class):
-        return self.shards[helper_class.__name__]
+        return list(self.shards[helper_class.__name__])
+
+    def is_registered(self, helper_class, shard):
+        return shard in self.shards[helper_class.__name__]
 
     def validate_shard(self, helper_class, shard):
-        if shard not in self.registered_shards(helper_class):
-            self.invalid_shard_handler(helper_class, shard)
+        if not self.is_registered(helper_class, shard):
+            if self.invalid_shard_handler is None:
+                self.__default_invalid_shard_handler(helper_class, shard)
+            else:
+                self.invalid_shard_handler(helper_class, shard)
 
     def set_invalid_shard_handler(self, invalid_shard_handler):
         self.invalid_shard_handler = invalid_shard_handler
 
 
-@lru_cache
-def get_shard_registry():
-    return ShardRegistry()
-
-
 class EnvRegistry:
     def __init__(self):
         self.known_params = defaultdict(int)
+        self.version = 0
+        self.help_cache = (None, None)
+        self.batched = None
 
     def register_env(self, env_name):
+        if self.batched is not None:
+            self.batched.append(env_name)
+            return
         self.known_params[env_name] += 1
-        
+        self.version += 1
+
+    def register_envs(self, env_names):
+        if len(env_names) > 0:
+            known_params = self.known_params
+            for env_name, count in Counter(env_names).items():
+                known_params[env_name] += count
+            self.version += 1
+
+    @contextmanager
+    def batch(self):
+        """
+        Collects the registrations made in the block and counts them in one update when it exits, a nested batch is
+        counted by the outermost.
+        """
+        if self.batched is not None:
+            yield self
+            return
+        self.batched = []
+        try:
+            yield self
+        finally:
+            batched, self.batched = self.batched, None
+            self.register_envs(batched)
+
     def get_known_env_params(self):
         env_param_list = list(self.known_params.keys())
         env_param_list.sort()
@@ -148,19 +519,164 @@ class EnvRegistry:
             sys.exit(0)
 
     def get_help(self):
+        cached_version, cached_help = self.help_cache
+        if cached_version == self.version:
+            return cached_help
         stream = StringIO()
         print("environment variables:", file=stream)
         self.display(prefix='\t', stream=stream, call_exit=False)
+        self.help_cache = (self.version, stream.getvalue())
+        return self.help_cache[1]
+
+    def get_compact_help(self, templates: dict):
+        """
+        Returns the help for the known environment variables, with the variables of each helper template listed once
+        for all the shards that share it.
+
+        :param templates: The shard templates returned by `get_shard_templates`
+        """
+        stream = StringIO()
+        print("environment variables:", file=stream)
+        templated = set()
+        for names, shards in templates.items():
+            env_names = [get_env_name(name) for name in names]
+            shard_prefixes = [f"{shard.upper()}_" for shard in shards]
+            templated.update(prefix + env_name for prefix in shard_prefixes for env_name in env_names)
+            print(f"\t<SHARD>_{' <SHARD>_'.join(env_names)}", file=stream)
+            print(f"\t\twhere <SHARD> is one of: {' '.join(x.upper() for x in shards)}", file=stream)
+        others = [x for x in self.get_known_env_params() if x not in templated]
+        print(f"\tKnown Environment Variables: {' '.join(others)}", file=stream)
+        print(file=stream)
         return stream.getvalue()
 
 
-@lru_cache
-def get_environment_registry():
-    return EnvRegistry()
+class RegistryContext:
+    """
+    RegistryContext holds the shard registry, environment registry and known parsers. By default every parser in the
+    process shares one global context. A context can instead be scoped to the parsers built while it is active:
+
+        with RegistryContext() as context:
+            parser = ArgumentParser("Scoped")
+            SerialHelper.add_parser_options(parser, shard="input")
+            args = parser.parse_args()
+            port = SerialHelper.create_serial(args, shard="input")
+        context.release()
+
+    Parsers that add helpers while a context is active are bound to it, and keep using it after the `with` block. The
+    context of the args they parse is remembered, outside the args, for as long as the args exist, so the helpers
+    `create_*` methods find it from the args, after the `with` block or on another thread. Args sent to another
+    process do not carry their context, send the context with them and enter it there.
+    """
+
+    def __init__(self):
+        self.shard_registry = ShardRegistry()
+        self.environment_registry = EnvRegistry()
+        self.known_parsers = {}
+        self.tokens = []
+
+    def __enter__(self):
+        self.tokens.append(active_registry_context.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        active_registry_context.reset(self.tokens.pop())
+
+    def __getstate__(self):
+        # A context sent to another process does not take the parsers and the tokens of this process.
+        return dict(shard_registry=self.shard_registry, environment_registry=self.environment_registry,
+                    known_parsers={}, tokens=[])
+
+    def bind(self, parser: ArgumentParser):
+        if getattr(parser, 'registry_context', None) is None:
+            parse_known_args = parser.parse_known_args
+
+            def parse_known_args_in_context(args=None, namespace=None):
+                namespace, extras = parse_known_args(args, namespace)
+                check_lazy_defaults(parser, namespace)
+                record_args_registry_context(namespace, parser.registry_context)
+                return namespace, extras
+
+            parser.parse_known_args = parse_known_args_in_context
+        setattr(parser, 'registry_context', self)
+        return parser
+
+    def release(self):
+        """
+        Discards everything registered in this context, so the parsers built in it can be garbage collected.
+        """
+        self.shard_registry = ShardRegistry()
+        self.environment_registry = EnvRegistry()
+        self.known_parsers = {}
+
+
+active_registry_context = ContextVar("active_registry_context", default=None)
+
+# The id of each parsed args that is still alive to the context of the parser that parsed it. Namespaces can not be
+# hashed, so a WeakKeyDictionary can not hold them.
+args_registry_contexts = {}
+
 
 @lru_cache
-def get_known_parsers():
-    return {}
+def get_global_registry_context():
+    return RegistryContext()
+
+
+def record_args_registry_context(args, context: RegistryContext):
+    """
+    Remembers `context` as the context of `args` while they exist, for args that were not parsed by a bound parser,
+    such as a copy of parsed args.
+    """
+    key = id(args)
+    if key not in args_registry_contexts:
+        try:
+            weakref.finalize(args, args_registry_contexts.pop, key, None)
+        except TypeError:
+            # A namespace that can not be weakly referenced falls back to the active or global context.
+            return
+    args_registry_contexts[key] = context
+
+
+def get_args_registry_context(args):
+    """
+    Returns the context of the parser that parsed `args`, args may be a shard of them from get_args or a ShardView.
+    """
+    if isinstance(args, CliShardWrapper):
+        args = object.__getattribute__(args, 'args')
+    elif isinstance(args, ShardView):
+        args = args.__args__
+    return args_registry_contexts.get(id(args))
+
+
+def get_registry_context(parser: ArgumentParser = None, args=None) -> RegistryContext:
+    """
+    Returns the context bound to `parser`, else the context of the parser that parsed `args`, else the active context,
+    else the global context.
+    """
+    context = getattr(parser, 'registry_context', None)
+    if context is None and args is not None:
+        context = get_args_registry_context(args)
+    if context is None:
+        context = active_registry_context.get()
+    if context is None:
+        context = get_global_registry_context()
+    return context
+
+
+def reset_global_registry_context():
+    get_global_registry_context().release()
+
+
+def get_shard_registry(parser: ArgumentParser = None, args=None) -> ShardRegistry:
+    return get_registry_context(parser, args).shard_registry
+
+
+def get_environment_registry(parser: ArgumentParser = None) -> EnvRegistry:
+    return get_registry_context(parser).environment_registry
+
+
+def get_known_parsers(parser: ArgumentParser = None) -> dict:
+    return get_registry_context(parser).known_parsers
+
 
 def add_helper_logger(parser):
     if not hasattr(parser, 'logger'):
@@ -188,13 +704,26 @@ def boolify(value):
         result = False
     return result
 
+def byte_int(value) -> int:
+    """
+    An argparse type for an int from 0 to 255, such as a termios control character.
+    """
+    result = int(value)
+    if result < 0 or result > 255:
+        raise ArgumentTypeError(f"{result} is not in the range 0-255")
+    return result
+
 def convert_name(name: str) -> str:
     return name.replace("-", "_")
 
 def get_env_name(name: str) -> str:
     return convert_name(name).upper()
 
-def add_option(parser: ArgumentParser, user_kwargs, **kwargs ):
+def resolve_option_spec(parser: ArgumentParser, user_kwargs, **kwargs) -> dict:
+    """
+    resolve_option_spec carries out the part of `add_option` that does not depend on the environment, the resulting
+    spec is passed to `apply_option_spec` to add the option to the parser.
+    """
     shard = kwargs.get("shard", "")
     cli_shard, help_shard = get_shard_values(shard)
     is_shard = len(shard.strip()) > 0
@@ -239,30 +768,155 @@ def add_option(parser: ArgumentParser, user_kwargs, **kwargs ):
         has_user_default = True
         user_default = user_kwargs[convert_name(name)]
 
-    genv = dict(shard=shard)
+    spec = dict(args=opt_args, kwargs=opt_kwargs, name=convert_name(name), env=get_env_name(name), shard=shard,
+                required=is_required)
     if has_author_default_default:
-        genv['default'] = author_default
+        spec['default'] = author_default
 
     if has_user_default:
-        genv['default'] = user_default
+        spec['default'] = user_default
 
-    if 'type' in kwargs:
-        genv['type'] = kwargs['type']
+    if 'lazy_default' in kwargs:
+        spec['lazy_default'] = kwargs['lazy_default']
 
+    return spec
 
-    has_default, default =__get_env__(get_env_name(name), **genv)
+
+def apply_option_spec(parser: ArgumentParser, spec: dict, action_class=None):
+    """
+    apply_option_spec resolves the default of the option described by `spec` from the environment and adds the option
+    to the parser.
+
+    :param parser: The parser to add the option to
+    :param spec: The spec returned by `resolve_option_spec`
+    :param action_class: If set, `spec` must contain the `dest` of the option, the option is added by constructing
+                         this action directly, skipping the validation `ArgumentParser.add_argument` already carried
+                         out when the spec was first applied
+    :return: The added action
+    """
+    opt_kwargs = dict(spec['kwargs'])
+
+    genv = dict(shard=spec['shard'])
+    if 'default' in spec:
+        genv['default'] = spec['default']
+
+    # Values from config files, added with add_config_files, take precedence over the script author's defaults.
+    config_resolver = getattr(parser, 'config_resolver', None)
+    if config_resolver is not None:
+        _, found, value = config_resolver.lookup(spec['env'], spec['shard'])
+        if found:
+            genv['default'] = value
+
+    if 'type' in opt_kwargs:
+        genv['type'] = opt_kwargs['type']
+
+    profiler = profiling.profiler
+    if profiler is not None:
+        start = perf_counter()
+
+    has_default, default =__get_env__(spec['env'], resolver=get_env_resolver(parser),
+                                      env_registry=get_environment_registry(parser), **genv)
+
+    if profiler is not None:
+        profiler.record_current("environment", spec['shard'], perf_counter() - start)
 
     if has_default:
         opt_kwargs['default'] = default
 
         # If the option is required, and we have loaded a default from the environment
         # we do not need to enforce required.
-        if is_required:
+        if spec['required']:
             opt_kwargs['required'] = False
 
+    elif 'lazy_default' in spec:
+        # argparse only passes a string default through `type` when the option was not given on the command line,
+        # which is when the lazy default needs to be resolved.
+        lazy_default = spec['lazy_default']
+        opt_kwargs['default'] = lazy_default
+        opt_kwargs['type'] = lazy_default_type(lazy_default, opt_kwargs.get('type', str))
+        opt_kwargs['required'] = False
+
+    if action_class is None:
+        action = parser.add_argument(*spec['args'], **opt_kwargs)
+    else:
+        action = parser._add_action(action_class(option_strings=spec['args'], dest=spec['dest'], **opt_kwargs))
+
+    if isinstance(action.default, LazyDefault) and action.default.unless is not None and \
+            action.default.error is not None:
+        waivable_lazy_defaults = getattr(parser, 'waivable_lazy_defaults', None)
+        if waivable_lazy_defaults is None:
+            waivable_lazy_defaults = []
+            setattr(parser, 'waivable_lazy_defaults', waivable_lazy_defaults)
+        waivable_lazy_defaults.append((action, spec['shard']))
+
+    register_shard_option(parser, spec['shard'], spec['name'], action.dest)
+    return action
+
 
-    parser.add_argument(*opt_args, **opt_kwargs)
+def record_option_spec(parser: ArgumentParser, spec: dict, action):
+    spec_recorder = getattr(parser, 'spec_recorder', None)
+    if spec_recorder is not None:
+        spec['dest'] = action.dest
+        spec_recorder.append(spec)
 
 
+def add_option(parser: ArgumentParser, user_kwargs, **kwargs ):
+    option_recorder = getattr(parser, 'option_recorder', None)
+    if option_recorder is not None:
+        option_recorder.append(kwargs)
+
+    spec = resolve_option_spec(parser, user_kwargs, **kwargs)
+    action = apply_option_spec(parser, spec)
+    record_option_spec(parser, spec, action)
 
 
+def add_sharded_parser_options(parser: ArgumentParser, helper_class, shards, *args, shard_kwargs: dict = None,
+                               **kwargs):
+    """
+    add_sharded_parser_options registers `helper_class` for every shard in `shards` in one call. The helper's
+    `add_parser_options` is only run for the first shard, the options it adds are used as a template for the other
+    shards, which are added to the parser without running the helper again. The resulting options and environment
+    variables are the same as calling `add_parser_options` once for each shard.
+
+    :param parser: The parser to add the options to
+    :param helper_class: The helper to add the options of
+    :param shards: The shards to add
+    :param args: Positional arguments passed to the helpers `add_parser_options`
+    :param shard_kwargs: A dict of shard to the user defaults for that shard, these override `kwargs`
+    :param kwargs: The user defaults passed to the helpers `add_parser_options` for every shard
+    """
+    shards = list(shards)
+    if shard_kwargs is None:
+        shard_kwargs = {}
+    if len(shards) == 0:
+        return
+
+    template_shard = shards[0]
+    shard_registry = get_shard_registry(parser)
+    parser.option_recorder = []
+    registry_shard_recorder = shard_registry.shard_recorder
+    shard_registry.shard_recorder = []
+    try:
+        helper_class.add_parser_options(parser, *args, shard=template_shard,
+                                        **dict(kwargs, **shard_kwargs.get(template_shard, {})))
+        template_options = parser.option_recorder
+        template_helpers = [helper_name for helper_name, shard in shard_registry.shard_recorder]
+    finally:
+        del parser.option_recorder
+        if registry_shard_recorder is not None:
+            registry_shard_recorder.extend(shard_registry.shard_recorder)
+        shard_registry.shard_recorder = registry_shard_recorder
+
+    for helper_name in dict.fromkeys(template_helpers):
+        shard_registry.register_shard_names(helper_name, shards[1:])
+
+    action_class = parser._registry_get('action', None, None)
+    with get_environment_registry(parser).batch():
+        for shard in shards[1:]:
+            user_kwargs = dict(kwargs, **shard_kwargs.get(shard, {}))
+            cli_shard, _ = get_shard_values(shard)
+            for option_kwargs in template_options:
+                spec = resolve_option_spec(parser, user_kwargs, **dict(option_kwargs, shard=shard))
+                spec['dest'] = convert_name(f"{cli_shard}{option_kwargs['name']}")
+                action = apply_option_spec(parser, spec, action_class=action_class)
+                record_option_spec(parser, spec, action)
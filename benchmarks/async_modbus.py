@@ -0,0 +1,71 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Checks ModbusSerialHelper.open_async_modbus_serial against local pymodbus servers on pty bridges, polling every bus
+from one event loop, and reports the request rate.
+"""
+import asyncio
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from benchmarks.modbus_sim import PtyBridge, start_serial_simulator
+
+
+async def poll(bridge, requests):
+    parser = ArgumentParser("AsyncModbusBenchmark")
+    ModbusSerialHelper.add_parser_options(parser)
+    args = parser.parse_args(["--modbus-port", bridge.client_port, "--modbus-baudrate", "115200",
+                              "--modbus-timeout", "1"])
+    async with ModbusSerialHelper.open_async_modbus_serial(args) as client:
+        for index in range(requests):
+            address = index % 100
+            result = await client.read_holding_registers(address, count=10, device_id=1)
+            assert not result.isError() and result.registers == list(range(address, address + 10)), result
+    return requests
+
+
+async def run(buses, requests):
+    bridges = [PtyBridge().start() for _ in range(buses)]
+    simulators = [start_serial_simulator(bridge.server_port, baudrate=115200) for bridge in bridges]
+    try:
+        start = time.perf_counter()
+        total = sum(await asyncio.gather(*[poll(bridge, requests) for bridge in bridges]))
+        elapsed = time.perf_counter() - start
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+        for bridge in bridges:
+            bridge.stop()
+    assert sum(simulator.requests for simulator in simulators) == total
+    return total, elapsed
+
+
+def main():
+    parser = ArgumentParser("AsyncModbusBenchmark")
+    parser.add_argument("--buses", type=int, nargs="+", default=[1, 4], help="The numbers of buses. (default: 1 4)")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="The number of reads on each bus. (default: 200)")
+    bench_args = parser.parse_args()
+
+    for buses in bench_args.buses:
+        total, elapsed = asyncio.run(run(buses, bench_args.requests))
+        print(f"{buses:>3} buses: {total} reads in {elapsed:.3f}s, {total / elapsed:.0f} reads/s")
+
+
+if __name__ == '__main__':
+    main()
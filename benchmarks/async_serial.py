@@ -0,0 +1,103 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Checks SerialHelper.create_async_serial against pty pairs standing in for serial devices, and times the
+throughput of one event loop serving every port. The master side of each pty is driven by the same transport.
+"""
+import asyncio
+import os
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.asyncserial import open_serial_connection
+from argparseutils.helpers.utils import RegistryContext
+
+
+def open_pty():
+    master, slave = os.openpty()
+    os.set_blocking(master, False)
+    name = os.ttyname(slave)
+    return open(master, 'r+b', buffering=0), slave, name
+
+
+async def run(ports, size, chunk):
+    shards = [f"port{index}" for index in range(ports)]
+    ptys = [open_pty() for _ in shards]
+
+    parser = ArgumentParser("AsyncSerialBenchmark")
+    argv = []
+    for shard, (_, _, name) in zip(shards, ptys):
+        SerialHelper.add_parser_options(parser, shard=shard)
+        argv.extend([f"--{shard}-port", name])
+    args = parser.parse_args(argv)
+
+    devices = [await SerialHelper.create_async_serial(args, shard) for shard in shards]
+    masters = [await open_serial_connection(master) for master, _, _ in ptys]
+    for _, slave, _ in ptys:
+        os.close(slave)
+
+    # Round trip in both directions on every port.
+    for index, ((reader, writer), (master_reader, master_writer)) in enumerate(zip(devices, masters)):
+        writer.write(f"ping {index}\n".encode())
+        await writer.drain()
+        assert await master_reader.readline() == f"ping {index}\n".encode()
+        master_writer.write(f"pong {index}\n".encode())
+        assert await reader.readline() == f"pong {index}\n".encode()
+
+    payload = bytes(range(256)) * (chunk // 256)
+
+    async def feed(master_writer):
+        for _ in range(size // len(payload)):
+            master_writer.write(payload)
+            await master_writer.drain()
+
+    async def consume(reader):
+        remaining = size // len(payload) * len(payload)
+        while remaining:
+            remaining -= len(await reader.read(remaining))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[feed(master_writer) for _, master_writer in masters],
+                         *[consume(reader) for reader, _ in devices])
+    elapsed = time.perf_counter() - start
+
+    for _, writer in devices + masters:
+        writer.close()
+    await asyncio.sleep(0)
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser("AsyncSerialBenchmark")
+    parser.add_argument("--ports", type=int, nargs="+", default=[1, 16, 64],
+                        help="The numbers of pty pairs to serve from one event loop. (default: 1 16 64)")
+    parser.add_argument("--size", type=int, default=1024 * 1024,
+                        help="The number of bytes to send to each port. (default: 1048576)")
+    parser.add_argument("--chunk", type=int, default=4096,
+                        help="The size of each write to the pty master. (default: 4096)")
+    bench_args = parser.parse_args()
+
+    for ports in bench_args.ports:
+        with RegistryContext():
+            elapsed = asyncio.run(run(ports, bench_args.size, bench_args.chunk))
+        total = ports * bench_args.size
+        print(f"{ports:>4} ports: {total / elapsed / 1e6:.1f}MB/s in {elapsed * 1e3:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
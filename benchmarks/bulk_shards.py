@@ -0,0 +1,70 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compares the construction and parse_args time of a parser with 1 to 1000 SerialHelper and MQTTClientHelper shards,
+added with one add_parser_options call per shard (loop) or with add_sharded_parser_options (bulk).
+"""
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.mqtt import MQTTClientHelper
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import add_sharded_parser_options
+
+
+def build_loop(parser, shards):
+    for shard in shards:
+        SerialHelper.add_parser_options(parser, shard=f"serial{shard}", port=f"/dev/ttyUSB{shard}")
+        MQTTClientHelper.add_parser_options(parser, "bench", shard=f"mqtt{shard}")
+
+
+def build_bulk(parser, shards):
+    add_sharded_parser_options(parser, SerialHelper, [f"serial{x}" for x in shards],
+                               shard_kwargs={f"serial{x}": dict(port=f"/dev/ttyUSB{x}") for x in shards})
+    add_sharded_parser_options(parser, MQTTClientHelper, [f"mqtt{x}" for x in shards], "bench")
+
+
+def measure(builder, shards):
+    start = time.perf_counter()
+    parser = ArgumentParser("bench")
+    builder(parser, shards)
+    built = time.perf_counter()
+    args = parser.parse_args([])
+    parsed = time.perf_counter()
+    return parser, args, built - start, parsed - built
+
+
+def main():
+    parser = ArgumentParser("BulkShardsBenchmark")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 100, 1000],
+                        help="The shard counts to measure. (default: [1, 10, 100, 1000])")
+    bench_args = parser.parse_args()
+
+    print(f"{'shards':>6} {'loop build':>11} {'bulk build':>11} {'loop parse':>11} {'bulk parse':>11}")
+    for count in bench_args.counts:
+        shards = list(range(count))
+        loop_parser, loop_args, loop_build, loop_parse = measure(build_loop, shards)
+        bulk_parser, bulk_args, bulk_build, bulk_parse = measure(build_bulk, shards)
+        assert vars(loop_args) == vars(bulk_args)
+        assert sorted(x.option_strings for x in loop_parser._actions) == \
+               sorted(x.option_strings for x in bulk_parser._actions)
+        print(f"{count:>6} {loop_build * 1000:>9.1f}ms {bulk_build * 1000:>9.1f}ms "
+              f"{loop_parse * 1000:>9.1f}ms {bulk_parse * 1000:>9.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
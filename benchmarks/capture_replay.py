@@ -0,0 +1,86 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Writes a synthetic capture of a device sending frames at a given baudrate, then replays it through SerialHelper's
+--replay-file at several speeds and reports the rate the consumer achieved relative to the line rate.
+"""
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.capture import CAPTURE_MAGIC, RECORD_HEADER, READ
+from argparseutils.helpers.util.framereader import FrameReader, FixedLengthSplitter
+from argparseutils.helpers.utils import RegistryContext
+
+
+def write_capture(path, seconds, baudrate, frame_size):
+    # 10 bits per byte on the wire, 8N1.
+    frame_ns = int(frame_size * 10 / baudrate * 1e9)
+    frames = int(seconds * 1e9 / frame_ns)
+    frame = bytes(range(frame_size))
+    start = time.time_ns()
+    with open(path, "wb") as file:
+        file.write(CAPTURE_MAGIC)
+        for index in range(frames):
+            file.write(RECORD_HEADER.pack(start + index * frame_ns, READ, frame_size))
+            file.write(frame)
+    return frames
+
+
+def replay(path, speed, frames, frame_size):
+    with RegistryContext():
+        parser = ArgumentParser("CaptureReplayBenchmark")
+        SerialHelper.add_parser_options(parser)
+        args = parser.parse_args(["--port", "replay", "--replay-file", path, "--replay-speed", str(speed),
+                                  "--timeout", "1"])
+        start = time.perf_counter()
+        port = SerialHelper.create_serial(args)
+        count = 0
+        reader = FrameReader(port, FixedLengthSplitter(frame_size))
+        while True:
+            for _ in reader.frames():
+                count += 1
+            if count >= frames or reader.fill() == 0:
+                break
+        elapsed = time.perf_counter() - start
+        port.close()
+    return count, elapsed
+
+
+def main():
+    parser = ArgumentParser("CaptureReplayBenchmark")
+    parser.add_argument("--seconds", type=float, default=10, help="The length of the capture. (default: 10)")
+    parser.add_argument("--baudrate", type=int, default=115200, help="The captured baudrate. (default: 115200)")
+    parser.add_argument("--frame-size", type=int, default=64, help="The size of each frame. (default: 64)")
+    parser.add_argument("--speeds", type=float, nargs="+", default=[10, 100, 0],
+                        help="The replay speeds, 0 replays as fast as possible. (default: 10 100 0)")
+    bench_args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "capture.bin")
+        frames = write_capture(path, bench_args.seconds, bench_args.baudrate, bench_args.frame_size)
+        print(f"capture: {frames} frames, {os.path.getsize(path) / 1e6:.1f}MB, {bench_args.seconds}s")
+        for speed in bench_args.speeds:
+            count, elapsed = replay(path, speed, frames, bench_args.frame_size)
+            print(f"speed {speed:>5}: {count}/{frames} frames in {elapsed:.3f}s, "
+                  f"{bench_args.seconds / elapsed:.1f}x line rate")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compares FrameReader against the naive loop of port.read(), bytes concatenation and split, reading newline delimited
+frames from a SerialHelper port on a pty pair. Reports the throughput and the peak memory allocated by the read
+loop, traced by tracemalloc after the loop's buffers were set up, and the time to split frames already in memory.
+"""
+import os
+import threading
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.framereader import FrameReader, DelimiterSplitter
+from argparseutils.helpers.utils import RegistryContext
+
+
+def naive(port, frames, ready):
+    count = 0
+    buffer = b""
+    ready()
+    while count < frames:
+        buffer += port.read(max(1, port.in_waiting))
+        while b"\n" in buffer:
+            frame, buffer = buffer.split(b"\n", 1)
+            count += 1
+    return count
+
+
+def frame_reader(port, frames, ready):
+    count = 0
+    reader = FrameReader(port, DelimiterSplitter(b"\n"))
+    ready()
+    while True:
+        for _ in reader.frames():
+            count += 1
+        # Another fill after the last frame would wait out the port's timeout.
+        if count >= frames:
+            return count
+        reader.fill()
+
+
+class MemoryPort:
+    """
+    A port that returns `data` in reads of `read_size` bytes, to time the splitting without the pty.
+    """
+    timeout = None
+
+    def __init__(self, data: bytes, read_size: int = 4096):
+        self.data = memoryview(data)
+        self.read_size = read_size
+        self.offset = 0
+        self.in_waiting = read_size
+
+    def read(self, size=1):
+        data = bytes(self.data[self.offset:self.offset + min(size, self.read_size)])
+        self.offset += len(data)
+        return data
+
+    def readinto(self, view):
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+
+def split_only(runner, frames, frame_size):
+    data = (b"x" * (frame_size - 1) + b"\n") * frames
+    start = time.perf_counter()
+    count = runner(MemoryPort(data), frames, lambda: None)
+    return count, time.perf_counter() - start
+
+
+def run(runner, frames, frame_size, trace):
+    with RegistryContext():
+        master, slave = os.openpty()
+        parser = ArgumentParser("FrameReaderBenchmark")
+        SerialHelper.add_parser_options(parser)
+        port = SerialHelper.create_serial(parser.parse_args(["--port", os.ttyname(slave), "--timeout", "1"]))
+
+        payload = (b"x" * (frame_size - 1) + b"\n") * 64
+
+        def feed():
+            for _ in range(frames // 64):
+                os.write(master, payload)
+
+        feeder = threading.Thread(target=feed)
+        baseline = 0
+
+        def ready():
+            nonlocal baseline
+            if trace:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        feeder.start()
+        count = runner(port, frames // 64 * 64, ready)
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            tracemalloc.stop()
+        feeder.join()
+        port.close()
+        os.close(master)
+        os.close(slave)
+    return count, elapsed, peak
+
+
+def main():
+    parser = ArgumentParser("FrameReaderBenchmark")
+    parser.add_argument("--frames", type=int, default=200000,
+                        help="The number of frames to read. (default: 200000)")
+    parser.add_argument("--frame-size", type=int, default=64,
+                        help="The size of each frame including the delimiter. (default: 64)")
+    bench_args = parser.parse_args()
+
+    for name, runner in (("naive", naive), ("FrameReader", frame_reader)):
+        count, elapsed, _ = run(runner, bench_args.frames, bench_args.frame_size, False)
+        _, _, peak = run(runner, bench_args.frames // 10, bench_args.frame_size, True)
+        split_count, split_elapsed = split_only(runner, bench_args.frames, bench_args.frame_size)
+        assert count == bench_args.frames // 64 * 64 and split_count == bench_args.frames
+        print(f"{name:>12}: {count / elapsed / 1e3:.0f}k frames/s, "
+              f"{count * bench_args.frame_size / elapsed / 1e6:.1f}MB/s, peak allocated {peak / 1024:.1f}KiB, "
+              f"split only {split_elapsed / split_count * 1e9:.0f}ns/frame")
+
+
+if __name__ == '__main__':
+    main()
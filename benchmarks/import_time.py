@@ -0,0 +1,83 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Import time regression check.
+
+Runs `python -X importtime` in a fresh interpreter that imports every helper and builds a parser with
+`add_parser_options`, then fails if any of the optional third-party backends were imported along the way.
+"""
+import subprocess
+import sys
+from argparse import ArgumentParser
+
+HEAVY_BACKENDS = ["serial", "pymodbus", "paho", "requests"]
+
+SCRIPT = """
+from argparse import ArgumentParser
+from argparseutils.helpers import LoggingHelper, MailGunHelper, ModbusSerialHelper, MQTTClientHelper, SerialHelper, \
+    SocketHelper
+parser = ArgumentParser("import_time")
+LoggingHelper.add_parser_options(parser)
+MailGunHelper.add_parser_options(parser, mailgun_api_key="key", mailgun_domain="example.com")
+ModbusSerialHelper.add_parser_options(parser, modbus_port="/dev/null")
+MQTTClientHelper.add_parser_options(parser, "import_time")
+SerialHelper.add_parser_options(parser, port="/dev/null")
+SocketHelper.add_parser_options(parser)
+parser.format_help()
+"""
+
+
+def parse_importtime(stderr: str):
+    """
+    Returns a dict of module name to cumulative import time in microseconds.
+    """
+    result = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        result[name.strip()] = int(cumulative_us)
+    return result
+
+
+def main():
+    parser = ArgumentParser("ImportTime")
+    parser.add_argument("--max-total-ms", type=float, default=None,
+                        help="Fail if importing argparseutils.helpers takes longer than this. (default: None)")
+    args = parser.parse_args()
+
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", SCRIPT], capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        sys.exit(proc.returncode)
+
+    modules = parse_importtime(proc.stderr)
+    loaded = sorted(x for x in modules if x.split(".")[0] in HEAVY_BACKENDS)
+    total_ms = modules.get("argparseutils.helpers", 0) / 1000
+
+    print(f"argparseutils.helpers import: {total_ms:.2f}ms")
+    if len(loaded) > 0:
+        print(f"FAIL: optional backends imported while building the parser: {' '.join(loaded)}", file=sys.stderr)
+        sys.exit(1)
+    if args.max_total_ms is not None and total_ms > args.max_total_ms:
+        print(f"FAIL: import took longer than {args.max_total_ms}ms", file=sys.stderr)
+        sys.exit(1)
+    print("OK: no optional backends imported")
+
+
+if __name__ == '__main__':
+    main()
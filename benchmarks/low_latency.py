@@ -0,0 +1,97 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Checks the SerialHelper low latency options that can be checked without hardware on a pty pair: the settings are
+reported, VMIN holds off readiness until that many bytes arrived, and the number of select wakeups to receive a
+stream of bytes with and without VMIN.
+"""
+import logging
+import os
+import select
+import threading
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import RegistryContext
+
+
+def open_port(argv):
+    with RegistryContext():
+        master, slave = os.openpty()
+        parser = ArgumentParser("LowLatencyBenchmark")
+        SerialHelper.add_parser_options(parser)
+        port = SerialHelper.create_serial(parser.parse_args(["--port", os.ttyname(slave)] + argv))
+    return master, slave, port
+
+
+def is_readable(port, timeout=0.05):
+    readable, _, _ = select.select([port.fileno()], [], [], timeout)
+    return bool(readable)
+
+
+def count_wakeups(port, master, size, frame, interval):
+    def feed():
+        for offset in range(0, size, 1):
+            os.write(master, b"x")
+            time.sleep(interval)
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    wakeups = received = 0
+    while received < size:
+        select.select([port.fileno()], [], [], 1)
+        wakeups += 1
+        try:
+            received += len(os.read(port.fileno(), frame))
+        except BlockingIOError:
+            pass
+    feeder.join()
+    return wakeups
+
+
+def main():
+    parser = ArgumentParser("LowLatencyBenchmark")
+    parser.add_argument("--size", type=int, default=256, help="The number of bytes to stream. (default: 256)")
+    parser.add_argument("--vmin", type=int, default=16, help="The VMIN to compare against 1. (default: 16)")
+    bench_args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
+
+    master, slave, port = open_port(["--low-latency", "True", "--latency-timer", "1", "--vmin", "4", "--vtime", "0",
+                                     "--rx-buffer-size", "4096"])
+    print("settings:", port.latency_settings)
+    assert port.latency_settings['vmin'] == "applied" and port.latency_settings['vtime'] == "applied"
+    os.write(master, b"abc")
+    assert not is_readable(port), "VMIN=4 should not be readable after 3 bytes"
+    os.write(master, b"d")
+    assert is_readable(port), "VMIN=4 should be readable after 4 bytes"
+    print("VMIN=4 holds off readiness until the 4th byte")
+    for fd in (master, slave):
+        os.close(fd)
+    port.close()
+
+    for vmin in (1, bench_args.vmin):
+        master, slave, port = open_port(["--vmin", str(vmin)])
+        wakeups = count_wakeups(port, master, bench_args.size // vmin * vmin, 4096, 0.0005)
+        print(f"VMIN={vmin:>3}: {wakeups} wakeups to receive {bench_args.size // vmin * vmin} bytes one at a time")
+        port.close()
+        for fd in (master, slave):
+            os.close(fd)
+
+
+if __name__ == '__main__':
+    main()
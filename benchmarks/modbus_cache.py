@@ -0,0 +1,106 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Several threads read the same registers through one client to a local pymodbus server on a pty bridge, sharing a plain
+client and then ModbusReadCache with and without a TTL, and reports the reads, the requests the server answered and the
+hit rate.
+"""
+import threading
+import time
+from contextlib import nullcontext
+from argparse import ArgumentParser
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.util.modbuscache import ModbusReadCache
+from benchmarks.modbus_sim import PtyBridge, start_serial_simulator
+
+BLOCKS = [(address, 10) for address in range(0, 50, 10)]
+
+
+def read_all(client, lock, rounds: int):
+    for _ in range(rounds):
+        for address, count in BLOCKS:
+            with lock:
+                result = client.read_holding_registers(address, count=count, device_id=1)
+            assert not result.isError() and result.registers == list(range(address, address + count)), result
+
+
+def run(client, threads: int, rounds: int, lock) -> float:
+    workers = [threading.Thread(target=read_all, args=(client, lock, rounds)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def check_expiry_and_eviction(client):
+    now = [0.0]
+    cache = ModbusReadCache(client, ttl=1.0, max_size=2, clock=lambda: now[0])
+    for address in (0, 10, 0, 20):
+        cache.read_holding_registers(address, count=10)
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions, len(cache)) == (1, 3, 1, 2), cache.stats
+    now[0] = 1.0
+    cache.read_holding_registers(20, count=10)
+    assert cache.stats.expired == 1, cache.stats
+    cache.write_register(5, 5)
+    assert len(cache) == 0
+    cache.write_register(5, 5)
+
+
+def main():
+    parser = ArgumentParser("ModbusCacheBenchmark")
+    parser.add_argument("--threads", type=int, default=4, help="The number of reading threads. (default: 4)")
+    parser.add_argument("--rounds", type=int, default=20, help="The reads of every block per thread. (default: 20)")
+    parser.add_argument("--ttl", type=float, default=0.5, help="The TTL of the cached run (seconds). (default: 0.5)")
+    bench_args = parser.parse_args()
+
+    bridge = PtyBridge().start()
+    simulator = start_serial_simulator(bridge.server_port, baudrate=19200)
+    try:
+        modbus_parser = ArgumentParser("ModbusCacheBenchmark")
+        ModbusSerialHelper.add_parser_options(modbus_parser)
+        reads = bench_args.threads * bench_args.rounds * len(BLOCKS)
+        for name, ttl in (("plain", None), ("in flight", 0), (f"ttl {bench_args.ttl}", bench_args.ttl)):
+            args = modbus_parser.parse_args(["--modbus-port", bridge.client_port, "--modbus-baudrate", "19200",
+                                             "--modbus-timeout", "1", "--modbus-cache-ttl", str(ttl or 0)])
+            if ttl is None:
+                client = ModbusSerialHelper.create_modbus_serial(args)
+                lock = threading.Lock()
+            else:
+                client = ModbusSerialHelper.create_cached_modbus_serial(args)
+                # The cache serialises the bus requests itself.
+                lock = nullcontext()
+            client.connect()
+            served = simulator.requests
+            elapsed = run(client, bench_args.threads, bench_args.rounds, lock)
+            requests = simulator.requests - served
+            hit_rate = f", hit rate {client.stats.hit_rate:.0%}" if ttl is not None else ""
+            print(f"{name:>10}: {reads} reads in {elapsed:.2f}s, {reads / elapsed:6.0f} reads/s, "
+                  f"{requests} bus requests{hit_rate}")
+            if ttl is not None:
+                assert requests == client.stats.misses
+                check_expiry_and_eviction(client.client)
+            client.close()
+    finally:
+        simulator.stop()
+        bridge.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Polls several buses, each a local pymodbus simulator on a pty bridge configured as a ModbusSerialHelper shard, one bus
+after another and then with ModbusMultiBusPoller in threads and in processes, and reports the time taken and the per
+bus latency and error counters.
+"""
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.util.modbusplan import ModbusPoint, ModbusReadPlanner
+from argparseutils.helpers.util.modbuspoller import ModbusMultiBusPoller
+from benchmarks.modbus_sim import PtyBridge, start_serial_simulator
+
+
+def create_points(bus: int) -> list:
+    return [ModbusPoint(f"bus{bus}-{index}", index * 20 + bus, count=10) for index in range(5)]
+
+
+def sequential(args, points, cycles):
+    clients = {shard: ModbusSerialHelper.create_modbus_serial(args, shard) for shard in points}
+    planners = {shard: ModbusReadPlanner(bus_points) for shard, bus_points in points.items()}
+    for client in clients.values():
+        client.connect()
+    start = time.perf_counter()
+    for _ in range(cycles):
+        for shard, planner in planners.items():
+            planner.read(clients[shard])
+    elapsed = time.perf_counter() - start
+    for client in clients.values():
+        client.close()
+    return elapsed
+
+
+def concurrent(args, points, cycles, use_processes):
+    poller = ModbusMultiBusPoller(args, points, interval=0, use_processes=use_processes, cycles=cycles)
+    start = time.perf_counter()
+    with poller:
+        for result in poller:
+            assert not result.errors, result.errors
+            assert all(value == list(range(point.address, point.address + 10)) for point, value in
+                       zip(points[result.shard], result.values.values()))
+    elapsed = time.perf_counter() - start
+    assert all(stats.polls == cycles for stats in poller.stats.values())
+    return elapsed, poller.stats
+
+
+def main():
+    parser = ArgumentParser("ModbusMultiBusBenchmark")
+    parser.add_argument("--buses", type=int, default=8, help="The number of buses. (default: 8)")
+    parser.add_argument("--cycles", type=int, default=50, help="The number of polls of each bus. (default: 50)")
+    bench_args = parser.parse_args()
+
+    bridges = [PtyBridge().start() for _ in range(bench_args.buses)]
+    simulators = [start_serial_simulator(bridge.server_port, baudrate=19200) for bridge in bridges]
+    try:
+        modbus_parser = ArgumentParser("ModbusMultiBusBenchmark")
+        argv = []
+        points = {}
+        for bus, bridge in enumerate(bridges):
+            shard = f"bus{bus}"
+            ModbusSerialHelper.add_parser_options(modbus_parser, shard=shard)
+            argv.extend([f"--{shard}-modbus-port", bridge.client_port, f"--{shard}-modbus-baudrate", "19200",
+                         f"--{shard}-modbus-timeout", "1"])
+            points[shard] = create_points(bus)
+        args = modbus_parser.parse_args(argv)
+
+        polls = bench_args.buses * bench_args.cycles
+        elapsed = sequential(args, points, bench_args.cycles)
+        print(f"sequential: {polls} polls in {elapsed:.2f}s, {polls / elapsed:.0f} polls/s")
+        for name, use_processes in (("threads", False), ("processes", True)):
+            elapsed, stats = concurrent(args, points, bench_args.cycles, use_processes)
+            latency = max(bus_stats.mean_latency for bus_stats in stats.values())
+            errors = sum(bus_stats.errors for bus_stats in stats.values())
+            print(f"{name:>10}: {polls} polls in {elapsed:.2f}s, {polls / elapsed:.0f} polls/s, "
+                  f"worst bus mean latency {latency * 1e3:.1f}ms, {errors} errors")
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+        for bridge in bridges:
+            bridge.stop()
+
+
+if __name__ == '__main__':
+    main()
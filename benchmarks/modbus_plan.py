@@ -0,0 +1,93 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Reads a scattered register map from a local pymodbus simulator on a pty bridge, one request per point and then with
+ModbusReadPlanner at several gap tolerances, and reports the round trips counted by the simulator and the time taken.
+"""
+import random
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.util.modbusplan import ModbusPoint, ModbusReadPlanner, ReadRequest, HOLDING, INPUT, COIL
+from benchmarks.modbus_sim import PtyBridge, start_serial_simulator
+
+
+def create_points(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    points = []
+    for index in range(count):
+        point_type = rng.choice([HOLDING, HOLDING, INPUT, COIL])
+        if point_type == COIL:
+            points.append(ModbusPoint(f"p{index}", rng.randrange(0, 4000), COIL))
+        elif rng.random() < 0.3:
+            points.append(ModbusPoint(f"p{index}", rng.randrange(0, 2000), point_type, datatype="uint32"))
+        else:
+            points.append(ModbusPoint(f"p{index}", rng.randrange(0, 2000), point_type))
+    return points
+
+
+def expected_value(point: ModbusPoint):
+    # The simulator's registers hold their address, its coils are set on odd addresses.
+    if point.type == COIL:
+        return point.address % 2 == 1
+    if point.datatype == "uint32":
+        return (point.address << 16) | (point.address + 1)
+    return point.address
+
+
+def main():
+    parser = ArgumentParser("ModbusPlanBenchmark")
+    parser.add_argument("--points", type=int, default=300, help="The number of points in the map. (default: 300)")
+    parser.add_argument("--gaps", type=int, nargs="+", default=[0, 8, 32],
+                        help="The gap tolerances to plan with. (default: 0 8 32)")
+    parser.add_argument("--baudrate", type=int, default=19200, help="The bus baudrate. (default: 19200)")
+    parser.add_argument("--seed", type=int, default=1, help="The seed of the register map. (default: 1)")
+    bench_args = parser.parse_args()
+
+    points = create_points(bench_args.points, bench_args.seed)
+    bridge = PtyBridge().start()
+    simulator = start_serial_simulator(bridge.server_port, baudrate=bench_args.baudrate)
+    try:
+        modbus_parser = ArgumentParser("ModbusPlanBenchmark")
+        ModbusSerialHelper.add_parser_options(modbus_parser)
+        args = modbus_parser.parse_args(["--modbus-port", bridge.client_port, "--modbus-timeout", "1",
+                                         "--modbus-baudrate", str(bench_args.baudrate)])
+        client = ModbusSerialHelper.create_modbus_serial(args)
+        client.connect()
+
+        per_point = ModbusReadPlanner(points)
+        per_point.requests = [ReadRequest(point.unit, point.type, point.address, point.count, [point])
+                              for point in points]
+        cases = [("per point", per_point)]
+        cases.extend((f"gap {gap}", ModbusReadPlanner(points, max_gap=gap)) for gap in bench_args.gaps)
+        for name, planner in cases:
+            before = simulator.requests
+            start = time.perf_counter()
+            values = planner.read(client)
+            elapsed = time.perf_counter() - start
+            assert not planner.errors, planner.errors
+            assert all(values[point.name] == expected_value(point) for point in points)
+            print(f"{name:>10}: {simulator.requests - before:>4} round trips, {elapsed * 1e3:.0f}ms")
+        client.close()
+    finally:
+        simulator.stop()
+        bridge.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Checks ModbusBusScheduler on a simulated RTU bus, where every read advances a virtual clock by its computed bus time,
+against a loop reading every point in turn, and then polls a local pymodbus simulator over a pty bridge for a few
+seconds. Reports the missed deadlines, the worst staleness of the fast points and the bus utilisation.
+"""
+import time
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.util.modbusplan import ModbusPoint, ModbusReadPlanner, HOLDING
+from argparseutils.helpers.util.modbusschedule import BusTiming, ModbusBusScheduler
+from benchmarks.modbus_sim import PtyBridge, start_serial_simulator
+
+
+class VirtualBus:
+    """
+    A client and clock for a simulated bus, each read takes the time the timing says it holds the bus.
+    """
+
+    def __init__(self, timing: BusTiming):
+        self.timing = timing
+        self.now = 0.0
+        self.read_times = {}
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def read(self, address, count, device_id, kind):
+        from argparseutils.helpers.util.modbusplan import ReadRequest
+        self.now += self.timing.get_transaction_time(ReadRequest(device_id, kind, address, count))
+        self.read_times[(device_id, address)] = self.now
+        return SimpleNamespace(isError=lambda: False, registers=list(range(address, address + count)))
+
+    def read_holding_registers(self, address, count=1, device_id=1):
+        return self.read(address, count, device_id, HOLDING)
+
+
+def create_groups(fast_units, slow_units):
+    groups = [([ModbusPoint(f"fast{unit}", 0, unit=unit)], 0.25) for unit in range(1, fast_units + 1)]
+    groups.extend(([ModbusPoint(f"slow{unit}-{index}", index * 50, count=40, unit=unit) for index in range(4)], 5.0)
+                  for unit in range(fast_units + 1, fast_units + slow_units + 1))
+    return groups
+
+
+def track_staleness(bus, duration, run):
+    """
+    Returns the longest time between two updates of any fast point.
+    """
+    worst = 0.0
+    updated = {}
+
+    def record(values, errors):
+        nonlocal worst
+        for name in values:
+            if name.startswith("fast"):
+                worst = max(worst, bus.now - updated.get(name, 0.0))
+                updated[name] = bus.now
+
+    run(record)
+    return worst
+
+
+def virtual_bus(baudrate, fast_units, slow_units, duration):
+    timing = BusTiming.from_line(baudrate)
+    groups = create_groups(fast_units, slow_units)
+
+    bus = VirtualBus(timing)
+    scheduler = ModbusBusScheduler(bus, timing, clock=bus.clock, sleep=bus.sleep)
+    for points, interval in groups:
+        scheduler.add(points, interval)
+    staleness = track_staleness(bus, duration,
+                                lambda record: (setattr(scheduler, 'callback', record), scheduler.run(duration)))
+    stats = scheduler.get_stats()
+    print(f"  scheduler: demand {stats['demand']:.0%}, utilisation {stats['utilisation']:.0%}, "
+          f"{stats['reads']} reads, {stats['missed_deadlines']} missed deadlines, "
+          f"worst fast point age {staleness * 1e3:.0f}ms")
+
+    bus = VirtualBus(timing)
+    planners = [ModbusReadPlanner(points) for points, _ in groups]
+
+    def round_robin(record):
+        while bus.now < duration:
+            for planner in planners:
+                for request in planner.requests:
+                    values = {}
+                    planner.read_request(bus, request, values)
+                    record(values, {})
+                    bus.now += timing.frame_gap
+
+    staleness = track_staleness(bus, duration, round_robin)
+    print(f"round robin: worst fast point age {staleness * 1e3:.0f}ms")
+
+
+def simulator_bus(baudrate, duration):
+    bridge = PtyBridge().start()
+    simulator = start_serial_simulator(bridge.server_port, devices=(1, 2), baudrate=baudrate)
+    try:
+        parser = ArgumentParser("ModbusScheduleBenchmark")
+        ModbusSerialHelper.add_parser_options(parser)
+        args = parser.parse_args(["--modbus-port", bridge.client_port, "--modbus-baudrate", str(baudrate),
+                                  "--modbus-timeout", "1"])
+        client = ModbusSerialHelper.create_modbus_serial(args)
+        client.connect()
+        scheduler = ModbusBusScheduler(client, BusTiming.from_args(args))
+        scheduler.add([ModbusPoint("fast", 0, unit=1)], 0.05)
+        scheduler.add([ModbusPoint(f"slow{index}", index * 10, count=10, unit=2) for index in range(5)], 1.0)
+        scheduler.run(duration)
+        client.close()
+        stats = scheduler.get_stats()
+        assert scheduler.values["fast"] == 0 and scheduler.values["slow1"] == list(range(10, 20))
+        print(f"  simulator: {stats['reads']} reads, {simulator.requests} requests served, "
+              f"{stats['missed_deadlines']} missed deadlines, utilisation {stats['utilisation']:.0%}")
+    finally:
+        simulator.stop()
+        bridge.stop()
+
+
+def main():
+    parser = ArgumentParser("ModbusScheduleBenchmark")
+    parser.add_argument("--baudrate", type=int, default=9600, help="The bus baudrate. (default: 9600)")
+    parser.add_argument("--duration", type=float, default=60, help="The simulated seconds to poll. (default: 60)")
+    parser.add_argument("--fast-units", type=int, nargs="+", default=[4, 10],
+                        help="The numbers of units polled every 250ms. (default: 4 10)")
+    parser.add_argument("--slow-units", type=int, default=4,
+                        help="The number of units with 160 registers polled every 5s. (default: 4)")
+    parser.add_argument("--simulator-duration", type=float, default=3,
+                        help="The seconds to poll the pymodbus simulator, 0 skips it. (default: 3)")
+    bench_args = parser.parse_args()
+
+    for fast_units in bench_args.fast_units:
+        print(f"{fast_units} fast units, {bench_args.slow_units} slow units at {bench_args.baudrate} baud:")
+        virtual_bus(bench_args.baudrate, fast_units, bench_args.slow_units, bench_args.duration)
+    if bench_args.simulator_duration > 0:
+        simulator_bus(bench_args.baudrate, bench_args.simulator_duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Local pymodbus servers for the Modbus benchmarks. A serial server is reached through a PtyBridge, two pty pairs whose
+masters are joined so that each end is a serial port with a name. Every register holds its own address, and every
+coil and discrete input is set on odd addresses, so reads can be checked. The servers count the requests they answer,
+and can hold each response for a delay to act as a gateway to a slower bus.
+"""
+import asyncio
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import tty
+
+from pymodbus import FramerType
+from pymodbus.datastore import ModbusDeviceContext, ModbusSequentialDataBlock, ModbusServerContext
+from pymodbus.server import ModbusSerialServer, ModbusTcpServer
+
+
+class PtyBridge:
+    """
+    Joins two pty pairs, whatever is written to `client_port` is read from `server_port` and back again.
+    """
+
+    def __init__(self):
+        self.pairs = [os.openpty() for _ in range(2)]
+        for _, slave in self.pairs:
+            tty.setraw(slave)
+        self.client_port, self.server_port = (os.ttyname(slave) for _, slave in self.pairs)
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="PtyBridge", daemon=True)
+
+    def _run(self):
+        masters = [master for master, _ in self.pairs]
+        while not self.stopping.is_set():
+            readable, _, _ = select.select(masters, [], [], 0.1)
+            for master in readable:
+                try:
+                    data = os.read(master, 65536)
+                except OSError:
+                    continue
+                other = masters[1 - masters.index(master)]
+                view = memoryview(data)
+                while len(view) > 0:
+                    view = view[os.write(other, view):]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        for master, slave in self.pairs:
+            os.close(master)
+            os.close(slave)
+
+
+def create_context(devices, size: int = 10000) -> ModbusServerContext:
+    # The data blocks are deprecated in favour of SimData in pymodbus 4, they still cover the 3.x versions.
+    logging.getLogger("pymodbus.logging").setLevel(logging.ERROR)
+    registers = list(range(size))
+    bits = [address % 2 == 1 for address in range(size)]
+    # pymodbus data blocks are addressed from 1, the first value is for address 0 on the wire.
+    return ModbusServerContext(devices={device: ModbusDeviceContext(
+        di=ModbusSequentialDataBlock(1, bits),
+        co=ModbusSequentialDataBlock(1, bits),
+        ir=ModbusSequentialDataBlock(1, registers),
+        hr=ModbusSequentialDataBlock(1, registers),
+    ) for device in devices}, single=False)
+
+
+class Simulator:
+    """
+    Runs a pymodbus server on its own event loop thread.
+
+    :param create_server: Called on the server thread with the context and the request counting trace_pdu
+    :param delay: Seconds to hold the server before each response, blocking every connection as a gateway does
+    :param size: The number of registers and bits of each device, pymodbus takes a while to set up hundreds of devices
+    """
+
+    def __init__(self, create_server, devices=(1,), delay: float = 0, size: int = 10000):
+        self.create_server = create_server
+        self.context = create_context(devices, size)
+        self.delay = delay
+        self.requests = 0
+        self.loop = None
+        self.server = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="Simulator", daemon=True)
+
+    def trace_pdu(self, sending, pdu):
+        if not sending:
+            self.requests += 1
+        elif self.delay > 0:
+            time.sleep(self.delay)
+        return pdu
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = self.create_server(self.context, self.trace_pdu)
+        self.stopped = self.loop.create_future()
+        await self.server.serve_forever(background=True)
+        self.ready.set()
+        await self.stopped
+        await self.server.shutdown()
+
+    def start(self):
+        self.thread.start()
+        if not self.ready.wait(10):
+            raise RuntimeError("The simulator did not start")
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stopped.set_result, None)
+        self.thread.join()
+
+
+def start_serial_simulator(port: str, devices=(1,), framer: str = "rtu", baudrate: int = 9600) -> Simulator:
+    return Simulator(lambda context, trace_pdu: ModbusSerialServer(
+        context, framer=FramerType(framer), port=port, baudrate=baudrate, trace_pdu=trace_pdu), devices).start()
+
+
+def get_free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def start_tcp_simulator(host: str = "127.0.0.1", port: int = 0, devices=(1,), delay: float = 0,
+                        size: int = 10000) -> Simulator:
+    """
+    Starts a Modbus TCP server, on a free port when `port` is 0, the port is in the simulator's `port`.
+    """
+    if port == 0:
+        port = get_free_port(host)
+    simulator = Simulator(lambda context, trace_pdu: ModbusTcpServer(
+        context, address=(host, port), trace_pdu=trace_pdu), devices, delay, size)
+    simulator.host, simulator.port = host, port
+    return simulator.start()
@@ -0,0 +1,118 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Reads 10 holding registers from every unit behind several local pymodbus TCP servers, acting as gateways that hold each
+response for --delay, first one request at a time and then through ModbusTcpPool, and checks the values and the number
+of requests each server answered.
+"""
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.modbushelper import ModbusTcpHelper
+from argparseutils.helpers.util.modbusplan import ModbusPoint, ModbusReadPlanner
+from benchmarks.modbus_sim import start_tcp_simulator
+
+
+def create_planners(units: int, gateways: int) -> dict:
+    points = {f"gw{gateway}": [] for gateway in range(gateways)}
+    for unit in range(1, units + 1):
+        points[f"gw{unit % gateways}"].append(ModbusPoint(f"unit{unit}", unit, count=10, unit=unit))
+    return {shard: ModbusReadPlanner(shard_points) for shard, shard_points in points.items() if shard_points}
+
+
+def check(planners: dict, values: dict):
+    for shard, planner in planners.items():
+        assert not planner.errors, planner.errors
+        for point in planner.points:
+            assert values[shard][point.name] == list(range(point.address, point.address + 10)), values[shard]
+
+
+def create_args(simulators, max_connections: int):
+    parser = ArgumentParser("ModbusTcpPoolBenchmark")
+    argv = []
+    for gateway, simulator in enumerate(simulators):
+        shard = f"gw{gateway}"
+        ModbusTcpHelper.add_parser_options(parser, shard=shard)
+        argv.extend([f"--{shard}-modbus-tcp-host", simulator.host, f"--{shard}-modbus-tcp-port", str(simulator.port),
+                     f"--{shard}-modbus-tcp-max-connections", str(max_connections)])
+    return parser, parser.parse_args(argv)
+
+
+def sequential(simulators, units: int, rounds: int) -> float:
+    parser, args = create_args(simulators, 1)
+    planners = create_planners(units, len(simulators))
+    clients = {shard: ModbusTcpHelper.create_modbus_tcp(args, shard) for shard in planners}
+    for client in clients.values():
+        client.connect()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        values = {shard: planner.read(clients[shard]) for shard, planner in planners.items()}
+    elapsed = time.perf_counter() - start
+    check(planners, values)
+    for client in clients.values():
+        client.close()
+    return elapsed
+
+
+def pooled(simulators, units: int, rounds: int, max_connections: int):
+    parser, args = create_args(simulators, max_connections)
+    planners = create_planners(units, len(simulators))
+    with ModbusTcpHelper.create_modbus_tcp_pool(args, list(planners), parser=parser) as pool:
+        # Connect first so the timing is of the requests.
+        pool.read(planners)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            values = pool.read(planners)
+        elapsed = time.perf_counter() - start
+        check(planners, values)
+        return elapsed, pool.get_stats()
+
+
+def main():
+    parser = ArgumentParser("ModbusTcpPoolBenchmark")
+    parser.add_argument("--units", type=int, nargs="+", default=[1, 10, 50, 200],
+                        help="The numbers of units. (default: 1 10 50 200)")
+    parser.add_argument("--gateways", type=int, default=4, help="The number of gateways. (default: 4)")
+    parser.add_argument("--delay", type=float, default=0.002,
+                        help="The time each gateway holds a response (seconds). (default: 0.002)")
+    parser.add_argument("--rounds", type=int, default=5, help="The number of times every unit is read. (default: 5)")
+    parser.add_argument("--max-connections", type=int, nargs="+", default=[1, 4],
+                        help="The pool connection limits per gateway. (default: 1 4)")
+    bench_args = parser.parse_args()
+
+    devices = range(1, max(bench_args.units) + 1)
+    simulators = [start_tcp_simulator(devices=devices, delay=bench_args.delay, size=1000) for _ in range(bench_args.gateways)]
+    try:
+        for units in bench_args.units:
+            reads = units * bench_args.rounds
+            served = sum(simulator.requests for simulator in simulators)
+            elapsed = sequential(simulators, units, bench_args.rounds)
+            assert sum(simulator.requests for simulator in simulators) - served == reads
+            print(f"{units:>4} units, sequential: {reads / elapsed:7.0f} reads/s")
+            for max_connections in bench_args.max_connections:
+                elapsed, stats = pooled(simulators, units, bench_args.rounds, max_connections)
+                in_use = max(gateway.max_in_use for gateway in stats.values())
+                connects = sum(gateway.connects for gateway in stats.values())
+                print(f"{units:>4} units, pool of {max_connections}: {reads / elapsed:7.0f} reads/s, "
+                      f"{connects} connections, at most {in_use} in use per gateway")
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compares building a parser with 20 sharded helpers directly (cold) against rebuilding it from a ParserSpecCache (warm).
+"""
+import tempfile
+import timeit
+from argparse import ArgumentParser
+
+from argparseutils.helpers.mqtt import MQTTClientHelper
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.speccache import ParserSpecCache
+
+
+def build_parser(parser, shard_count=20):
+    for i in range(shard_count // 2):
+        SerialHelper.add_parser_options(parser, shard=f"serial{i}", port=f"/dev/ttyUSB{i}")
+        MQTTClientHelper.add_parser_options(parser, f"client{i}", shard=f"mqtt{i}")
+
+
+def main():
+    parser = ArgumentParser("ParserSpecCacheBenchmark")
+    parser.add_argument("--number", type=int, default=200, help="The number of parsers to build. (default: 200)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ParserSpecCache(cache_dir)
+
+        def cold():
+            cache.clear()
+            cache.build(ArgumentParser("cold"), build_parser)
+
+        def uncached():
+            build_parser(ArgumentParser("uncached"))
+
+        def warm():
+            cache.build(ArgumentParser("warm"), build_parser)
+
+        results = dict(uncached=timeit.timeit(uncached, number=args.number),
+                       cold=timeit.timeit(cold, number=args.number),
+                       warm=timeit.timeit(warm, number=args.number))
+
+        warm_parser = ArgumentParser("check")
+        cache.build(warm_parser, build_parser)
+        uncached_parser = ArgumentParser("check")
+        build_parser(uncached_parser)
+        assert vars(warm_parser.parse_args([])) == vars(uncached_parser.parse_args([]))
+        assert warm_parser.format_help() == uncached_parser.format_help()
+
+    for name, total in results.items():
+        print(f"{name:>8}: {total / args.number * 1000:.3f}ms per parser")
+
+
+if __name__ == '__main__':
+    main()
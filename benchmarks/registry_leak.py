@@ -0,0 +1,81 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Builds, parses and discards 10k sharded parsers and checks that the number of memory blocks held afterwards does not grow
+with the number of parsers when each batch of parsers uses its own RegistryContext. Every parser uses a new shard name,
+so with the global registries the registered shards and environment variables grow with the number of parsers.
+"""
+import gc
+import sys
+from argparse import ArgumentParser
+
+from argparseutils.helpers.mqtt import MQTTClientHelper
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import RegistryContext, get_shard_registry, get_environment_registry
+
+
+def build_and_parse(batch, index):
+    parser = ArgumentParser(f"leak{index}")
+    SerialHelper.add_parser_options(parser, shard=f"serial{batch}x{index}", port="/dev/null")
+    MQTTClientHelper.add_parser_options(parser, "leak", shard="mqtt")
+    parser.parse_args([])
+    parser.format_help()
+
+
+def build_batch(batch, count):
+    for index in range(count):
+        build_and_parse(batch, index)
+    return len(get_shard_registry().registered_shards(SerialHelper)), len(
+        get_environment_registry().get_known_env_params())
+
+
+def measure(name, count, scoped):
+    gc.collect()
+    start = sys.getallocatedblocks()
+    checkpoints = []
+    for batch in range(10):
+        if scoped:
+            with RegistryContext() as context:
+                shards, env_vars = build_batch(batch, count // 10)
+            context.release()
+        else:
+            shards, env_vars = build_batch(batch, count // 10)
+        gc.collect()
+        checkpoints.append(sys.getallocatedblocks() - start)
+    growth = checkpoints[-1] - checkpoints[0]
+    print(f"{name:>7}: {count} parsers, {shards} serial shards and {env_vars} environment variables registered, "
+          f"{checkpoints[0]} blocks held after the first batch, {growth} more after the last")
+    return growth
+
+
+def main():
+    parser = ArgumentParser("RegistryLeak")
+    parser.add_argument("--count", type=int, default=10000, help="The number of parsers to build. (default: 10000)")
+    parser.add_argument("--max-growth", type=int, default=1000,
+                        help="Fail if the number of memory blocks held grows by more than this after the first batch. "
+                             "(default: 1000)")
+    args = parser.parse_args()
+
+    growth = measure("scoped", args.count, True)
+    measure("global", args.count, False)
+    if growth > args.max_growth:
+        print(f"FAIL: scoped registries grew by {growth} blocks", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compares the fan-in throughput of SerialPool, one selector for every port, against a thread per port running a
+read(timeout) loop, with pty pairs standing in for the serial devices.
+"""
+import os
+import threading
+import time
+from argparse import ArgumentParser
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.serialpool import SerialPool
+from argparseutils.helpers.utils import RegistryContext
+
+
+def create_ptys(ports):
+    parser = ArgumentParser("SerialPoolBenchmark")
+    masters, slaves, argv = [], [], []
+    for index in range(ports):
+        master, slave = os.openpty()
+        masters.append(master)
+        slaves.append(slave)
+        SerialHelper.add_parser_options(parser, shard=f"port{index}")
+        argv.extend([f"--port{index}-port", os.ttyname(slave), f"--port{index}-timeout", "1"])
+    return parser, parser.parse_args(argv), masters, slaves
+
+
+def feed(masters, size, chunk):
+    payload = bytes(range(256)) * (chunk // 256)
+    for _ in range(size // len(payload)):
+        for master in masters:
+            os.write(master, payload)
+
+
+def run_pool(parser, args, masters, size, chunk, read_size):
+    expected = size // chunk * chunk * len(masters)
+    received = 0
+    with SerialPool(args, parser=parser, read_size=read_size) as pool:
+        feeder = threading.Thread(target=feed, args=(masters, size, chunk))
+        start = time.perf_counter()
+        feeder.start()
+        while received < expected:
+            for _, data in pool.poll(1):
+                received += len(data)
+        elapsed = time.perf_counter() - start
+        feeder.join()
+    return elapsed
+
+
+def run_threads(parser, args, masters, size, chunk, read_size):
+    expected = size // chunk * chunk
+    ports = [SerialHelper.create_serial(args, f"port{index}") for index in range(len(masters))]
+
+    def read(port):
+        received = 0
+        while received < expected:
+            received += len(port.read(read_size))
+
+    readers = [threading.Thread(target=read, args=(port,)) for port in ports]
+    feeder = threading.Thread(target=feed, args=(masters, size, chunk))
+    start = time.perf_counter()
+    for thread in readers + [feeder]:
+        thread.start()
+    for thread in readers + [feeder]:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for port in ports:
+        port.close()
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser("SerialPoolBenchmark")
+    parser.add_argument("--ports", type=int, nargs="+", default=[1, 16, 128],
+                        help="The numbers of pty pairs to read. (default: 1 16 128)")
+    parser.add_argument("--size", type=int, default=256 * 1024,
+                        help="The number of bytes to send to each port. (default: 262144)")
+    parser.add_argument("--chunk", type=int, default=1024,
+                        help="The size of each write to a pty master. (default: 1024)")
+    parser.add_argument("--read-size", type=int, default=4096,
+                        help="The maximum size of each read. (default: 4096)")
+    bench_args = parser.parse_args()
+
+    for ports in bench_args.ports:
+        for name, runner in (("pool", run_pool), ("threads", run_threads)):
+            with RegistryContext():
+                serial_parser, args, masters, slaves = create_ptys(ports)
+                elapsed = runner(serial_parser, args, masters, bench_args.size, bench_args.chunk,
+                                 bench_args.read_size)
+                for fd in masters + slaves:
+                    os.close(fd)
+            total = ports * bench_args.size
+            print(f"{ports:>4} ports {name:>8}: {total / elapsed / 1e6:.1f}MB/s in {elapsed * 1e3:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
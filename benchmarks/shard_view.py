@@ -0,0 +1,51 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compares reading a sharded option through CliShardWrapper, a compiled ShardView and the parsed Namespace directly.
+"""
+import timeit
+from argparse import ArgumentParser
+
+from argparseutils.helpers.mqtt import MQTTClientHelper
+from argparseutils.helpers.utils import CliShardWrapper, get_shard_view
+
+
+def main():
+    parser = ArgumentParser("ShardViewBenchmark")
+    parser.add_argument("--number", type=int, default=1000000,
+                        help="The number of attribute reads to time. (default: 1000000)")
+    bench_args = parser.parse_args()
+
+    mqtt_parser = ArgumentParser("mqtt")
+    MQTTClientHelper.add_parser_options(mqtt_parser, "bench", shard="input")
+    args = mqtt_parser.parse_args([])
+
+    wrapper = CliShardWrapper(args, "input")
+    view = get_shard_view(mqtt_parser, args, "input")
+    assert wrapper.mqtt_host == view.mqtt_host == args.input_mqtt_host
+
+    results = dict(
+        namespace=timeit.timeit("args.input_mqtt_host", globals=dict(args=args), number=bench_args.number),
+        wrapper=timeit.timeit("wrapper.mqtt_host", globals=dict(wrapper=wrapper), number=bench_args.number),
+        view=timeit.timeit("view.mqtt_host", globals=dict(view=view), number=bench_args.number),
+    )
+    for name, total in results.items():
+        print(f"{name:>9}: {total / bench_args.number * 1e9:.1f}ns per read")
+
+
+if __name__ == '__main__':
+    main()
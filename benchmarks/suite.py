@@ -0,0 +1,250 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+The benchmark suite for the paths the helpers run on every startup and in client code. It runs offline, the backends
+of the client factories are stubbed out, and writes its results as JSON which can be compared against a saved
+baseline:
+
+    python -m benchmarks --output baseline.json
+    python -m benchmarks --baseline baseline.json --threshold 0.2
+"""
+import json
+import platform
+import statistics
+import sys
+import timeit
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+from argparseutils.helpers import mqtt
+from argparseutils.helpers.mailgunhelper import MailGunHelper
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.mqtt import MQTTClientHelper
+from argparseutils.helpers.pythonlogging import LoggingHelper
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.sockethelper import SocketHelper
+from argparseutils.helpers.util.lazy import set_module
+from argparseutils.helpers.utils import RegistryContext, add_option, get_args, get_shard_view, \
+    add_sharded_parser_options
+
+benchmarks = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark, the decorated function sets up the benchmark and returns the callable to time.
+    """
+    def register(setup):
+        benchmarks[name] = setup
+        return setup
+    return register
+
+
+class StubMQTTClient:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def ws_set_options(self, **kwargs):
+        pass
+
+    def tls_set(self, **kwargs):
+        pass
+
+    def username_pw_set(self, username, password):
+        pass
+
+
+def stub_backends():
+    set_module(mqtt.mqtt_client, SimpleNamespace(Client=StubMQTTClient))
+    set_module(mqtt.mqtt_enums, SimpleNamespace(CallbackAPIVersion=SimpleNamespace(VERSION2=2)))
+
+
+def build_serial_parser(shard_count):
+    parser = ArgumentParser("bench")
+    add_sharded_parser_options(parser, SerialHelper, [f"serial{x}" for x in range(shard_count)], port="/dev/null")
+    return parser
+
+
+@benchmark("add_option")
+def bench_add_option():
+    def run():
+        add_option(ArgumentParser("bench"), {}, name="bench-option", author_default=1, shard="bench", type=int,
+                   help="A benchmark option")
+    return run
+
+
+def add_parser_options_benchmark(helper_class, *args, **kwargs):
+    @benchmark(f"add_parser_options/{helper_class.__name__}")
+    def setup():
+        def run():
+            helper_class.add_parser_options(ArgumentParser("bench"), *args, **kwargs)
+        return run
+    return setup
+
+
+add_parser_options_benchmark(LoggingHelper)
+add_parser_options_benchmark(MailGunHelper, shard="bench")
+add_parser_options_benchmark(ModbusSerialHelper, shard="bench")
+add_parser_options_benchmark(MQTTClientHelper, "bench", shard="bench")
+add_parser_options_benchmark(SerialHelper, shard="bench")
+add_parser_options_benchmark(SocketHelper, shard="bench")
+
+
+def parse_args_benchmark(shard_count):
+    @benchmark(f"parse_args/{shard_count}_shards")
+    def setup():
+        parser = build_serial_parser(shard_count)
+        return lambda: parser.parse_args([])
+    return setup
+
+
+for count in [1, 10, 100]:
+    parse_args_benchmark(count)
+
+
+def format_help_benchmark(shard_count, cached=False, compact=False):
+    name = f"format_help/{shard_count}_shards" + ("_cached" if cached else "") + ("_compact" if compact else "")
+
+    @benchmark(name)
+    def setup():
+        parser = build_serial_parser(shard_count)
+        parser.compact_help = compact
+
+        def run():
+            if not cached:
+                parser.help_cache = {}
+            parser.format_help()
+        return run
+    return setup
+
+
+format_help_benchmark(10)
+format_help_benchmark(100)
+format_help_benchmark(100, cached=True)
+format_help_benchmark(100, compact=True)
+
+
+@benchmark("shard_access/CliShardWrapper")
+def bench_shard_wrapper():
+    parser = build_serial_parser(1)
+    wrapper = get_args(parser.parse_args([]), "serial0")
+    return lambda: wrapper.baudrate
+
+
+@benchmark("shard_access/ShardView")
+def bench_shard_view():
+    parser = build_serial_parser(1)
+    args = parser.parse_args([])
+    view = get_shard_view(parser, args, "serial0")
+    return lambda: view.baudrate
+
+
+@benchmark("create/SerialHelper.create_serial_kwargs")
+def bench_create_serial_kwargs():
+    parser = build_serial_parser(1)
+    args = parser.parse_args([])
+    return lambda: SerialHelper.create_serial_kwargs(args, "serial0")
+
+
+@benchmark("create/MQTTClientHelper.create_client")
+def bench_mqtt_create_client():
+    parser = ArgumentParser("bench")
+    MQTTClientHelper.add_parser_options(parser, "bench", shard="bench", mqtt_ssl=True, mqtt_username="user")
+    args = parser.parse_args([])
+    return lambda: MQTTClientHelper.create_client(args, shard="bench")
+
+
+@benchmark("create/MailGunHelper.create_client")
+def bench_mailgun_create_client():
+    parser = ArgumentParser("bench")
+    MailGunHelper.add_parser_options(parser, shard="bench", mailgun_api_key="key", mailgun_domain="example.com")
+    args = parser.parse_args([])
+    return lambda: MailGunHelper.create_client(args, shard="bench")
+
+
+def run_benchmark(setup, repeat):
+    with RegistryContext() as context:
+        timer = timeit.Timer(setup())
+        number, _ = timer.autorange()
+        per_op_ns = [x / number * 1e9 for x in timer.repeat(repeat=repeat, number=number)]
+    context.release()
+    return dict(number=number, repeat=repeat, min_ns=round(min(per_op_ns), 1),
+                median_ns=round(statistics.median(per_op_ns), 1))
+
+
+def run_suite(names, repeat):
+    stub_backends()
+    return dict(
+        meta=dict(python=platform.python_version(), implementation=platform.python_implementation(),
+                  machine=platform.machine(), system=platform.system()),
+        results={name: run_benchmark(benchmarks[name], repeat) for name in names},
+    )
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the median time of each benchmark against the baseline.
+
+    :return: The names of the benchmarks that are slower than the baseline by more than `threshold`
+    """
+    regressions = []
+    print(f"{'benchmark':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            print(f"{name:<48} {'-':>12} {result['median_ns']:>10.0f}ns {'new':>8}")
+            continue
+        base = baseline['results'][name]['median_ns']
+        change = result['median_ns'] / base - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = " REGRESSION"
+        print(f"{name:<48} {base:>10.0f}ns {result['median_ns']:>10.0f}ns {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = ArgumentParser("python -m benchmarks", description="Runs the ArgumentParserUtils benchmark suite.")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file. (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Compare the results against this saved JSON output.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="The fractional slowdown against the baseline reported as a regression. (default: 0.2)")
+    parser.add_argument("--filter", default="", help="Only run the benchmarks whose name contains this.")
+    parser.add_argument("--repeat", type=int, default=5, help="The number of timed repeats. (default: 5)")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit.")
+    args = parser.parse_args()
+
+    names = [x for x in benchmarks if args.filter in x]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    results = run_suite(names, args.repeat)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    elif args.baseline is None:
+        print(output)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(f"{len(regressions)} regressions: {' '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
@@ -22,7 +22,7 @@ setup(name='ArgumentParserUtils',
       description="ArgumentParserUtils provides Utilities and helpers for Python's ArgumentParser.",
       author='NigelB',
       author_email='nigel.blair@gmail.com',
-      packages=find_packages(),
+      packages=find_packages(exclude=["benchmarks", "benchmarks.*", "tests", "tests.*"]),
       zip_safe=False,
       install_requires=[
       ],
@@ -30,11 +30,12 @@ setup(name='ArgumentParserUtils',
       {
             "mqtt": ["paho_mqtt"],
             "serial": ["pyserial"],
-            "modbus": ["pymodbus"],
+            "modbus": ["pymodbus>=3.10"],
             "mailgun": ["requests"],
       },
       entry_points={
           "console_scripts": [
+              "apu-serial-bench=argparseutils.helpers.util.serialbench:main",
           ]
       },
       )
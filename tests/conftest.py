@@ -0,0 +1,47 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+import pytest
+
+
+@pytest.fixture
+def modbus_buses():
+    """
+    Starts pymodbus serial simulators on pty bridges, call with the number of buses and the unit ids each answers for.
+    Returns the client side port names.
+    """
+    if os.name != 'posix':
+        pytest.skip("the simulators are reached through pty pairs")
+    pytest.importorskip("pymodbus")
+    from benchmarks.modbus_sim import PtyBridge, start_serial_simulator
+
+    bridges = []
+    simulators = []
+
+    def start(count: int = 1, devices=(1,), baudrate: int = 115200):
+        for _ in range(count):
+            bridge = PtyBridge().start()
+            bridges.append(bridge)
+            simulators.append(start_serial_simulator(bridge.server_port, devices=devices, baudrate=baudrate))
+        return [bridge.client_port for bridge in bridges[-count:]]
+
+    yield start
+    for simulator in simulators:
+        simulator.stop()
+    for bridge in bridges:
+        bridge.stop()
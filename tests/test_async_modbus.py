@@ -0,0 +1,75 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.utils import RegistryContext
+
+
+def parse(ports, timeout: int = 1):
+    with RegistryContext():
+        parser = ArgumentParser("AsyncModbusTest")
+        argv = []
+        for bus, port in enumerate(ports):
+            shard = f"bus{bus}"
+            ModbusSerialHelper.add_parser_options(parser, shard=shard)
+            argv.extend([f"--{shard}-modbus-port", port, f"--{shard}-modbus-baudrate", "115200",
+                         f"--{shard}-modbus-timeout", str(timeout), f"--{shard}-modbus-retries", "0"])
+    return parser.parse_args(argv)
+
+
+async def read(args, shard, address, count=10, device_id=1):
+    async with ModbusSerialHelper.open_async_modbus_serial(args, shard) as client:
+        return await client.read_holding_registers(address, count=count, device_id=device_id)
+
+
+def test_create_async_modbus_serial_needs_a_loop(modbus_buses):
+    args = parse(modbus_buses())
+
+    async def create():
+        client = ModbusSerialHelper.create_async_modbus_serial(args, "bus0")
+        assert client.args is args
+        assert not client.connected
+        return client
+
+    assert asyncio.run(create()) is not None
+
+
+def test_read_holding_registers(modbus_buses):
+    args = parse(modbus_buses())
+    result = asyncio.run(read(args, "bus0", 5))
+    assert not result.isError()
+    assert result.registers == list(range(5, 15))
+
+
+def test_buses_share_one_loop(modbus_buses):
+    args = parse(modbus_buses(3))
+
+    async def read_all():
+        return await asyncio.gather(*[read(args, f"bus{bus}", bus * 10) for bus in range(3)])
+
+    results = asyncio.run(read_all())
+    assert [result.registers for result in results] == [list(range(bus * 10, bus * 10 + 10)) for bus in range(3)]
+
+
+def test_connect_failure_is_raised(tmp_path):
+    args = parse([str(tmp_path / "missing")])
+    with pytest.raises(ConnectionError, match="missing"):
+        asyncio.run(read(args, "bus0", 0))
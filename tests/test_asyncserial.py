@@ -0,0 +1,165 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import os
+import threading
+import time
+import tty
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util import asyncserial
+from argparseutils.helpers.util.capture import READ, WRITE, iter_records
+from argparseutils.helpers.utils import RegistryContext
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="async serial ports are only available on posix")
+
+
+@pytest.fixture
+def pty_pair():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    fds = [master, slave]
+    yield fds, os.ttyname(slave)
+    for fd in fds:
+        if fd is not None:
+            os.close(fd)
+
+
+def parse(argv):
+    with RegistryContext():
+        parser = ArgumentParser("AsyncSerialTest")
+        SerialHelper.add_parser_options(parser, shard="device")
+    return parser.parse_args(argv)
+
+
+async def read_master(master, size):
+    data = b""
+    while len(data) < size:
+        try:
+            data += os.read(master, size - len(data))
+        except BlockingIOError:
+            await asyncio.sleep(0.01)
+    return data
+
+
+def test_open_read_write_close(pty_pair):
+    (master, _), name = pty_pair
+
+    async def run():
+        reader, writer = await SerialHelper.create_async_serial(parse(["--device-port", name]), "device")
+        port = writer.get_extra_info("serial")
+        os.write(master, b"ping\n")
+        assert await asyncio.wait_for(reader.readline(), 5) == b"ping\n"
+        writer.write(b"pong\n")
+        await writer.drain()
+        assert await asyncio.wait_for(read_master(master, 5), 5) == b"pong\n"
+        writer.close()
+        await writer.wait_closed()
+        assert not port.is_open
+
+    asyncio.run(run())
+
+
+def test_port_is_opened_off_the_event_loop(pty_pair, monkeypatch):
+    (master, _), name = pty_pair
+    create_serial = SerialHelper.create_serial
+    opened_on = []
+
+    def slow_create_serial(cls, args, shard=""):
+        opened_on.append(threading.get_ident())
+        time.sleep(0.2)
+        return create_serial(args, shard)
+
+    monkeypatch.setattr(SerialHelper, "create_serial", classmethod(slow_create_serial))
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.sleep(0)
+        reader, writer = await SerialHelper.create_async_serial(parse(["--device-port", name]), "device")
+        ticker.cancel()
+        writer.close()
+        await writer.wait_closed()
+        return ticks
+
+    assert asyncio.run(run()) > 5
+    assert opened_on[0] != threading.get_ident()
+
+
+def test_uses_create_serial(tmp_path, pty_pair):
+    (master, _), name = pty_pair
+    path = str(tmp_path / "async.cap")
+
+    async def run():
+        reader, writer = await SerialHelper.create_async_serial(
+            parse(["--device-port", name, "--device-capture-file", path, "--device-vmin", "0"]), "device")
+        assert writer.get_extra_info("serial").latency_settings["vmin"] == "applied"
+        os.write(master, b"in")
+        assert await asyncio.wait_for(reader.readexactly(2), 5) == b"in"
+        writer.write(b"out")
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+
+    asyncio.run(run())
+    with open(path, "rb") as capture_file:
+        records = [(direction, bytes(data)) for _, direction, data in iter_records(capture_file.read())]
+    assert records == [(READ, b"in"), (WRITE, b"out")]
+
+
+def test_empty_read_is_not_end_of_file(pty_pair, monkeypatch):
+    (master, _), name = pty_pair
+
+    async def run():
+        reader, writer = await SerialHelper.create_async_serial(parse(["--device-port", name]), "device")
+        transport = writer.transport
+        with monkeypatch.context() as patch:
+            patch.setattr(asyncserial.os, "read", lambda fd, size: b"")
+            transport._read_ready()
+        assert not transport.is_closing()
+        os.write(master, b"still open")
+        assert await asyncio.wait_for(reader.readexactly(10), 5) == b"still open"
+        writer.close()
+        await writer.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_hangup_ends_the_stream(pty_pair):
+    fds, name = pty_pair
+
+    async def run():
+        reader, writer = await SerialHelper.create_async_serial(parse(["--device-port", name]), "device")
+        os.write(fds[0], b"last")
+        assert await asyncio.wait_for(reader.readexactly(4), 5) == b"last"
+        os.close(fds[0])
+        fds[0] = None
+        assert await asyncio.wait_for(reader.read(), 5) == b""
+        assert writer.transport.is_closing()
+
+    asyncio.run(run())
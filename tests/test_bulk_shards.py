@@ -0,0 +1,86 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from argparse import ArgumentParser
+
+from argparseutils.helpers.mqtt import MQTTClientHelper
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import EnvResolver, RegistryContext, ShardRegistry, add_sharded_parser_options, \
+    get_environment_registry, get_shard_registry, set_env_resolver
+
+environ = {"SERIAL2_BAUDRATE": "19200", "MQTT1_MQTT_HOST": "broker.local"}
+
+
+def build_loop(shards):
+    with RegistryContext():
+        parser = ArgumentParser("BulkTest")
+        set_env_resolver(parser, EnvResolver(environ=environ))
+        for shard in shards:
+            SerialHelper.add_parser_options(parser, shard=f"serial{shard}", port=f"/dev/ttyUSB{shard}")
+            MQTTClientHelper.add_parser_options(parser, "BulkTest", shard=f"mqtt{shard}")
+    return parser
+
+
+def build_bulk(shards):
+    with RegistryContext():
+        parser = ArgumentParser("BulkTest")
+        set_env_resolver(parser, EnvResolver(environ=environ))
+        add_sharded_parser_options(parser, SerialHelper, [f"serial{x}" for x in shards],
+                                   shard_kwargs={f"serial{x}": dict(port=f"/dev/ttyUSB{x}") for x in shards})
+        add_sharded_parser_options(parser, MQTTClientHelper, [f"mqtt{x}" for x in shards], "BulkTest")
+    return parser
+
+
+def test_bulk_matches_one_call_per_shard():
+    shards = range(4)
+    loop_parser, bulk_parser = build_loop(shards), build_bulk(shards)
+    argv = ["--serial3-timeout", "0.5", "--mqtt0-mqtt-port", "8883"]
+    loop_args, bulk_args = loop_parser.parse_args(argv), bulk_parser.parse_args(argv)
+
+    assert vars(bulk_args) == vars(loop_args)
+    assert sorted(x.option_strings for x in bulk_parser._actions) == \
+           sorted(x.option_strings for x in loop_parser._actions)
+    assert get_environment_registry(bulk_parser).get_known_env_params() == \
+           get_environment_registry(loop_parser).get_known_env_params()
+    for helper_class in (SerialHelper, MQTTClientHelper):
+        assert get_shard_registry(bulk_parser).registered_shards(helper_class) == \
+               get_shard_registry(loop_parser).registered_shards(helper_class)
+
+    assert bulk_args.serial1_port == "/dev/ttyUSB1"
+    assert bulk_args.serial2_baudrate == 19200
+    assert bulk_args.serial3_timeout == 0.5
+    assert bulk_args.mqtt1_mqtt_host == "broker.local"
+    assert bulk_args.mqtt0_mqtt_port == 8883
+
+
+def test_bulk_with_no_shards_adds_nothing():
+    with RegistryContext():
+        parser = ArgumentParser("BulkTest")
+        actions = len(parser._actions)
+        add_sharded_parser_options(parser, SerialHelper, [])
+    assert len(parser._actions) == actions
+    assert get_shard_registry(parser).registered_shards(SerialHelper) == []
+
+
+def test_registry_keeps_each_shard_once_in_order():
+    registry = ShardRegistry()
+    registry.register_shard(SerialHelper, "b")
+    registry.register_shard_names(SerialHelper.__name__, ["a", "b", "c"])
+    registry.register_shard(SerialHelper, "a")
+
+    assert registry.registered_shards(SerialHelper) == ["b", "a", "c"]
+    assert registry.is_registered(SerialHelper, "c")
+    assert not registry.is_registered(MQTTClientHelper, "c")
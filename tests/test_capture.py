@@ -0,0 +1,208 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import threading
+import time
+import tty
+from argparse import ArgumentParser
+
+import pytest
+import serial
+
+from argparseutils.helpers import serialport
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util import capture
+from argparseutils.helpers.util.capture import READ, WRITE, CaptureReplay, CaptureWriter, iter_records
+from argparseutils.helpers.util.framereader import DelimiterSplitter, FrameReader
+from argparseutils.helpers.util.serialpool import SerialPool
+from argparseutils.helpers.utils import RegistryContext
+
+
+@pytest.fixture
+def pty_pair():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    yield master, os.ttyname(slave)
+    os.close(master)
+    os.close(slave)
+
+
+@pytest.fixture
+def no_ports(monkeypatch):
+    monkeypatch.setattr(serialport, "get_default_port", lambda: None)
+
+
+def parse(argv, shard=""):
+    with RegistryContext():
+        parser = ArgumentParser("CaptureTest")
+        SerialHelper.add_parser_options(parser, shard=shard)
+    return parser.parse_args(argv)
+
+
+def read_capture(path):
+    with open(path, "rb") as capture_file:
+        records = [(direction, bytes(data)) for _, direction, data in iter_records(capture_file.read())]
+    return {direction: b"".join(data for record_direction, data in records if record_direction == direction)
+            for direction in (READ, WRITE)}
+
+
+def test_replay_without_a_port(tmp_path, no_ports):
+    path = str(tmp_path / "device.cap")
+    writer = CaptureWriter(path)
+    writer.record(READ, b"hello\n")
+    writer.record(WRITE, b"ignored")
+    writer.close()
+
+    args = parse(["--replay-file", path, "--replay-speed", "0", "--timeout", "5"])
+    assert args.port is None
+    port = SerialHelper.create_serial(args)
+    try:
+        assert port.read(6) == b"hello\n"
+    finally:
+        port.close()
+
+
+def test_missing_port_is_a_parse_error(no_ports, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        parse([], shard="input")
+    assert exit_info.value.code == 2
+    assert "argument --input-port: no serial port was found" in capsys.readouterr().err
+
+
+def test_replay_file_from_the_environment(tmp_path, no_ports, monkeypatch):
+    monkeypatch.setenv("INPUT_REPLAY_FILE", str(tmp_path / "device.cap"))
+    args = parse([], shard="input")
+    assert args.input_port is None
+    assert args.input_replay_file == str(tmp_path / "device.cap")
+
+
+def test_replay_of_another_shard_does_not_waive_the_port(tmp_path, no_ports):
+    with RegistryContext():
+        parser = ArgumentParser("CaptureTest")
+        SerialHelper.add_parser_options(parser, shard="input")
+        SerialHelper.add_parser_options(parser, shard="output")
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--input-replay-file", str(tmp_path / "device.cap")])
+
+
+def test_frame_reader_is_captured(tmp_path, pty_pair):
+    master, name = pty_pair
+    path = str(tmp_path / "frames.cap")
+    port = SerialHelper.create_serial(parse(["--port", name, "--capture-file", path, "--timeout", "0.2"]))
+    os.write(master, b"one\ntwo\n")
+    frames = [bytes(frame) for frame in FrameReader(port, DelimiterSplitter())]
+    port.close()
+    assert frames == [b"one", b"two"]
+    assert read_capture(path)[READ] == b"one\ntwo\n"
+
+
+def test_serial_pool_is_captured(tmp_path, pty_pair):
+    master, name = pty_pair
+    path = str(tmp_path / "pool.cap")
+    with RegistryContext():
+        parser = ArgumentParser("CaptureTest")
+        SerialHelper.add_parser_options(parser, shard="input")
+    args = parser.parse_args(["--input-port", name, "--input-capture-file", path])
+    with SerialPool(args, ["input"]) as pool:
+        os.write(master, b"pooled")
+        data = b""
+        while len(data) < 6:
+            data += b"".join(chunk for _, chunk in pool.poll(5))
+    assert data == b"pooled"
+    assert read_capture(path)[READ] == b"pooled"
+
+
+class TrackedWriter(CaptureWriter):
+    writers = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writers.append(self)
+
+
+class TrackedReplay(CaptureReplay):
+    replays = []
+
+    def open(self):
+        self.replays.append(self)
+        return super().open()
+
+
+def test_failed_open_closes_the_capture_and_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(capture, "CaptureWriter", TrackedWriter)
+    monkeypatch.setattr(capture, "CaptureReplay", TrackedReplay)
+    TrackedWriter.writers.clear()
+    TrackedReplay.replays.clear()
+
+    def fail(*args, **kwargs):
+        raise serial.SerialException("could not open port")
+
+    monkeypatch.setattr(capture, "get_capture_serial_class", lambda: fail)
+    args = parse(["--replay-file", str(tmp_path / "device.cap"), "--capture-file", str(tmp_path / "out.cap")])
+    with pytest.raises(serial.SerialException, match="could not open port"):
+        SerialHelper.create_serial(args)
+    assert [writer.file.closed for writer in TrackedWriter.writers] == [True]
+    assert [(replay.master, replay.slave, replay.thread) for replay in TrackedReplay.replays] == [(None, None, None)]
+
+
+def test_missing_port_closes_the_capture(tmp_path, monkeypatch):
+    monkeypatch.setattr(capture, "CaptureWriter", TrackedWriter)
+    TrackedWriter.writers.clear()
+    args = parse(["--port", str(tmp_path / "missing"), "--capture-file", str(tmp_path / "out.cap")])
+    with pytest.raises(serial.SerialException):
+        SerialHelper.create_serial(args)
+    assert [writer.file.closed for writer in TrackedWriter.writers] == [True]
+
+
+@pytest.mark.parametrize("content", [None, b"not a capture file"])
+def test_failed_replay_is_raised_from_read(tmp_path, content):
+    path = tmp_path / "device.cap"
+    if content is not None:
+        path.write_bytes(content)
+    port = SerialHelper.create_serial(parse(["--replay-file", str(path)]))
+    try:
+        assert port.replay.wait(5)
+        with pytest.raises(serial.SerialException, match="The replay of .* failed") as error:
+            port.read(1)
+        assert isinstance(error.value.__cause__, (OSError, ValueError))
+    finally:
+        port.close()
+
+
+def test_failed_replay_wakes_a_blocked_read(tmp_path):
+    path = tmp_path / "device.cap"
+    path.write_bytes(b"not a capture file")
+    replay = CaptureReplay(str(path), speed=0).open()
+    port = capture.get_capture_serial_class()(port=replay.port_name, replay=replay)
+    errors = []
+
+    def read():
+        try:
+            port.read(1)
+        except serial.SerialException as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    time.sleep(0.1)
+    replay.start()
+    reader.join(5)
+    try:
+        assert not reader.is_alive()
+        assert len(errors) == 1 and "The replay of" in str(errors[0])
+    finally:
+        port.close()
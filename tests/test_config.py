@@ -0,0 +1,147 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import os
+import stat
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util import config
+from argparseutils.helpers.util.config import ConfigFileCache, add_config_files, load_config_file
+from argparseutils.helpers.utils import RegistryContext
+
+
+@pytest.fixture
+def config_cache(tmp_path, monkeypatch):
+    cache = ConfigFileCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "get_config_file_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """
+    Counts the config files parsed.
+    """
+    counts = []
+    parsers = dict(config.config_parsers)
+    for extension, parse in parsers.items():
+        parsers[extension] = lambda text, parse=parse: counts.append(1) or parse(text)
+    monkeypatch.setattr(config, "config_parsers", parsers)
+    return counts
+
+
+def test_precedence(tmp_path, config_cache, monkeypatch):
+    path = tmp_path / "config.toml"
+    path.write_text('[cfgtest]\nport = "/dev/file"\nbaudrate = 19200\ntimeout = 2.5\n')
+    monkeypatch.setenv("CFGTEST_BAUDRATE", "38400")
+    with RegistryContext():
+        parser = ArgumentParser("ConfigTest")
+        add_config_files(parser, str(path))
+        SerialHelper.add_parser_options(parser, shard="cfgtest", timeout=1.0, xonxoff=True)
+    args = parser.parse_args(["--cfgtest-port", "/dev/cli"])
+    assert args.cfgtest_port == "/dev/cli"
+    assert args.cfgtest_baudrate == 38400
+    assert args.cfgtest_timeout == 2.5
+    assert args.cfgtest_xonxoff is True
+
+
+def test_cache_is_shared_between_processes(tmp_path, config_cache, parses, monkeypatch):
+    path = tmp_path / "config.env"
+    path.write_text("PORT=/dev/ttyUSB0\nexport BAUDRATE='115200'\n")
+    path.chmod(0o600)
+    expected = {"PORT": "/dev/ttyUSB0", "BAUDRATE": "115200"}
+    assert load_config_file(str(path)) == expected
+    assert load_config_file(str(path)) == expected
+    assert len(parses) == 1
+
+    # A new cache stands in for a later process, it reads the parsed file from the cache directory.
+    monkeypatch.setattr(config, "get_config_file_cache", lambda: ConfigFileCache(config_cache.cache_dir))
+    assert load_config_file(str(path)) == expected
+    assert len(parses) == 1
+
+
+def test_changed_file_is_parsed_again(tmp_path, config_cache, parses):
+    path = tmp_path / "config.json"
+    path.write_text('{"port": "/dev/ttyUSB0"}')
+    assert load_config_file(str(path)) == {"PORT": "/dev/ttyUSB0"}
+    path.write_text('{"port": "/dev/ttyUSB10"}')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert load_config_file(str(path)) == {"PORT": "/dev/ttyUSB10"}
+    assert len(parses) == 2
+
+
+def test_values_json_can_not_hold_stay_in_memory(tmp_path, config_cache, parses):
+    path = tmp_path / "config.toml"
+    path.write_text("start = 2024-01-02\n")
+    path.chmod(0o600)
+    assert load_config_file(str(path)) == {"START": datetime.date(2024, 1, 2)}
+    assert load_config_file(str(path)) == {"START": datetime.date(2024, 1, 2)}
+    assert len(parses) == 1
+    assert not os.path.exists(config_cache.get_path(str(path)))
+
+
+def test_unwritable_cache_dir(tmp_path, monkeypatch, parses):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = ConfigFileCache(str(blocker / "cache"))
+    monkeypatch.setattr(config, "get_config_file_cache", lambda: cache)
+    path = tmp_path / "config.env"
+    path.write_text("PORT=/dev/ttyUSB0\n")
+    path.chmod(0o600)
+    assert load_config_file(str(path)) == {"PORT": "/dev/ttyUSB0"}
+    assert load_config_file(str(path)) == {"PORT": "/dev/ttyUSB0"}
+    assert len(parses) == 1
+
+
+posix_only = pytest.mark.skipif(os.name != 'posix', reason="config files are only cached on disk on posix")
+
+
+@posix_only
+def test_cache_is_owner_only(tmp_path, config_cache):
+    path = tmp_path / "secret.env"
+    path.write_text("MQTT_PASSWORD=hunter2\n")
+    path.chmod(0o600)
+    load_config_file(str(path))
+    cache_path = config_cache.get_path(str(path))
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(config_cache.cache_dir).st_mode) == 0o700
+    assert [name for name in os.listdir(config_cache.cache_dir) if name.endswith(".tmp")] == []
+
+
+@posix_only
+def test_loose_cache_dir_is_tightened(tmp_path, config_cache):
+    os.makedirs(config_cache.cache_dir, mode=0o755)
+    os.chmod(config_cache.cache_dir, 0o755)
+    path = tmp_path / "secret.env"
+    path.write_text("MQTT_PASSWORD=hunter2\n")
+    path.chmod(0o600)
+    load_config_file(str(path))
+    assert stat.S_IMODE(os.stat(config_cache.cache_dir).st_mode) == 0o700
+
+
+@posix_only
+@pytest.mark.parametrize("mode", [0o644, 0o640, 0o604])
+def test_readable_files_are_only_cached_in_memory(tmp_path, config_cache, parses, mode):
+    path = tmp_path / "shared.env"
+    path.write_text("MQTT_PASSWORD=hunter2\n")
+    path.chmod(mode)
+    assert load_config_file(str(path)) == load_config_file(str(path)) == {"MQTT_PASSWORD": "hunter2"}
+    assert len(parses) == 1
+    assert not os.path.exists(config_cache.get_path(str(path)))
@@ -0,0 +1,96 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from argparse import ArgumentParser
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import EnvRegistry, EnvResolver, RegistryContext, add_sharded_parser_options, \
+    set_env_resolver
+
+
+def test_lookup_uses_the_shard_prefix():
+    resolver = EnvResolver(environ={"PORT": "/dev/a", "INPUT_PORT": "/dev/b"})
+    assert resolver.lookup("PORT") == ("PORT", True, "/dev/a")
+    assert resolver.lookup("port", "input") == ("INPUT_PORT", True, "/dev/b")
+    assert resolver.lookup("port", "output") == ("OUTPUT_PORT", False, None)
+
+
+def test_reset_takes_a_new_snapshot():
+    environ = {"PORT": "/dev/a"}
+    resolver = EnvResolver(environ=environ)
+    assert resolver.lookup("PORT")[2] == "/dev/a"
+    environ["PORT"] = "/dev/b"
+    assert resolver.lookup("PORT")[2] == "/dev/a"
+    resolver.reset(environ)
+    assert resolver.lookup("PORT")[2] == "/dev/b"
+
+
+def test_registry_counts_and_help():
+    registry = EnvRegistry()
+    registry.register_env("PORT")
+    registry.register_env("PORT")
+    assert registry.known_params["PORT"] == 2
+    assert "PORT" in registry.get_help()
+    registry.register_env("BAUDRATE")
+    assert registry.get_known_env_params() == ["BAUDRATE", "PORT"]
+    assert "BAUDRATE PORT" in registry.get_help()
+
+
+def test_environment_is_scanned_once_for_every_shard():
+    environ = {"PORT": "/dev/a", "INPUT_PORT": "/dev/b", "INPUT_BAUDRATE": "9600", "MODBUS_INPUT_PORT": "/dev/c"}
+    resolver = EnvResolver(environ=environ)
+    for shard in ("input", "output", "modbus_input", "mqtt"):
+        for name in ("port", "baudrate", "timeout"):
+            resolver.lookup(name, shard)
+    assert resolver.scans == 1
+
+    assert resolver.lookup("baudrate", "input") == ("INPUT_BAUDRATE", True, "9600")
+    assert resolver.lookup("port", "modbus_input") == ("MODBUS_INPUT_PORT", True, "/dev/c")
+    assert resolver.lookup("input_port", "modbus") == ("MODBUS_INPUT_PORT", True, "/dev/c")
+
+    environ["OUTPUT_PORT"] = "/dev/d"
+    resolver.reset(environ)
+    assert resolver.lookup("port", "output") == ("OUTPUT_PORT", True, "/dev/d")
+    assert resolver.scans == 2
+
+
+def test_bulk_shards_resolve_from_one_scan():
+    resolver = EnvResolver(environ={"SERIAL7_PORT": "/dev/ttyUSB7"})
+    with RegistryContext() as context:
+        parser = ArgumentParser("EnvironmentTest")
+        set_env_resolver(parser, resolver)
+        add_sharded_parser_options(parser, SerialHelper, [f"serial{x}" for x in range(20)])
+    args = parser.parse_args([])
+
+    assert args.serial7_port == "/dev/ttyUSB7"
+    assert resolver.scans == 1
+    assert context.environment_registry.known_params["SERIAL7_PORT"] == 1
+
+
+def test_batched_registrations_are_counted_once_the_batch_ends():
+    registry = EnvRegistry()
+    registry.register_env("PORT")
+    help_text = registry.get_help()
+    with registry.batch():
+        for name in ("PORT", "BAUDRATE", "PORT"):
+            registry.register_env(name)
+        with registry.batch():
+            registry.register_env("PARITY")
+        assert registry.known_params["PORT"] == 1
+        assert "BAUDRATE" not in registry.known_params
+    assert registry.known_params == {"PORT": 3, "BAUDRATE": 1, "PARITY": 1}
+    assert registry.get_help() != help_text
+    assert "BAUDRATE PARITY PORT" in registry.get_help()
@@ -0,0 +1,144 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import RegistryContext, add_sharded_parser_options, get_environment_registry, \
+    set_compact_help
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """
+    Counts the help and usage rendered by argparse, rather than returned from the cache.
+    """
+    calls = []
+    format_help = argparse.HelpFormatter.format_help
+
+    def counting_format_help(self):
+        calls.append(self)
+        return format_help(self)
+
+    monkeypatch.setattr(argparse.HelpFormatter, "format_help", counting_format_help)
+    return calls
+
+
+def unwrapped(text):
+    return " ".join(text.split())
+
+
+def create_parser(shards=("input",)):
+    with RegistryContext():
+        parser = ArgumentParser("HelpTest")
+        add_sharded_parser_options(parser, SerialHelper, list(shards), port="/dev/ttyUSB0")
+    return parser
+
+
+def test_help_is_cached(renders):
+    parser = create_parser()
+    help_text = parser.format_help()
+    assert parser.format_help() == help_text
+    assert len(renders) == 1
+
+    usage = parser.format_usage()
+    assert parser.format_usage() == usage
+    assert len(renders) == 2
+    assert "INPUT_PORT" in help_text
+
+
+def test_help_is_rendered_again_when_an_option_is_added(renders):
+    parser = create_parser()
+    parser.format_help()
+    parser.format_usage()
+    parser.add_argument("--extra", help="An option added later")
+
+    assert "--extra" in parser.format_help()
+    assert "--extra" in parser.format_usage()
+    assert len(renders) == 4
+
+
+def test_help_is_rendered_again_when_a_default_changes(renders):
+    parser = create_parser()
+    assert "(default: 9600)" in unwrapped(parser.format_help())
+    parser.set_defaults(input_baudrate=115200)
+
+    assert "(default: 115200)" in unwrapped(parser.format_help())
+    assert len(renders) == 2
+
+
+def test_help_is_rendered_again_when_the_environment_changes(renders):
+    parser = create_parser()
+    assert "EXTRA_VARIABLE" not in parser.format_help()
+    get_environment_registry(parser).register_env("EXTRA_VARIABLE")
+
+    assert "EXTRA_VARIABLE" in parser.format_help()
+    assert len(renders) == 2
+
+
+def test_help_is_rendered_again_in_compact_mode(renders):
+    parser = create_parser(["input", "output"])
+    assert "--output-port" in parser.format_help()
+    set_compact_help(parser)
+
+    assert "--output-port" not in parser.format_help()
+    assert len(renders) == 2
+
+
+def test_compact_help_groups_the_shards_of_a_template():
+    parser = create_parser([f"serial{x}" for x in range(3)])
+    parser.add_argument("--verbose", action="store_true", help="Log more")
+    set_compact_help(parser)
+    help_text = parser.format_help()
+
+    assert help_text.count("options of shards serial0, serial1, serial2:") == 1
+    assert help_text.count("--<shard>-port") == 1
+    assert "--serial1-port" not in help_text
+    assert "(default: /dev/ttyUSB0)" in help_text
+    assert "--verbose" in help_text
+    assert "\t<SHARD>_PORT <SHARD>_BAUDRATE" in help_text
+    assert "where <SHARD> is one of: SERIAL0 SERIAL1 SERIAL2" in help_text
+    assert "SERIAL2_PORT" not in help_text
+
+    usage = parser.format_usage()
+    assert "--serial0-port" not in usage
+    assert "--verbose" in usage
+
+
+def test_compact_help_hides_defaults_that_differ_between_shards():
+    with RegistryContext():
+        parser = ArgumentParser("HelpTest")
+        add_sharded_parser_options(parser, SerialHelper, ["left", "right"],
+                                   shard_kwargs=dict(left=dict(port="/dev/ttyUSB0"), right=dict(port="/dev/ttyUSB1")))
+    set_compact_help(parser)
+    help_text = parser.format_help()
+
+    assert "/dev/ttyUSB0" not in help_text
+    assert "/dev/ttyUSB1" not in help_text
+    assert "(default: 9600)" in help_text
+
+
+def test_compact_help_of_many_shards_is_bounded():
+    parser = create_parser([f"serial{x}" for x in range(200)])
+    set_compact_help(parser)
+    small = create_parser([f"serial{x}" for x in range(2)])
+    set_compact_help(small)
+
+    # Only the list of shard names grows with the shards.
+    assert len(parser.format_help().splitlines()) < len(small.format_help().splitlines()) + 20
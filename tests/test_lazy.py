@@ -0,0 +1,63 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import subprocess
+import sys
+
+import pytest
+
+from argparseutils.helpers.util.lazy import is_loaded, lazy_import, load_module, set_module
+from benchmarks.import_time import HEAVY_BACKENDS, SCRIPT
+
+
+def test_module_loads_on_attribute_access():
+    module = lazy_import("colorsys")
+    assert not is_loaded(module)
+    assert module.rgb_to_hsv(1, 0, 0) == (0, 1, 1)
+    assert is_loaded(module)
+    assert load_module(module) is sys.modules["colorsys"]
+
+
+def test_missing_module_names_the_extra():
+    module = lazy_import("argparseutils_missing_backend", extra="missing")
+    with pytest.raises(ImportError, match=r"pip install ArgumentParserUtils\[missing\]"):
+        module.anything
+    assert not is_loaded(module)
+
+
+def test_missing_module_without_extra():
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import("argparseutils_missing_backend").anything
+
+
+def test_set_module():
+    module = lazy_import("argparseutils_missing_backend")
+    set_module(module, sys)
+    assert module.version == sys.version
+    set_module(module, None)
+    assert not is_loaded(module)
+
+
+def test_building_parsers_does_not_import_backends():
+    check = SCRIPT + f"""
+import sys
+loaded = sorted(x for x in sys.modules if x.split(".")[0] in {HEAVY_BACKENDS!r})
+assert len(loaded) == 0, loaded
+"""
+    proc = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,89 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tty
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.lowlatency import APPLIED
+from argparseutils.helpers.utils import RegistryContext
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="the latency options are only available on posix")
+
+termios = pytest.importorskip("termios")
+
+
+@pytest.fixture
+def pty_pair():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    yield master, os.ttyname(slave)
+    os.close(master)
+    os.close(slave)
+
+
+def build():
+    with RegistryContext():
+        parser = ArgumentParser("LowLatencyTest")
+        SerialHelper.add_parser_options(parser)
+    return parser
+
+
+def get_vmin_vtime(port):
+    attributes = termios.tcgetattr(port.fileno())
+    return attributes[6][termios.VMIN], attributes[6][termios.VTIME]
+
+
+@pytest.mark.parametrize("option", ["--vmin", "--vtime"])
+@pytest.mark.parametrize("value", ["-1", "256"])
+def test_vmin_vtime_range(option, value):
+    with pytest.raises(SystemExit):
+        build().parse_args(["--port", "/dev/null", option, value])
+
+
+def test_vmin_vtime_applied(pty_pair):
+    _, name = pty_pair
+    args = build().parse_args(["--port", name, "--vmin", "12", "--vtime", "3"])
+    with SerialHelper.create_serial(args) as port:
+        assert port.latency_settings == dict(vmin=APPLIED, vtime=APPLIED)
+        assert get_vmin_vtime(port) == (12, 3)
+
+
+def test_vmin_vtime_kept_after_reconfigure(pty_pair):
+    _, name = pty_pair
+    args = build().parse_args(["--port", name, "--vmin", "12", "--vtime", "3"])
+    with SerialHelper.create_serial(args) as port:
+        port.baudrate = 19200
+        port.timeout = 0.5
+        port.inter_byte_timeout = 0.2
+        assert get_vmin_vtime(port) == (12, 3)
+
+
+def test_unsupported_settings_are_reported(pty_pair):
+    _, name = pty_pair
+    args = build().parse_args(["--port", name, "--latency-timer", "1"])
+    with SerialHelper.create_serial(args) as port:
+        assert port.latency_settings["latency_timer"] != APPLIED
+        assert "latency_timer" in port.latency_settings["latency_timer"]
+
+
+def test_no_settings(pty_pair):
+    _, name = pty_pair
+    with SerialHelper.create_serial(build().parse_args(["--port", name])) as port:
+        assert port.latency_settings == {}
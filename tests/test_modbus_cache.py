@@ -0,0 +1,113 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from pymodbus.pdu.register_message import ReadHoldingRegistersResponse
+
+from argparseutils.helpers.util.modbuscache import ModbusReadCache
+
+
+class FakeClient:
+    """
+    Holds registers per unit, `during_read` is called inside each read as if it were waiting on the bus.
+    """
+
+    def __init__(self):
+        self.registers = {}
+        self.reads = 0
+        self.during_read = None
+
+    def read_holding_registers(self, address, count=1, device_id=1):
+        self.reads += 1
+        registers = [self.registers.get((device_id, x), 0) for x in range(address, address + count)]
+        if self.during_read is not None:
+            during_read, self.during_read = self.during_read, None
+            during_read()
+        return ReadHoldingRegistersResponse(registers=registers, dev_id=device_id)
+
+    def write_register(self, address, value, *, device_id=1):
+        self.registers[(device_id, address)] = value
+
+
+class SlaveClient(FakeClient):
+    """
+    A client with the unit argument of pymodbus before 3.10.
+    """
+
+    def write_register(self, address, value, slave=0):
+        self.registers[(slave, address)] = value
+
+
+def read(cache, address=0, device_id=1):
+    return cache.read_holding_registers(address, count=1, device_id=device_id).registers[0]
+
+
+def test_reads_are_cached():
+    client = FakeClient()
+    cache = ModbusReadCache(client, ttl=60)
+    assert read(cache) == read(cache) == 0
+    assert client.reads == 1
+    assert cache.stats.hits == 1 and cache.stats.misses == 1
+
+
+def test_write_drops_its_unit():
+    client = FakeClient()
+    cache = ModbusReadCache(client, ttl=60)
+    read(cache, device_id=1), read(cache, device_id=2)
+    cache.write_register(0, 7, device_id=2)
+    assert read(cache, device_id=1) == 0
+    assert read(cache, device_id=2) == 7
+    assert client.reads == 3
+
+
+def test_write_during_read_is_not_overwritten():
+    client = FakeClient()
+    cache = ModbusReadCache(client, ttl=60)
+    client.during_read = lambda: cache.write_register(0, 7, device_id=1)
+    # The read started before the write, its response is returned but must not be cached.
+    assert read(cache) == 0
+    assert read(cache) == 7
+    assert client.reads == 2
+
+
+def test_write_during_read_of_another_unit():
+    client = FakeClient()
+    cache = ModbusReadCache(client, ttl=60)
+    client.during_read = lambda: cache.write_register(0, 7, device_id=2)
+    assert read(cache) == 0
+    assert read(cache) == 0
+    assert client.reads == 1
+
+
+def test_positional_and_slave_units():
+    client = SlaveClient()
+    cache = ModbusReadCache(client, ttl=60)
+    for unit in (0, 1, 2, 3):
+        read(cache, device_id=unit)
+    cache.write_register(0, 2, 2)
+    cache.write_register(0, 3, slave=3)
+    cache.write_register(0, 5)
+    assert len(cache) == 1
+    assert [read(cache, device_id=unit) for unit in (0, 1, 2, 3)] == [5, 0, 2, 3]
+    assert client.reads == 7
+
+
+def test_unknown_unit_drops_every_unit():
+    client = FakeClient()
+    cache = ModbusReadCache(client, ttl=60)
+    read(cache, device_id=1), read(cache, device_id=2)
+    client.write_register = lambda *args, **kwargs: None
+    cache.write_register(0, 1, 2)
+    assert len(cache) == 0
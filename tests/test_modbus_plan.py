@@ -0,0 +1,77 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu.register_message import ReadHoldingRegistersResponse
+
+from argparseutils.helpers.util.modbusplan import ModbusPoint, ModbusReadPlanner, plan_reads
+
+
+class FakeClient:
+    """
+    Answers holding register reads with each register's address, units in `silent` raise as pymodbus does when a
+    unit does not answer.
+    """
+
+    def __init__(self, silent=()):
+        self.silent = silent
+        self.requests = []
+
+    def read_holding_registers(self, address, count=1, device_id=1):
+        self.requests.append((device_id, address, count))
+        if device_id in self.silent:
+            raise ModbusIOException("No response received")
+        return ReadHoldingRegistersResponse(registers=list(range(address, address + count)), dev_id=device_id)
+
+
+class AsyncFakeClient(FakeClient):
+    async def read_holding_registers(self, address, count=1, device_id=1):
+        return super().read_holding_registers(address, count=count, device_id=device_id)
+
+
+def test_plan_merges_within_gap():
+    points = [ModbusPoint("a", 0, count=2), ModbusPoint("b", 4), ModbusPoint("c", 20), ModbusPoint("d", 0, unit=2)]
+    requests = plan_reads(points, max_gap=2)
+    assert [(r.unit, r.address, r.count) for r in requests] == [(1, 0, 5), (1, 20, 1), (2, 0, 1)]
+
+
+def test_plan_respects_register_limit():
+    points = [ModbusPoint(f"p{i}", i * 50, count=50) for i in range(3)]
+    assert [(r.address, r.count) for r in plan_reads(points, max_gap=0)] == [(0, 100), (100, 50)]
+
+
+def test_read_decodes_points():
+    planner = ModbusReadPlanner([ModbusPoint("a", 10, count=2), ModbusPoint("b", 13)], max_gap=1)
+    client = FakeClient()
+    assert planner.read(client) == {"a": [10, 11], "b": 13}
+    assert client.requests == [(1, 10, 4)]
+
+
+def test_silent_unit_does_not_lose_other_points():
+    planner = ModbusReadPlanner([ModbusPoint("a", 0, unit=1), ModbusPoint("b", 0, unit=2), ModbusPoint("c", 5, unit=3)])
+    values = planner.read(FakeClient(silent=(2,)))
+    assert values == {"a": 0, "c": 5}
+    assert isinstance(planner.errors["b"], ModbusIOException)
+    assert list(planner.errors) == ["b"]
+
+
+def test_silent_unit_async():
+    planner = ModbusReadPlanner([ModbusPoint("a", 0, unit=1), ModbusPoint("b", 0, unit=2)])
+    values = asyncio.run(planner.read_async(AsyncFakeClient(silent=(1,))))
+    assert values == {"b": 0}
+    assert isinstance(planner.errors["a"], ModbusIOException)
@@ -0,0 +1,100 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.util.modbusplan import ModbusPoint
+from argparseutils.helpers.util.modbuspoller import ModbusMultiBusPoller
+from argparseutils.helpers.utils import RegistryContext
+
+
+def parse(ports):
+    with RegistryContext():
+        parser = ArgumentParser("ModbusPollerTest")
+        argv = []
+        for bus, port in enumerate(ports):
+            shard = f"bus{bus}"
+            ModbusSerialHelper.add_parser_options(parser, shard=shard)
+            argv.extend([f"--{shard}-modbus-port", port, f"--{shard}-modbus-baudrate", "115200",
+                         f"--{shard}-modbus-timeout", "1", f"--{shard}-modbus-retries", "0"])
+    return parser.parse_args(argv)
+
+
+def create_points(bus: int, units=(1,)) -> list:
+    return [ModbusPoint(f"bus{bus}-{unit}-{index}", index * 20 + bus, count=5, unit=unit)
+            for unit in units for index in range(3)]
+
+
+def expected(points) -> dict:
+    return {point.name: list(range(point.address, point.address + point.count)) for point in points}
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_polls_every_bus(modbus_buses, use_processes):
+    args = parse(modbus_buses(3))
+    points = {f"bus{bus}": create_points(bus) for bus in range(3)}
+    results = {shard: [] for shard in points}
+    with ModbusMultiBusPoller(args, points, interval=0, use_processes=use_processes, cycles=4) as poller:
+        for result in poller:
+            results[result.shard].append(result)
+
+    for shard, bus_results in results.items():
+        assert len(bus_results) == 4
+        assert all(result.errors == {} for result in bus_results)
+        assert all(result.values == expected(points[shard]) for result in bus_results)
+        stats = poller.stats[shard]
+        assert stats.polls == 4 and stats.errors == 0
+        assert 0 < stats.min_latency <= stats.mean_latency <= stats.max_latency
+
+
+def test_silent_unit_is_an_error_of_its_points(modbus_buses):
+    args = parse(modbus_buses(2))
+    points = {"bus0": create_points(0, units=(1, 2)), "bus1": create_points(1)}
+    with ModbusMultiBusPoller(args, points, interval=0, cycles=2) as poller:
+        results = list(poller)
+
+    bus0 = [result for result in results if result.shard == "bus0"]
+    assert len(bus0) == 2
+    answered = [point for point in points["bus0"] if point.unit == 1]
+    silent = {point.name for point in points["bus0"] if point.unit == 2}
+    assert all(result.values == expected(answered) for result in bus0)
+    assert all(set(result.errors) == silent for result in bus0)
+    assert poller.stats["bus0"].errors == 2
+    assert poller.stats["bus1"].polls == 2 and poller.stats["bus1"].errors == 0
+
+
+def test_bus_that_can_not_open(modbus_buses, tmp_path):
+    args = parse(modbus_buses(1) + [str(tmp_path / "missing")])
+    points = {"bus0": create_points(0), "bus1": create_points(1)}
+    with ModbusMultiBusPoller(args, points, interval=0, cycles=2) as poller:
+        results = list(poller)
+
+    assert [result.shard for result in results].count("bus0") == 2
+    assert poller.stats["bus0"].errors == 0
+    assert poller.stats["bus1"].errors > 0
+    assert poller.stats["bus1"].last_error is not None
+
+
+def test_stop(modbus_buses):
+    args = parse(modbus_buses(1))
+    with ModbusMultiBusPoller(args, {"bus0": create_points(0)}, interval=0) as poller:
+        for polls, _ in enumerate(poller, 1):
+            if polls == 3:
+                poller.stop()
+    assert poller.stats["bus0"].polls >= 3
@@ -0,0 +1,142 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu.register_message import ReadHoldingRegistersResponse
+
+from argparseutils.helpers.util.modbusplan import ModbusPoint
+from argparseutils.helpers.util.modbusschedule import BusTiming, ModbusBusScheduler
+
+
+class FakeBus:
+    """
+    A clock that only moves when the scheduler sleeps or a read holds the bus for `read_time`.
+    """
+
+    def __init__(self, read_time: float = 1 / 64, silent=()):
+        self.now = 0.0
+        self.read_time = read_time
+        self.silent = silent
+        self.requests = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def read_holding_registers(self, address, count=1, device_id=1):
+        self.requests.append((self.now, device_id, address))
+        self.now += self.read_time
+        if device_id in self.silent:
+            raise ModbusIOException("No response received")
+        return ReadHoldingRegistersResponse(registers=list(range(address, address + count)), dev_id=device_id)
+
+
+def create_scheduler(bus, callback=None):
+    timing = BusTiming(char_time=0.0, frame_gap=0.0, turnaround=bus.read_time)
+    return ModbusBusScheduler(bus, timing, callback=callback, clock=bus.clock, sleep=bus.sleep)
+
+
+def test_timing_from_line():
+    slow = BusTiming.from_line(9600)
+    assert abs(slow.char_time - 10 / 9600) < 1e-12
+    assert abs(slow.frame_gap - 3.5 * 10 / 9600) < 1e-12
+    assert BusTiming.from_line(115200).frame_gap == 0.00175
+    assert BusTiming.from_line(9600, parity="Even", stopbits=2).char_time == 12 / 9600
+
+
+def test_earliest_deadline_first():
+    bus = FakeBus()
+    scheduler = create_scheduler(bus)
+    scheduler.add([ModbusPoint("slow", 0, unit=1)], interval=1.0)
+    scheduler.add([ModbusPoint("fast", 0, unit=2)], interval=0.125)
+    scheduler.run(1.0)
+
+    # Both are released at once, the fast read has the earlier deadline and runs first.
+    assert bus.requests[:3] == [(0.0, 2, 0), (1 / 64, 1, 0), (0.125, 2, 0)]
+    units = [unit for _, unit, _ in bus.requests]
+    assert units.count(2) == 8
+    assert units.count(1) == 1
+    stats = scheduler.get_stats()
+    assert stats["missed_deadlines"] == 0
+    assert stats["errors"] == 0
+    assert stats["utilisation"] == 9 / 64
+
+
+def test_skipped_releases():
+    bus = FakeBus(read_time=0.625)
+    scheduler = create_scheduler(bus)
+    scheduler.add([ModbusPoint("fast", 0)], interval=0.25)
+    scheduler.run(1.0)
+
+    # The first read ends at 0.625 and skips the release at 0.25. The second, released at 0.5, ends at 1.25 and
+    # skips the releases at 0.75 and 1.0.
+    assert [start for start, _, _ in bus.requests] == [0.0, 0.625]
+    stats = scheduler.get_stats()
+    assert stats["reads"] == 2
+    assert stats["missed_deadlines"] == 2
+    assert stats["skipped_releases"] == 3
+    assert stats["max_lateness"] == 0.5
+
+
+def test_silent_unit_does_not_stop_the_bus():
+    bus = FakeBus(silent=(2,))
+    results = []
+    scheduler = create_scheduler(bus, callback=lambda values, errors: results.append((values, errors)))
+    scheduler.add([ModbusPoint("healthy", 0, unit=1)], interval=0.125)
+    scheduler.add([ModbusPoint("silent", 0, unit=2)], interval=0.125)
+    scheduler.run(0.625)
+
+    stats = scheduler.get_stats()
+    assert stats["reads"] == 10
+    assert stats["errors"] == 5
+    assert stats["missed_deadlines"] == 5
+    assert stats["elapsed"] == 0.625
+    assert scheduler.values == {"healthy": 0}
+    failed = [errors for values, errors in results if errors]
+    assert len(failed) == 5 and all(isinstance(errors["silent"], ModbusIOException) for errors in failed)
+
+
+def test_unexpected_client_error_is_recorded():
+    class BrokenBus(FakeBus):
+        def read_holding_registers(self, address, count=1, device_id=1):
+            self.now += self.read_time
+            raise OSError("Device disconnected")
+
+    bus = BrokenBus()
+    scheduler = create_scheduler(bus)
+    scheduler.add([ModbusPoint("gone", 0)], interval=0.125)
+    scheduler.run(0.375)
+    assert scheduler.get_stats()["errors"] == 3
+    assert isinstance(scheduler.reads[0].planner.errors["gone"], OSError)
+
+
+def test_run_without_reads():
+    bus = FakeBus()
+    scheduler = create_scheduler(bus)
+    scheduler.run(0.5)
+    assert bus.now == 0.5
+    assert bus.requests == []
+
+    scheduler = create_scheduler(bus)
+    runner = threading.Thread(target=scheduler.run)
+    runner.start()
+    scheduler.stop()
+    runner.join(timeout=5)
+    assert not runner.is_alive()
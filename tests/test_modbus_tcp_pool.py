@@ -0,0 +1,128 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+
+import pytest
+
+from argparseutils.helpers.util.modbuspool import GatewayPool
+
+
+class FakeClient:
+    def __init__(self):
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+        return True
+
+    def close(self):
+        self.connected = False
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(connections=2, unit_lock=True):
+        pool = GatewayPool("gateway:502", [FakeClient() for _ in range(connections)], unit_lock)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+class UnitTracker:
+    """
+    Counts the requests in flight per unit, and the most seen at once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+
+    def request(self, client, unit, value):
+        with self.lock:
+            self.active[unit] = self.active.get(unit, 0) + 1
+            self.max_active[unit] = max(self.max_active.get(unit, 0), self.active[unit])
+        time.sleep(0.002)
+        with self.lock:
+            self.active[unit] -= 1
+        return value
+
+
+def test_requests_to_a_unit_run_one_at_a_time(make_pool):
+    pool = make_pool(connections=4)
+    tracker = UnitTracker()
+    futures = [pool.submit(unit, tracker.request, unit, index) for index in range(40) for unit in (1, 2)]
+
+    assert [future.result(timeout=5) for future in futures] == [index for index in range(40) for _ in (1, 2)]
+    assert tracker.max_active == {1: 1, 2: 1}
+    assert pool.stats.requests == 80
+    assert pool.stats.max_in_use <= 4
+    assert pool.unit_queues == {}
+
+
+def test_requests_without_the_unit_lock_run_together(make_pool):
+    pool = make_pool(connections=4, unit_lock=False)
+    tracker = UnitTracker()
+    futures = [pool.submit(1, tracker.request, 1, index) for index in range(40)]
+
+    assert [future.result(timeout=5) for future in futures] == list(range(40))
+    assert tracker.max_active[1] > 1
+
+
+def test_busy_unit_does_not_hold_back_other_units(make_pool):
+    pool = make_pool(connections=2)
+    release = threading.Event()
+
+    def blocked(client):
+        return release.wait(5)
+
+    busy = [pool.submit(1, blocked) for _ in range(3)]
+    other = pool.submit(2, lambda client: "unit 2")
+    try:
+        assert other.result(timeout=1) == "unit 2"
+        assert not any(future.done() for future in busy)
+    finally:
+        release.set()
+    assert [future.result(timeout=5) for future in busy] == [True] * 3
+
+
+def test_errors_are_raised_from_the_future(make_pool):
+    pool = make_pool(connections=1)
+
+    def fail(client):
+        raise ValueError("no response")
+
+    failed = pool.submit(1, fail)
+    after = pool.submit(1, lambda client: "after")
+    with pytest.raises(ValueError, match="no response"):
+        failed.result(timeout=5)
+    assert after.result(timeout=5) == "after"
+
+
+def test_connection_is_returned_to_the_pool(make_pool):
+    pool = make_pool(connections=1)
+    with pool.connection(1) as client:
+        assert client.connected
+        assert pool.idle == []
+    assert pool.idle == [client]
+    assert pool.stats.connects == 1
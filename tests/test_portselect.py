@@ -0,0 +1,150 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import threading
+import time
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+import pytest
+
+from argparseutils.helpers import serialport
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util import portselect
+from argparseutils.helpers.util.portselect import PortIndex
+from argparseutils.helpers.utils import RegistryContext
+
+
+def make_port(device, vid=None, pid=None, serial_number=None, location=None):
+    return SimpleNamespace(device=device, description=device, hwid="n/a", vid=vid, pid=pid,
+                           serial_number=serial_number, location=location, manufacturer="FTDI",
+                           product="FT232R", interface=None)
+
+
+known_ports = [
+    make_port("/dev/ttyUSB0", vid=0x0403, pid=0x6001, serial_number="A1B2", location="1-1.2"),
+    make_port("/dev/ttyUSB1", vid=0x0403, pid=0x6001, serial_number="C3D4", location="1-1.3"),
+    make_port("/dev/ttyACM0", vid=0x2341, pid=0x43, serial_number="E5F6", location="1-2"),
+    make_port("/dev/ttyS0"),
+]
+
+
+@pytest.fixture
+def comports(tmp_path, monkeypatch):
+    """
+    Lists `known_ports`, with /dev/ttyUSB0 linked from a by-id directory, and counts the enumerations.
+    """
+    by_id = tmp_path / "by-id"
+    by_id.mkdir()
+    os.symlink("/dev/ttyUSB0", by_id / "usb-FTDI_FT232R_A1B2-if00-port0")
+    monkeypatch.setattr(portselect, "by_id_dir", str(by_id))
+
+    calls = []
+
+    def list_comports():
+        calls.append(threading.get_ident())
+        # Slow enough for concurrent callers to overlap.
+        time.sleep(0.05)
+        return list(known_ports)
+
+    monkeypatch.setattr(serialport, "list_ports", SimpleNamespace(comports=list_comports))
+    serialport.get_known_ports.cache_clear()
+    yield calls
+    serialport.get_known_ports.cache_clear()
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch, comports):
+    port_index = PortIndex(str(tmp_path / "cache" / "serial-ports.json"))
+    monkeypatch.setattr(portselect, "get_port_index", lambda: port_index)
+    return port_index
+
+
+@pytest.mark.parametrize("selector, device", [
+    ("usb:vid=0403,pid=6001,serial=A1B2", "/dev/ttyUSB0"),
+    ("usb:vid=0x403,pid=6001,serial=c3*", "/dev/ttyUSB1"),
+    ("usb:vid=2341", "/dev/ttyACM0"),
+    ("by-id:usb-FTDI_*_A1B2-*", "/dev/ttyUSB0"),
+    ("location:1-1.3", "/dev/ttyUSB1"),
+])
+def test_selector_resolves_to_the_matching_port(index, selector, device):
+    assert index.resolve(selector) == device
+
+
+def test_ambiguous_selector_is_an_error(index):
+    with pytest.raises(ValueError, match="2 serial ports match usb:vid=0403"):
+        index.resolve("usb:vid=0403")
+
+
+def test_unknown_selector_key_is_an_error(index):
+    with pytest.raises(ValueError, match="Unknown key colour"):
+        index.resolve("usb:colour=red")
+
+
+def test_port_names_are_not_resolved(index, comports):
+    assert portselect.resolve_port("/dev/ttyS0") == "/dev/ttyS0"
+    assert comports == []
+
+
+def test_selector_from_the_environment(index, monkeypatch):
+    monkeypatch.setenv("SELECT_PORT", "location:1-2")
+    with RegistryContext():
+        parser = ArgumentParser("PortSelectTest")
+        SerialHelper.add_parser_options(parser, shard="select")
+    args = parser.parse_args([])
+
+    assert SerialHelper.create_serial_kwargs(args, "select")['port'] == "/dev/ttyACM0"
+
+
+def test_miss_on_a_cached_index_enumerates_again(tmp_path, index, comports):
+    index.get_entries()
+    known_ports.append(make_port("/dev/ttyUSB2", vid=0x0403, pid=0x6015, location="1-4"))
+    try:
+        other = PortIndex(index.cache_path)
+        assert other.resolve("location:1-4") == "/dev/ttyUSB2"
+    finally:
+        known_ports.pop()
+    assert len(comports) == 2
+
+    with pytest.raises(ValueError, match="No serial port matches location:9-9"):
+        other.resolve("location:9-9")
+    assert len(comports) == 2
+
+
+def test_cached_index_is_shared_between_indexes(index, comports):
+    index.get_entries()
+    assert PortIndex(index.cache_path).get_entries() == index.get_entries()
+    assert len(comports) == 1
+    assert os.listdir(os.path.dirname(index.cache_path)) == ["serial-ports.json"]
+
+
+def test_concurrent_lookups_share_one_enumeration(index, comports):
+    barrier = threading.Barrier(16)
+    results = []
+
+    def lookup():
+        barrier.wait()
+        results.append(index.resolve("usb:vid=0403,serial=C3D4"))
+
+    threads = [threading.Thread(target=lookup) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["/dev/ttyUSB1"] * 16
+    assert len(comports) == 1
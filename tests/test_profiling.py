@@ -0,0 +1,61 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.util import profiling
+from argparseutils.helpers.util.profiling import add_profile_option, get_profile_output
+
+
+@pytest.mark.parametrize("argv, expected", [
+    ([], (False, None)),
+    (["--apu-profile"], (True, None)),
+    (["--apu-profile", "out.json"], (True, "out.json")),
+    (["--apu-profile=out.json"], (True, "out.json")),
+    (["--apu-profile="], (True, None)),
+    (["--apu-profile", "--port", "/dev/null"], (True, None)),
+    (["--port", "/dev/null", "--apu-profile", "-"], (True, "-")),
+    (["--", "--apu-profile", "out.json"], (False, None)),
+])
+def test_profile_output_from_argv(argv, expected):
+    assert get_profile_output(argv, {}) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("", (False, None)),
+    ("0", (False, None)),
+    ("false", (False, None)),
+    ("1", (True, None)),
+    ("TRUE", (True, None)),
+    ("profile.json", (True, "profile.json")),
+])
+def test_profile_output_from_environment(value, expected):
+    assert get_profile_output([], {"APU_PROFILE": value}) == expected
+
+
+def test_argv_takes_precedence():
+    assert get_profile_output(["--apu-profile", "cli.json"], {"APU_PROFILE": "env.json"}) == (True, "cli.json")
+
+
+@pytest.mark.parametrize("argv", [["--apu-profile", "out.json"], ["--apu-profile=out.json"], ["--apu-profile"]])
+def test_parser_accepts_the_option(argv, monkeypatch):
+    monkeypatch.setattr(profiling, "profiler", profiling.Profiler(None))
+    parser = ArgumentParser("ProfilingTest")
+    add_profile_option(parser)
+    parser.parse_args(argv)
+    assert get_profile_output(argv, {})[0]
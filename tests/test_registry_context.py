@@ -0,0 +1,113 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gc
+import json
+import pickle
+import threading
+from argparse import ArgumentParser
+
+from argparseutils.helpers.modbushelper import ModbusSerialHelper
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.sockethelper import SocketHelper
+from argparseutils.helpers.utils import RegistryContext, args_registry_contexts, get_args, get_environment_registry, \
+    get_registry_context, get_shard_registry, get_shard_view
+
+
+def build(shard):
+    parser = ArgumentParser("RegistryContextTest")
+    SerialHelper.add_parser_options(parser, shard=shard, port="/dev/null")
+    return parser, parser.parse_args([])
+
+
+def test_contexts_are_isolated():
+    with RegistryContext() as first:
+        build("first")
+    with RegistryContext() as second:
+        build("second")
+
+    assert first.shard_registry.registered_shards(SerialHelper) == ["first"]
+    assert second.shard_registry.registered_shards(SerialHelper) == ["second"]
+    assert "FIRST_PORT" in first.environment_registry.get_known_env_params()
+    assert "FIRST_PORT" not in second.environment_registry.get_known_env_params()
+    assert not get_shard_registry().is_registered(SerialHelper, "first")
+    assert not get_shard_registry().is_registered(SerialHelper, "second")
+
+
+def test_parser_keeps_its_context():
+    with RegistryContext() as context:
+        parser, _ = build("bound")
+    assert get_registry_context(parser) is context
+    assert get_shard_registry(parser).is_registered(SerialHelper, "bound")
+    assert get_environment_registry(parser) is context.environment_registry
+
+
+def test_args_record_the_context():
+    with RegistryContext() as context:
+        parser, args = build("recorded")
+    assert get_registry_context(args=args) is context
+    assert get_registry_context(args=get_args(args, "recorded")) is context
+    assert get_registry_context(args=get_shard_view(parser, args, "recorded")) is context
+    assert SerialHelper.create_serial_kwargs(args, "recorded")["port"] == "/dev/null"
+
+
+def test_args_resolve_on_another_thread():
+    with RegistryContext():
+        parser = ArgumentParser("RegistryContextTest")
+        ModbusSerialHelper.add_parser_options(parser, shard="bus0", modbus_port="/dev/null")
+        args = parser.parse_args([])
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        ModbusSerialHelper.create_modbus_serial_kwargs(args, "bus0")["port"]))
+    thread.start()
+    thread.join()
+    assert results == ["/dev/null"]
+
+
+def test_context_pickles_for_other_processes():
+    with RegistryContext() as context:
+        _, args = build("pickled")
+    copied_args, copied_context = pickle.loads(pickle.dumps((args, context)))
+    with copied_context:
+        assert get_shard_registry(args=copied_args).registered_shards(SerialHelper) == ["pickled"]
+
+
+def test_args_are_unchanged():
+    with RegistryContext():
+        parser = ArgumentParser("RegistryContextTest")
+        SocketHelper.add_parser_options(parser)
+        args = parser.parse_args([])
+    assert all(not isinstance(value, RegistryContext) for value in vars(args).values())
+    json.dumps(vars(args))
+
+
+def test_context_is_forgotten_with_the_args():
+    with RegistryContext():
+        _, args = build("forgotten")
+    key = id(args)
+    assert key in args_registry_contexts
+    del args
+    gc.collect()
+    assert key not in args_registry_contexts
+
+
+def test_release_discards_registrations():
+    with RegistryContext() as context:
+        build("released")
+    context.release()
+    assert context.shard_registry.registered_shards(SerialHelper) == []
+    assert context.environment_registry.get_known_env_params() == []
@@ -0,0 +1,137 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import tty
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.serialpool import SerialPool
+from argparseutils.helpers.utils import RegistryContext, add_sharded_parser_options
+
+
+@pytest.fixture
+def pty_ports():
+    """
+    Opens `count` pty pairs, returning the masters and the names of the slaves to use as ports.
+    """
+    fds = []
+
+    def open_ptys(count):
+        masters, names = [], []
+        for _ in range(count):
+            master, slave = os.openpty()
+            tty.setraw(slave)
+            fds.extend((master, slave))
+            masters.append(master)
+            names.append(os.ttyname(slave))
+        return masters, names
+
+    yield open_ptys
+    for fd in fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def parse(names):
+    shards = [f"port{index}" for index in range(len(names))]
+    with RegistryContext():
+        parser = ArgumentParser("SerialPoolTest")
+        add_sharded_parser_options(parser, SerialHelper, shards,
+                                   shard_kwargs={shard: dict(port=name) for shard, name in zip(shards, names)})
+    return parser, parser.parse_args([])
+
+
+def read_all(pool, expected: dict) -> dict:
+    received = {shard: b"" for shard in expected}
+    while any(len(received[shard]) < len(data) for shard, data in expected.items()):
+        chunks = pool.poll(5)
+        assert chunks, "timed out waiting for data"
+        for shard, data in chunks:
+            received[shard] += data
+    return received
+
+
+def test_chunks_are_tagged_with_their_shard(pty_ports):
+    masters, names = pty_ports(3)
+    parser, args = parse(names)
+    expected = {f"port{index}": f"from port {index}".encode() for index in range(3)}
+    with SerialPool(args, parser=parser) as pool:
+        assert len(pool) == 3
+        for index, master in enumerate(masters):
+            os.write(master, expected[f"port{index}"])
+        assert read_all(pool, expected) == expected
+
+
+def test_read_sizes_are_per_shard(pty_ports):
+    masters, names = pty_ports(2)
+    parser, args = parse(names)
+    expected = {"port0": bytes(range(100)), "port1": bytes(range(100))}
+    sizes = {"port0": [], "port1": []}
+    with SerialPool(args, parser=parser, read_size=64, read_sizes={"port1": 8}) as pool:
+        for master in masters:
+            os.write(master, bytes(range(100)))
+        received = {shard: b"" for shard in expected}
+        while any(len(data) < 100 for data in received.values()):
+            for shard, data in pool.poll(5):
+                sizes[shard].append(len(data))
+                received[shard] += data
+    assert received == expected
+    assert max(sizes["port0"]) <= 64
+    assert max(sizes["port1"]) <= 8
+    assert len(sizes["port1"]) >= 13
+
+
+def test_failed_port_does_not_stop_the_others(pty_ports, tmp_path):
+    masters, names = pty_ports(1)
+    parser, args = parse([names[0], str(tmp_path / "missing")])
+    with SerialPool(args, parser=parser) as pool:
+        assert list(pool.ports) == ["port0"]
+        assert "port1" in pool.errors
+        os.write(masters[0], b"still read")
+        assert read_all(pool, {"port0": b"still read"}) == {"port0": b"still read"}
+
+
+def test_hung_up_ports_are_removed_and_run_returns(pty_ports):
+    masters, names = pty_ports(2)
+    parser, args = parse(names)
+    received = []
+    pool = SerialPool(args, parser=parser)
+    with pool:
+        os.write(masters[0], b"last words")
+        assert read_all(pool, {"port0": b"last words"}) == {"port0": b"last words"}
+        for master in masters:
+            os.close(master)
+        pool.run(lambda shard, data: received.append((shard, data)), timeout=5)
+        assert len(pool) == 0
+    assert received == []
+    assert sorted(pool.errors) == ["port0", "port1"]
+
+
+def test_run_returns_when_idle_for_the_timeout(pty_ports):
+    masters, names = pty_ports(1)
+    parser, args = parse(names)
+    received = []
+    with SerialPool(args, parser=parser) as pool:
+        os.write(masters[0], b"once")
+        pool.run(lambda shard, data: received.append((shard, data)), timeout=0.2)
+        assert len(pool) == 1
+    assert b"".join(data for _, data in received) == b"once"
+    assert pool.ports == {}
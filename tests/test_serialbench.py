@@ -0,0 +1,73 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import time
+import tty
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.serialbench import PtyLoopback, measure_latency, measure_throughput, run_case
+from argparseutils.helpers.utils import RegistryContext
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="the benchmark's loopback is a pty")
+
+
+@pytest.fixture
+def silent_port():
+    """
+    A port whose other end is never read or written.
+    """
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    with RegistryContext():
+        parser = ArgumentParser("SerialBenchTest")
+        SerialHelper.add_parser_options(parser)
+    port = SerialHelper.create_serial(parser.parse_args(["--port", os.ttyname(slave)]))
+    yield port
+    port.close()
+    os.close(master)
+    os.close(slave)
+
+
+def test_throughput_without_timeouts_stops_at_the_deadline(silent_port):
+    assert silent_port.timeout is None and silent_port.write_timeout is None
+    start = time.perf_counter()
+    received, _ = measure_throughput(silent_port, 1024 * 1024, 4096, 4096, start + 0.5)
+    assert received == 0
+    assert time.perf_counter() - start < 1.5
+
+
+def test_latency_without_timeouts_stops_at_the_deadline(silent_port):
+    start = time.perf_counter()
+    assert measure_latency(silent_port, 10, 16, start + 0.5) == []
+    assert time.perf_counter() - start < 1.5
+
+
+def test_case_on_loopback():
+    with PtyLoopback() as loopback:
+        with RegistryContext():
+            parser = ArgumentParser("SerialBenchTest")
+            SerialHelper.add_parser_options(parser)
+        args = parser.parse_args(["--port", loopback.port_name])
+        args.size, args.round_trips, args.message_size, args.case_timeout = 64 * 1024, 20, 16, 10
+        result = run_case(args, None, None, 4096, 4096)
+    assert result["complete"]
+    assert result["bytes"] == 64 * 1024
+    assert result["timeout"] is None
+    assert result["latency_us"]["min"] <= result["latency_us"]["max"]
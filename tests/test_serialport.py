@@ -0,0 +1,148 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import threading
+import time
+import tty
+from argparse import ArgumentParser
+
+import pytest
+import serial
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import RegistryContext, add_sharded_parser_options
+
+
+@pytest.fixture
+def pty_names():
+    fds = []
+
+    def open_ptys(count):
+        names = []
+        for _ in range(count):
+            master, slave = os.openpty()
+            tty.setraw(slave)
+            fds.extend((master, slave))
+            names.append(os.ttyname(slave))
+        return names
+
+    yield open_ptys
+    for fd in fds:
+        os.close(fd)
+
+
+def parse(ports: dict):
+    with RegistryContext():
+        parser = ArgumentParser("SerialPortTest")
+        add_sharded_parser_options(parser, SerialHelper, list(ports),
+                                   shard_kwargs={shard: dict(port=port) for shard, port in ports.items()})
+    return parser, parser.parse_args([])
+
+
+def test_every_registered_shard_is_opened(pty_names):
+    names = pty_names(3)
+    parser, args = parse({f"port{index}": name for index, name in enumerate(names)})
+    ports = SerialHelper.create_all_serials(args, parser=parser)
+    try:
+        assert list(ports) == ["port0", "port1", "port2"]
+        assert [port.port for port in ports.values()] == names
+        assert all(port.is_open for port in ports.values())
+        assert ports.errors == {}
+        assert sorted(ports.open_times) == ["port0", "port1", "port2"]
+        assert all(open_time >= 0 for open_time in ports.open_times.values())
+    finally:
+        ports.close()
+    assert not any(port.is_open for port in ports.values())
+
+
+def test_failed_shard_does_not_stop_the_others(pty_names, tmp_path):
+    names = pty_names(2)
+    parser, args = parse(dict(first=names[0], missing=str(tmp_path / "missing"), second=names[1]))
+    ports = SerialHelper.create_all_serials(args, parser=parser)
+    try:
+        assert sorted(ports) == ["first", "second"]
+        assert list(ports.errors) == ["missing"]
+        assert isinstance(ports.errors["missing"], serial.SerialException)
+        assert sorted(ports.open_times) == ["first", "missing", "second"]
+    finally:
+        ports.close()
+
+
+def test_only_the_given_shards_are_opened(pty_names):
+    names = pty_names(2)
+    parser, args = parse(dict(first=names[0], second=names[1]))
+    ports = SerialHelper.create_all_serials(args, ["second"], parser=parser)
+    try:
+        assert list(ports) == ["second"]
+    finally:
+        ports.close()
+    assert SerialHelper.create_all_serials(args, [], parser=parser) == {}
+
+
+class SlowPort:
+    def __init__(self, shard):
+        self.shard = shard
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def slow_opens(monkeypatch):
+    """
+    Replaces create_serial with an open that takes 0.1 seconds, counting the opens in progress at once.
+    """
+    state = dict(active=0, max_active=0)
+    lock = threading.Lock()
+
+    def create_serial(cls, args, shard=""):
+        with lock:
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+        try:
+            time.sleep(0.1)
+            if shard == "broken":
+                raise ValueError("adapter did not answer")
+            return SlowPort(shard)
+        finally:
+            with lock:
+                state['active'] -= 1
+
+    monkeypatch.setattr(SerialHelper, "create_serial", classmethod(create_serial))
+    return state
+
+
+def test_ports_are_opened_in_parallel(slow_opens):
+    parser, args = parse({f"port{index}": f"/dev/ttyUSB{index}" for index in range(8)})
+    start = time.perf_counter()
+    ports = SerialHelper.create_all_serials(args, parser=parser)
+    elapsed = time.perf_counter() - start
+
+    assert len(ports) == 8
+    assert slow_opens['max_active'] == 8
+    assert elapsed < 0.4
+    assert all(open_time >= 0.1 for open_time in ports.open_times.values())
+
+
+def test_max_workers_limits_the_opens_at_once(slow_opens):
+    parser, args = parse({f"port{index}": f"/dev/ttyUSB{index}" for index in range(4)} | {"broken": "/dev/ttyUSB9"})
+    ports = SerialHelper.create_all_serials(args, parser=parser, max_workers=2)
+
+    assert slow_opens['max_active'] == 2
+    assert sorted(ports) == ["port0", "port1", "port2", "port3"]
+    assert str(ports.errors["broken"]) == "adapter did not answer"
+    assert ports.open_times["broken"] >= 0.1
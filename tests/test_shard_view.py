@@ -0,0 +1,91 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from argparse import ArgumentParser
+
+import pytest
+
+from argparseutils.helpers.mqtt import MQTTClientHelper
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.utils import CliShardWrapper, RegistryContext, get_shard_view, get_shard_view_class
+
+
+@pytest.fixture
+def parsed():
+    with RegistryContext():
+        parser = ArgumentParser("ShardViewTest")
+        SerialHelper.add_parser_options(parser, shard="input", port="/dev/ttyUSB0")
+        SerialHelper.add_parser_options(parser, shard="output", port="/dev/ttyUSB1")
+        MQTTClientHelper.add_parser_options(parser, "ShardViewTest", shard="broker")
+    args = parser.parse_args(["--input-baudrate", "115200", "--broker-mqtt-host", "broker.local"])
+    return parser, args
+
+
+def test_view_reads_the_same_values_as_the_wrapper(parsed):
+    parser, args = parsed
+    for shard in ("input", "output", "broker"):
+        view = get_shard_view(parser, args, shard)
+        wrapper = CliShardWrapper(args, shard)
+        names = parser.shard_options[shard]
+        assert len(names) > 0
+        for name in names:
+            assert getattr(view, name) == getattr(wrapper, name)
+
+    assert get_shard_view(parser, args, "input").baudrate == 115200
+    assert get_shard_view(parser, args, "output").port == "/dev/ttyUSB1"
+    assert get_shard_view(parser, args, "broker").mqtt_host == "broker.local"
+
+
+def test_writes_go_through_to_the_args(parsed):
+    parser, args = parsed
+    view = get_shard_view(parser, args, "input")
+    view.timeout = 2.5
+
+    assert view.timeout == 2.5
+    assert args.input_timeout == 2.5
+    assert args.output_timeout is None
+
+
+def test_view_is_a_snapshot(parsed):
+    parser, args = parsed
+    view = get_shard_view(parser, args, "input")
+    args.input_port = "/dev/ttyUSB7"
+
+    assert view.port == "/dev/ttyUSB0"
+    assert get_shard_view(parser, args, "input").port == "/dev/ttyUSB7"
+
+
+def test_view_only_holds_the_shard_options(parsed):
+    parser, args = parsed
+    view = get_shard_view(parser, args, "input")
+
+    assert not hasattr(view, "__dict__")
+    with pytest.raises(AttributeError):
+        view.mqtt_host
+    with pytest.raises(AttributeError):
+        view.unknown = 1
+    assert not hasattr(args, "input_unknown")
+    assert "port='/dev/ttyUSB0'" in repr(view)
+
+
+def test_shards_of_a_helper_share_one_view_class(parsed):
+    parser, args = parsed
+    input_view = get_shard_view(parser, args, "input")
+    output_view = get_shard_view(parser, args, "output")
+
+    assert type(input_view) is type(output_view)
+    assert type(input_view) is get_shard_view_class(tuple(parser.shard_options["input"]))
+    assert type(get_shard_view(parser, args, "broker")) is not type(input_view)
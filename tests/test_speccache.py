@@ -0,0 +1,81 @@
+# ArgumentParserUtils provides Utilities and helpers for Python's
+# ArgumentParser.
+#
+# Copyright 2024 NigelB
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+from argparse import ArgumentParser
+
+from argparseutils.helpers.serialport import SerialHelper
+from argparseutils.helpers.util.speccache import ParserSpecCache
+from argparseutils.helpers.utils import RegistryContext, get_shard_registry
+
+
+def build_serial(parser, baudrate=9600):
+    SerialHelper.add_parser_options(parser, shard="input", baudrate=baudrate, port="/dev/null")
+
+
+def build_nested(parser, cache_dir=None):
+    ParserSpecCache(cache_dir).build(parser, build_serial)
+    SerialHelper.add_parser_options(parser, shard="output", port="/dev/null")
+
+
+def build(cache, builder, **kwargs):
+    with RegistryContext():
+        parser = ArgumentParser("SpecCacheTest")
+        cached = cache.build(parser, builder, **kwargs)
+    return parser, cached
+
+
+def test_second_build_is_cached(tmp_path):
+    cache = ParserSpecCache(str(tmp_path))
+    parser, cached = build(cache, build_serial, baudrate=115200)
+    assert not cached
+    parser, cached = build(cache, build_serial, baudrate=115200)
+    assert cached
+    args = parser.parse_args([])
+    assert args.input_baudrate == 115200
+    assert get_shard_registry(parser).registered_shards(SerialHelper) == ["input"]
+
+
+def test_one_file_per_builder_and_kwargs(tmp_path, monkeypatch):
+    cache = ParserSpecCache(str(tmp_path))
+    build(cache, build_serial)
+    # A change to the helpers invalidates the spec and replaces the file rather than adding one.
+    monkeypatch.setattr(ParserSpecCache, "spec_version", ParserSpecCache.spec_version + 1)
+    _, cached = build(cache, build_serial)
+    assert not cached
+    build(cache, build_serial, baudrate=19200)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".json")]) == 2
+
+
+def test_unwritable_cache_dir_builds_without_cache(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = ParserSpecCache(str(blocker / "cache"))
+    parser, cached = build(cache, build_serial)
+    assert not cached
+    assert parser.parse_args([]).input_port == "/dev/null"
+
+
+def test_nested_builds_keep_the_outer_recording(tmp_path):
+    inner = str(tmp_path / "inner")
+    # The second outer cache records while the inner build replays its cached spec.
+    for outer, expect_cached in (("outer", False), ("outer", True), ("other", False), ("other", True)):
+        cache = ParserSpecCache(str(tmp_path / outer))
+        parser, cached = build(cache, build_nested, cache_dir=inner)
+        assert cached == expect_cached
+        args = parser.parse_args([])
+        assert (args.input_port, args.output_port) == ("/dev/null", "/dev/null")
+        assert get_shard_registry(parser).registered_shards(SerialHelper) == ["input", "output"]